@@ -0,0 +1,330 @@
+# bench/bench_app.py
+"""Load-test the app end to end against local stand-ins.
+
+The app is served by uvicorn and driven over HTTP, with:
+  - OpenAI replaced by bench/fake_openai.py (deterministic embeddings,
+    FAKE_OPENAI_* / --latency-ms / --token-latency-ms for latency)
+  - Qdrant in-memory (QDRANT_URL=":memory:"), or a local server via --qdrant-url;
+    the in-memory client runs one call at a time, so use a server for
+    numbers about Qdrant under concurrency
+  - URL uploads scraping a small site served from a temp directory
+  - email sending replaced by no-ops and signups pre-verified
+
+Scenarios, each run at --concurrency:
+  upload_file, upload_url, check_existing_bot, chat, chat_history
+
+    python -m bench.bench_app --requests 200 --concurrency 16
+    python -m bench.bench_app --compare bench/results/a.json bench/results/b.json
+
+Each run prints RPS and p50/p95/p99 per scenario and writes them to
+bench/results/<time>_<commit>.json. The app, the fake server and the load
+generator share one interpreter, so compare runs on the same machine rather
+than reading the absolute numbers as production capacity.
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import httpx
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "bench", "results")
+
+WORDS = (
+    "account billing invoice refund shipping delivery order tracking warranty "
+    "return policy password login profile settings notification subscription "
+    "plan upgrade downgrade trial payment card bank transfer support ticket "
+    "agent hours holiday office address phone email chat response time "
+    "product feature release update install download mobile desktop browser"
+).split()
+
+
+def _document(rng: random.Random, size_kb: int) -> str:
+    paragraphs = []
+    while sum(len(p) for p in paragraphs) < size_kb * 1024:
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+            for _ in range(rng.randint(3, 6))
+        ]
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def _question(rng: random.Random) -> str:
+    return f"What is the {rng.choice(WORDS)} {rng.choice(WORDS)} policy?"
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+def _summarize(latencies: list[float], statuses: dict, elapsed: float) -> dict:
+    ok = sorted(latencies)
+    return {
+        "requests": sum(statuses.values()),
+        "ok": len(ok),
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ok) / len(ok) * 1000, 2) if ok else 0.0,
+        "p50_ms": round(_percentile(ok, 0.5) * 1000, 2),
+        "p95_ms": round(_percentile(ok, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(ok, 0.99) * 1000, 2),
+    }
+
+
+async def _drive(name: str, jobs: list, concurrency: int) -> tuple[dict, list]:
+    """Run coroutine factories with bounded concurrency; time the 2xx ones"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses, results = [], {}, []
+
+    async def one(job):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await job()
+                status = str(response.status_code)
+            except Exception as e:
+                response, status = None, type(e).__name__
+            statuses[status] = statuses.get(status, 0) + 1
+            if response is not None and response.is_success:
+                latencies.append(time.perf_counter() - start)
+                results.append(response.json())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(job) for job in jobs))
+    summary = _summarize(latencies, statuses, time.perf_counter() - start)
+    print(
+        f"{name:20s} {summary['rps']:8.1f} req/s  p50={summary['p50_ms']:8.1f}ms  "
+        f"p95={summary['p95_ms']:8.1f}ms  p99={summary['p99_ms']:8.1f}ms  {statuses}"
+    )
+    return summary, results
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _serve_site(root: str, rng: random.Random, pages: int, size_kb: int) -> http.server.HTTPServer:
+    """Write a small linked site and serve it on an ephemeral port"""
+    names = ["index.html"] + [f"page{i}.html" for i in range(1, pages)]
+    links = "".join(f'<a href="/{name}">{name}</a> ' for name in names)
+    for name in names:
+        with open(os.path.join(root, name), "w") as f:
+            f.write(f"<html><body><nav>{links}</nav><p>{_document(rng, size_kb)}</p></body></html>")
+    with open(os.path.join(root, "robots.txt"), "w") as f:
+        f.write("User-agent: *\nAllow: /\n")
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(_QuietHandler, directory=root)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _commit() -> tuple[str, bool]:
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=REPO_DIR, capture_output=True, text=True
+        ).stdout.strip()
+
+    dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    return git("rev-parse", "--short", "HEAD") or "unknown", dirty
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+
+    # The app reads its settings at import time, so configure it first
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.openai_port}/v1"
+    os.environ["QDRANT_URL"] = args.qdrant_url
+    os.environ.pop("QDRANT_API_KEY", None)
+    # Keep bot records, the ledger and user records out of the working tree
+    workdir = tempfile.mkdtemp(prefix="docative-bench-")
+    os.makedirs(os.path.join(workdir, "db"))
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)
+
+    from bench import fake_openai
+    import main as app_module
+    from utils.admission import TokenBucket, admission
+    from utils.bot_records import get_bot_record, save_bot_record
+    from utils.otp import otp_storage
+    from utils.qdrant import ensure_collection
+    from utils.vector_cache import hot_bot_cache
+
+    fake_openai.settings.update(
+        latency_ms=args.latency_ms, token_latency_ms=args.token_latency_ms
+    )
+    fake_openai.run_in_thread(args.openai_port)
+    app_module.send_embed_script_email = lambda *a, **k: None
+    app_module.send_admin_notification = lambda *a, **k: None
+    if not args.keep_limits:
+        admission.global_bucket = TokenBucket(1e9, 1e9)
+    if args.no_hot_cache:
+        hot_bot_cache.max_bytes = 0
+    ensure_collection()
+    server = fake_openai.run_in_thread(args.app_port, target=app_module.app)
+    os.makedirs(os.path.join(workdir, "site"))
+    site = _serve_site(os.path.join(workdir, "site"), rng, args.site_pages, args.doc_kb)
+
+    def verified(email: str) -> str:
+        otp_storage[email] = {
+            "otp": "000000",
+            "expiry": datetime.now() + timedelta(days=1),
+            "verified": True,
+        }
+        return email
+
+    scenarios = {}
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+
+        def upload_file(i: int):
+            email = verified(f"file{i}@bench.local")
+            document = _document(rng, args.doc_kb)
+            return lambda: client.post(
+                "/upload",
+                data={"email": email, "name": f"Bench {i}"},
+                files={"file": (f"doc{i}.txt", document.encode(), "text/plain")},
+            )
+
+        def upload_url(i: int):
+            email = verified(f"url{i}@bench.local")
+            url = f"http://127.0.0.1:{site.server_address[1]}/index.html"
+            return lambda: client.post(
+                "/upload", data={"email": email, "name": f"Site {i}", "url": url}
+            )
+
+        scenarios["upload_file"], uploaded = await _drive(
+            "upload_file", [upload_file(i) for i in range(args.bots)], args.concurrency
+        )
+        scenarios["upload_url"], _ = await _drive(
+            "upload_url", [upload_url(i) for i in range(args.url_uploads)], args.concurrency
+        )
+        bot_ids = [result["bot_id"] for result in uploaded]
+        if not bot_ids:
+            raise SystemExit("No bots were uploaded; see the app log above")
+        if not args.keep_limits:
+            for bot_id in bot_ids:
+                record = get_bot_record(bot_id) or {}
+                record["limits"] = {"rate_per_second": 1e9, "burst": 1e9, "max_in_flight": 10**6}
+                save_bot_record(bot_id, record)
+
+        def check_existing(i: int):
+            # Half the lookups are for emails without a bot
+            email = f"file{i % args.bots}@bench.local" if i % 2 else f"nobody{i}@bench.local"
+            return lambda: client.post("/check-existing-bot", data={"email": email})
+
+        scenarios["check_existing_bot"], _ = await _drive(
+            "check_existing_bot", [check_existing(i) for i in range(args.requests)], args.concurrency
+        )
+
+        def chat(i: int):
+            body = {"bot_id": rng.choice(bot_ids), "question": _question(rng)}
+            return lambda: client.post("/chat", json=body)
+
+        scenarios["chat"], _ = await _drive(
+            "chat", [chat(i) for i in range(args.requests)], args.concurrency
+        )
+
+        # Follow-up turns: every request continues a session from an earlier turn
+        sessions = []
+        for i in range(args.concurrency):
+            response = await client.post(
+                "/chat", json={"bot_id": bot_ids[i % len(bot_ids)], "question": _question(rng)}
+            )
+            if response.is_success:
+                sessions.append((bot_ids[i % len(bot_ids)], response.json()["session_id"]))
+
+        def chat_history(i: int):
+            bot_id, session_id = sessions[i % len(sessions)]
+            body = {"bot_id": bot_id, "question": _question(rng), "session_id": session_id}
+            return lambda: client.post("/chat", json=body)
+
+        scenarios["chat_history"], _ = await _drive(
+            "chat_history", [chat_history(i) for i in range(args.requests)] if sessions else [],
+            args.concurrency,
+        )
+
+    server.should_exit = True
+    site.shutdown()
+    commit, dirty = _commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+        "scenarios": scenarios,
+        "fake_openai": dict(fake_openai.stats),
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Print per-scenario changes between two result files"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for name, after in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            delta = (after[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            changes.append(f"{key}={before[key]:.1f}->{after[key]:.1f} ({delta:+.0f}%)")
+        print(f"{name:20s} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="per read scenario")
+    parser.add_argument("--bots", type=int, default=20, help="file uploads")
+    parser.add_argument("--url-uploads", type=int, default=4)
+    parser.add_argument("--doc-kb", type=int, default=16)
+    parser.add_argument("--site-pages", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--token-latency-ms", type=float, default=5)
+    parser.add_argument("--qdrant-url", default=":memory:")
+    parser.add_argument("--keep-limits", action="store_true", help="keep production rate limits")
+    parser.add_argument("--no-hot-cache", action="store_true", help="always search Qdrant")
+    parser.add_argument("--app-port", type=int, default=8910)
+    parser.add_argument("--openai-port", type=int, default=8911)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="results file (default bench/results/<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.out:
+        args.out = os.path.abspath(args.out)
+
+    results = asyncio.run(run(args))
+    out = args.out or os.path.join(
+        RESULTS_DIR,
+        f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}_{results['commit']}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
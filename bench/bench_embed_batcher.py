@@ -0,0 +1,75 @@
+# bench/bench_embed_batcher.py
+"""Load test the query embedding micro-batcher against a fake embeddings API.
+
+Usage:
+    python -m bench.bench_embed_batcher [--requests 500] [--concurrency 50]
+        [--latency-ms 80] [--upstream-limit 8] [--window-ms 5] [--max-batch 64]
+
+The fake upstream takes --latency-ms per call and allows at most
+--upstream-limit calls in flight, standing in for OpenAI's round-trip and
+request-rate limits.
+"""
+import argparse
+import asyncio
+import time
+from utils.embed_batcher import EmbeddingBatcher
+
+
+def make_fake_upstream(latency: float, limit: int):
+    semaphore = asyncio.Semaphore(limit)
+    stats = {"calls": 0}
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        async with semaphore:
+            stats["calls"] += 1
+            await asyncio.sleep(latency)
+            return [[float(len(text)), 0.0, 1.0] for text in texts]
+
+    return embed, stats
+
+
+async def run(embed_one, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await embed_one(f"question {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--upstream-limit", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    embed, stats = make_fake_upstream(args.latency_ms / 1000, args.upstream_limit)
+
+    async def unbatched(text):
+        return (await embed([text]))[0]
+
+    elapsed = await run(unbatched, args.requests, args.concurrency)
+    print(
+        f"unbatched: {args.requests / elapsed:8.1f} req/s  "
+        f"{stats['calls']} upstream calls  {elapsed:.2f}s"
+    )
+
+    stats["calls"] = 0
+    batcher = EmbeddingBatcher(embed, window_ms=args.window_ms, max_batch=args.max_batch)
+    elapsed = await run(batcher.embed, args.requests, args.concurrency)
+    print(
+        f"batched:   {args.requests / elapsed:8.1f} req/s  "
+        f"{stats['calls']} upstream calls  {elapsed:.2f}s  "
+        f"(avg batch {batcher.texts / max(1, batcher.calls):.1f})"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
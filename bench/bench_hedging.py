@@ -0,0 +1,88 @@
+# bench/bench_hedging.py
+"""Measure chat completion p50/p99 with and without hedged requests.
+
+Runs against bench/fake_openai.py with a slow tail injected, e.g.
+
+    python -m bench.bench_hedging --calls 400 --slow-rate 0.05 --slow-ms 2000
+
+The first pass calls the LLM directly, the second goes through
+utils.hedging.hedged() with the adaptive p95 delay. Both use the same
+strict timeout and no client-side retries, as /chat does.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from langchain_openai import ChatOpenAI
+from bench import fake_openai
+from config import GENERATE_TIMEOUT_SECONDS
+from utils.hedging import LatencyTracker, hedged
+
+
+def _report(name: str, samples: list[float], errors: int) -> None:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:10s} p50={p50 * 1000:7.1f}ms  p99={p99 * 1000:7.1f}ms  errors={errors}")
+
+
+async def _run(call, calls: int, concurrency: int) -> tuple[list[float], int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                errors += 1
+                return
+            samples.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return samples, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    fake_openai.settings.update(
+        latency_ms=args.latency_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms
+    )
+    server = fake_openai.run_in_thread(args.port)
+
+    llm = ChatOpenAI(
+        api_key="fake",
+        base_url=f"http://127.0.0.1:{args.port}/v1",
+        model="gpt-4o-mini",
+        timeout=GENERATE_TIMEOUT_SECONDS,
+        max_retries=0,
+    )
+    messages = [("human", "What does this bot know about?")]
+
+    samples, errors = await _run(lambda: llm.ainvoke(messages), args.calls, args.concurrency)
+    _report("direct", samples, errors)
+
+    tracker = LatencyTracker("chat completion")
+    samples, errors = await _run(
+        lambda: hedged(lambda: llm.ainvoke(messages), tracker, GENERATE_TIMEOUT_SECONDS),
+        args.calls,
+        args.concurrency,
+    )
+    _report("hedged", samples, errors)
+    print(f"hedges sent: {tracker.hedges}, hedges that won: {tracker.hedge_wins}")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
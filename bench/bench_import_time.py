@@ -0,0 +1,73 @@
+# bench/bench_import_time.py
+"""Check that importing the app stays fast.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and fails
+(exit 1) when the median import time exceeds the budget, or when one of the
+heavy dependencies in utils.warmup.HEAVY_MODULES is imported eagerly again.
+
+    python -m bench.bench_import_time [--runs 5] [--budget-ms 1000]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from utils.warmup import HEAVY_MODULES
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = 1000
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile() -> list[tuple[int, int, str]]:
+    """(self us, cumulative us, module) for every module imported by main"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise SystemExit(f"import main failed:\n{result.stderr[-2000:]}")
+    profile = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            profile.append((int(match.group(1)), int(match.group(2)), match.group(4)))
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    args = parser.parse_args()
+
+    totals, profile = [], []
+    for _ in range(args.runs):
+        profile = import_profile()
+        totals.append(next(cumulative for _, cumulative, name in profile if name == "main") / 1000)
+    median = statistics.median(totals)
+
+    print(f"import main: median {median:.0f}ms over {args.runs} runs (budget {args.budget_ms:.0f}ms)")
+    print("slowest modules (self time, last run):")
+    for self_us, _, name in sorted(profile, reverse=True)[: args.top]:
+        print(f"  {self_us / 1000:7.1f}ms  {name}")
+
+    imported = {name for _, _, name in profile}
+    eager = [module for module in HEAVY_MODULES if module in imported]
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup, should be lazy: {', '.join(eager)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: import time {median:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench/bench_payload_size.py
+"""Compare point payload and search response sizes of the two payload layouts.
+
+Usage:
+    python -m bench.bench_payload_size [--file document.txt] [--url QDRANT_URL]
+        [--bots 20] [--queries 200]
+
+Chunks the document the way store_embedding does and stores every chunk
+twice: in the legacy layout (plain page_content with bot_id, email and name
+in every point) and in the compact layout of utils/payload.py. Reports the
+stored payload bytes, the bytes of top-k search results, and the time spent
+decoding the hits. Without --file a synthetic document is used; its small
+vocabulary compresses better than real text, so pass a real document for
+numbers worth acting on. For existing data, `python qdrant_schema.py compact
+--dry-run` reports the savings directly.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import uuid
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PayloadSchemaType, PointStruct, VectorParams
+from bench.bench_app import _document
+from config import TOP_K_CHUNKS
+from utils.chunker import chunk_segments, structure
+from utils.parser import text_segments
+from utils.payload import chunk_payload, payload_size, payload_text
+from utils.qdrant import bot_filter
+
+DIM = 256
+
+
+def legacy_payload(bot_id: str, chunk: dict) -> dict:
+    metadata = {"bot_id": bot_id, "email": f"owner-{bot_id[:8]}@example.com", "name": "Example Support Bot"}
+    return {"page_content": chunk["text"], "metadata": metadata}
+
+
+def compact_payload(bot_id: str, chunk: dict) -> dict:
+    return chunk_payload(bot_id, chunk["text"], **structure(chunk))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", default=None, help="plain-text document to chunk")
+    parser.add_argument("--url", default=None, help="Qdrant URL (default: in-memory)")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--bots", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r") as f:
+            text = f.read()
+    else:
+        text = _document(random.Random(0), 100)
+    chunks = chunk_segments(text_segments(text))
+    rng = np.random.default_rng(0)
+    client = QdrantClient(url=args.url, api_key=args.api_key) if args.url else QdrantClient(":memory:")
+    bot_ids = [str(uuid.uuid4()) for _ in range(args.bots)]
+    vectors = rng.standard_normal((args.bots, len(chunks), DIM), dtype=np.float32)
+    queries = [(bot_ids[rng.integers(args.bots)], rng.standard_normal(DIM).tolist()) for _ in range(args.queries)]
+
+    print(f"{len(chunks)} chunks per bot, {args.bots} bots, {args.queries} top-{TOP_K_CHUNKS} queries")
+    print(f"{'layout':<9}{'payload B/chunk':>17}{'response B/query':>18}{'decode us/query':>17}")
+    baseline = None
+    for name, make_payload in (("legacy", legacy_payload), ("compact", compact_payload)):
+        collection = f"bench_{uuid.uuid4().hex[:8]}"
+        client.create_collection(collection, vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+        client.create_payload_index(collection, "metadata.bot_id", PayloadSchemaType.KEYWORD)
+        try:
+            stored = []
+            for bot_id, bot_vectors in zip(bot_ids, vectors):
+                payloads = [make_payload(bot_id, chunk) for chunk in chunks]
+                stored += [payload_size(payload) for payload in payloads]
+                client.upsert(
+                    collection_name=collection,
+                    points=[
+                        PointStruct(id=str(uuid.uuid4()), vector=vector.tolist(), payload=payload)
+                        for vector, payload in zip(bot_vectors, payloads)
+                    ],
+                )
+            response_sizes, decode_times = [], []
+            for bot_id, query in queries:
+                points = client.query_points(
+                    collection_name=collection,
+                    query=query,
+                    query_filter=bot_filter(bot_id),
+                    limit=TOP_K_CHUNKS,
+                    with_payload=True,
+                ).points
+                response_sizes.append(len(json.dumps([point.model_dump(mode="json") for point in points])))
+                start = time.perf_counter()
+                for point in points:
+                    payload_text(point.payload)
+                decode_times.append(time.perf_counter() - start)
+        finally:
+            client.delete_collection(collection)
+
+        result = (statistics.mean(stored), statistics.mean(response_sizes))
+        print(
+            f"{name:<9}{result[0]:>17.0f}{result[1]:>18.0f}"
+            f"{statistics.mean(decode_times) * 1e6:>17.1f}"
+        )
+        if baseline is None:
+            baseline = result
+        else:
+            print(f"saved: {1 - result[0] / baseline[0]:.0%} of payload bytes, {1 - result[1] / baseline[1]:.0%} of response bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# bench/bench_qdrant_layout.py
+"""Compare recall and latency of the configured collection layout with the old one.
+
+Usage:
+    python -m bench.bench_qdrant_layout --url QDRANT_URL [--snapshot bots.snap]
+        [--dims 1536 512 256] [--bots 50] [--chunks 200] [--queries 500]
+
+Loads the same bots into throwaway collections, one with the original layout
+(float32 vectors and payloads in RAM, global HNSW graph) and one per --dims
+value with the layout from config.py (int8 quantization with rescoring,
+on-disk vectors and payloads, tenant bot_id index), then reports recall@k
+against exact float32 search, query latency and estimated vector RAM.
+
+Shorter vectors are made the way text-embedding-3 `dimensions` makes them:
+truncated and re-normalized. That only preserves meaning for real
+text-embedding-3 vectors, so pass a snapshot exported with bot_snapshot.py
+for numbers worth acting on; the synthetic default only approximates them.
+Without --url an in-memory local Qdrant is used, which ignores quantization
+and HNSW settings, so only the effect of the dimension is measured.
+"""
+import argparse
+import statistics
+import time
+import uuid
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Distance,
+    PayloadSchemaType,
+    PointStruct,
+    QuantizationSearchParams,
+    SearchParams,
+    VectorParams,
+)
+from config import QDRANT_QUANTIZATION, QDRANT_RESCORE_OVERSAMPLING, QDRANT_VECTORS_ON_DISK, TOP_K_CHUNKS
+from utils.qdrant import PAYLOAD_INDEXES, bot_filter, collection_layout, index_schema
+from utils.snapshot import iter_bot_vectors
+
+DIM = 1536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def synthetic_bots(rng, bots: int, chunks: int) -> list[np.ndarray]:
+    """Clustered vectors whose leading dimensions carry most of the variance"""
+    scale = 1 / np.sqrt(1 + np.arange(DIM) / 64)
+    result = []
+    for _ in range(bots):
+        topics = rng.standard_normal((max(1, chunks // 10), DIM)) * scale
+        vectors = topics[rng.integers(len(topics), size=chunks)]
+        vectors = vectors + 0.5 * rng.standard_normal((chunks, DIM)) * scale
+        result.append(_normalize(vectors).astype(np.float32))
+    return result
+
+
+def make_queries(rng, bots: list[np.ndarray], count: int) -> list[tuple[int, np.ndarray]]:
+    """Perturbed copies of stored chunks, as (bot index, query vector)"""
+    queries = []
+    for _ in range(count):
+        bot = int(rng.integers(len(bots)))
+        vectors = bots[bot]
+        query = vectors[rng.integers(len(vectors))]
+        query = query + 0.3 * np.linalg.norm(query) / np.sqrt(len(query)) * rng.standard_normal(len(query))
+        queries.append((bot, query.astype(np.float32)))
+    return queries
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> set[int]:
+    scores = _normalize(vectors) @ _normalize(query)
+    return set(np.argsort(-scores)[:k].tolist())
+
+
+def load(client: QdrantClient, collection: str, bots: list[np.ndarray], bot_ids: list[str], dim: int) -> None:
+    """Upsert every bot; point ids number the chunks of all bots consecutively"""
+    next_id = 0
+    for bot_id, vectors in zip(bot_ids, bots):
+        vectors = _normalize(vectors[:, :dim])
+        for start in range(0, len(vectors), 256):
+            batch = vectors[start : start + 256]
+            client.upsert(
+                collection_name=collection,
+                points=[
+                    PointStruct(id=next_id + i, vector=vector.tolist(), payload={"metadata": {"bot_id": bot_id}})
+                    for i, vector in enumerate(batch)
+                ],
+            )
+            next_id += len(batch)
+
+
+def wait_indexed(client: QdrantClient, collection: str, timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection).status != "green" and time.monotonic() < deadline:
+        time.sleep(0.5)
+
+
+def run_layout(client, collection, bots, bot_ids, queries, truth, dim, search_params) -> dict:
+    offsets = np.cumsum([0] + [len(vectors) for vectors in bots])
+    latencies, recalls = [], []
+    for (bot, query), expected in zip(queries, truth):
+        query = _normalize(query[:dim])
+        start = time.perf_counter()
+        points = client.query_points(
+            collection_name=collection,
+            query=query.tolist(),
+            query_filter=bot_filter(bot_ids[bot]),
+            search_params=search_params,
+            limit=TOP_K_CHUNKS,
+        ).points
+        latencies.append(time.perf_counter() - start)
+        found = {point.id - offsets[bot] for point in points}
+        recalls.append(len(found & expected) / len(expected))
+    latencies.sort()
+    return {
+        "recall": statistics.mean(recalls),
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="Qdrant URL (default: in-memory)")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--snapshot", default=None, help="bot snapshot with real embeddings")
+    parser.add_argument("--dims", type=int, nargs="+", default=[DIM, 512, 256])
+    parser.add_argument("--bots", type=int, default=50, help="synthetic bots")
+    parser.add_argument("--chunks", type=int, default=200, help="chunks per synthetic bot")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.snapshot:
+        with open(args.snapshot, "rb") as src:
+            bots = [vectors for _, vectors in iter_bot_vectors(src)]
+    else:
+        bots = synthetic_bots(rng, args.bots, args.chunks)
+    full_dim = bots[0].shape[1]
+    bot_ids = [str(uuid.uuid4()) for _ in bots]
+    queries = make_queries(rng, bots, args.queries)
+    truth = [exact_top_k(bots[bot], query, TOP_K_CHUNKS) for bot, query in queries]
+    points = sum(len(vectors) for vectors in bots)
+    client = QdrantClient(url=args.url, api_key=args.api_key) if args.url else QdrantClient(":memory:")
+
+    rescore = None
+    if QDRANT_QUANTIZATION:
+        rescore = SearchParams(
+            quantization=QuantizationSearchParams(rescore=True, oversampling=QDRANT_RESCORE_OVERSAMPLING)
+        )
+    layouts = [("original", full_dim, None)] + [("configured", dim, rescore) for dim in args.dims if dim <= full_dim]
+    print(f"{len(bots)} bots, {points} chunks, {len(queries)} queries, top-{TOP_K_CHUNKS}")
+    print(f"{'layout':<12}{'dims':>6}{'recall@k':>10}{'p50 ms':>9}{'p95 ms':>9}{'vector RAM MB':>15}")
+    for name, dim, search_params in layouts:
+        collection = f"bench_{uuid.uuid4().hex[:8]}"
+        if name == "original":
+            client.create_collection(collection, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+            for field_name in PAYLOAD_INDEXES:
+                client.create_payload_index(collection, field_name, PayloadSchemaType.KEYWORD)
+            ram = points * dim * 4
+        else:
+            client.create_collection(collection, **collection_layout(dim))
+            for field_name in PAYLOAD_INDEXES:
+                client.create_payload_index(collection, field_name, index_schema(field_name))
+            ram = (0 if QDRANT_VECTORS_ON_DISK else points * dim * 4) + (points * dim if QDRANT_QUANTIZATION else 0)
+        try:
+            load(client, collection, bots, bot_ids, dim)
+            wait_indexed(client, collection)
+            result = run_layout(client, collection, bots, bot_ids, queries, truth, dim, search_params)
+        finally:
+            client.delete_collection(collection)
+        print(
+            f"{name:<12}{dim:>6}{result['recall']:>10.3f}{result['p50'] * 1000:>9.2f}"
+            f"{result['p95'] * 1000:>9.2f}{ram / 1024 / 1024:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# bench/bench_retrieval.py
+"""Compare retrieval quality, latency and prompt size across chunking and top-k settings.
+
+Usage:
+    python -m bench.bench_retrieval [--corpus bench/fixtures/retrieval]
+        [--chunkers flat,structured] [--chunk-sizes 500,1000,1500]
+        [--overlaps 0,100,200] [--top-k 3,5,8] [--embedder local|openai]
+        [--json results.json]
+
+Every .txt file in the corpus directory is one source of a single bot. Each
+setting chunks the corpus, either flat (one character splitter over the whole
+text) or structured (utils.chunker along the markdown headings, as
+store_embedding does for a .txt upload), searches it with the
+hot-bot cache's brute-force search and assembles the hits with build_context,
+as /chat does. questions.jsonl holds the labelled questions: each names its
+source and an evidence span that answers it, and a retrieved chunk is
+relevant when it contains the whole span.
+
+Columns:
+  chunks      vectors stored for the corpus
+  recall@k    share of questions with a relevant chunk in the top k
+  MRR         mean of 1 / rank of the first relevant chunk (0 when missed)
+  in ctx      share with the evidence still in the assembled context, after
+              merging, de-duplication and the token budget
+  tokens      mean context tokens per prompt
+  p50/p95 ms  search and context assembly; query embedding is the same for
+              every setting and left out
+
+The default local embedder hashes words and word pairs into a fixed-size
+vector: deterministic, offline and free, but purely lexical, so it
+underrates paraphrased questions. Use it to compare settings with each
+other; `--embedder openai` embeds with EMBEDDING_MODEL for absolute numbers.
+The current config (structured, CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_CHUNKS) is
+marked *.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import time
+import zlib
+from collections import Counter
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+import utils.context
+from config import CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_DIM, EMBEDDING_MODEL, TOP_K_CHUNKS
+from utils.chunker import chunk_segments
+from utils.context import build_context
+from utils.parser import text_segments
+from utils.payload import encode_text
+from utils.vector_cache import HotBot
+
+LOCAL_DIM = 1024
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or so "
+    "that the this to was what when where which who why will with you your".split()
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def _terms(text: str) -> list[str]:
+    words = []
+    for word in re.findall(r"[\w$%.]+", text.lower()):
+        word = word.strip(".")
+        if not word or word in STOPWORDS:
+            continue
+        # Crude stemming, so "expire" matches "expires" and "invitation" matches "invitations"
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[: -len(suffix)]
+                break
+        words.append(word)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def local_embed(texts: list[str]) -> np.ndarray:
+    """Hashed bag of words and word pairs with log term frequencies"""
+    vectors = np.zeros((len(texts), LOCAL_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for term, count in Counter(_terms(text)).items():
+            digest = zlib.crc32(term.encode())
+            sign = 1.0 if digest & 1 else -1.0
+            vectors[row, (digest >> 1) % LOCAL_DIM] += sign * (1 + math.log(count))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class CachedEmbedder:
+    """Embeds each distinct text once across the whole sweep"""
+
+    def __init__(self, embed):
+        self.embed = embed
+        self.cache: dict[str, np.ndarray] = {}
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        missing = list(dict.fromkeys(text for text in texts if text not in self.cache))
+        if missing:
+            self.cache.update(zip(missing, np.asarray(self.embed(missing), dtype=np.float32)))
+        return np.stack([self.cache[text] for text in texts])
+
+
+def load_corpus(path: str) -> tuple[dict[str, str], list[dict]]:
+    sources = {}
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".txt"):
+            with open(os.path.join(path, name), "r") as f:
+                sources[name] = f.read()
+    with open(os.path.join(path, "questions.jsonl"), "r") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    for question in questions:
+        if _normalize(question["evidence"]) not in _normalize(sources.get(question["source"], "")):
+            raise SystemExit(f"Evidence not found in {question['source']}: {question['evidence']!r}")
+    return sources, questions
+
+
+def split(text: str, chunker: str, chunk_size: int, overlap: int) -> list[str]:
+    if chunker == "structured":
+        return [chunk["text"] for chunk in chunk_segments(text_segments(text), chunk_size, overlap)]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap, length_function=len)
+    return splitter.split_text(text)
+
+
+def evaluate(sources: dict[str, str], questions: list[dict], query_vectors: np.ndarray, embed,
+             chunker: str, chunk_size: int, overlap: int, top_ks: list[int]) -> list[dict]:
+    """One row per top-k for a chunking setting"""
+    chunks = [chunk for text in sources.values() for chunk in split(text, chunker, chunk_size, overlap)]
+    bot = HotBot(embed(chunks), [encode_text(chunk) for chunk in chunks])
+    # merge_chunks looks for overlaps up to CHUNK_OVERLAP characters
+    utils.context.CHUNK_OVERLAP = overlap
+
+    rows = []
+    for k in top_ks:
+        ranks, in_context, tokens, latencies = [], [], [], []
+        for question, query_vector in zip(questions, query_vectors):
+            evidence = _normalize(question["evidence"])
+            start = time.perf_counter()
+            hits = bot.search(query_vector, k)
+            context, context_tokens, _ = build_context(hits)
+            latencies.append(time.perf_counter() - start)
+            rank = next((i for i, hit in enumerate(hits, 1) if evidence in _normalize(hit)), None)
+            ranks.append(rank)
+            in_context.append(evidence in _normalize(context))
+            tokens.append(context_tokens)
+        latencies.sort()
+        rows.append(
+            {
+                "chunker": chunker,
+                "chunk_size": chunk_size,
+                "overlap": overlap,
+                "top_k": k,
+                "chunks": len(chunks),
+                "recall": sum(rank is not None for rank in ranks) / len(ranks),
+                "mrr": sum(1 / rank for rank in ranks if rank) / len(ranks),
+                "in_context": sum(in_context) / len(in_context),
+                "tokens": statistics.mean(tokens),
+                "p50_ms": statistics.median(latencies) * 1000,
+                "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+            }
+        )
+    return rows
+
+
+def _ints(value: str) -> list[int]:
+    return [int(part) for part in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "fixtures", "retrieval"))
+    parser.add_argument("--chunkers", type=lambda value: value.split(","), default=["flat", "structured"])
+    parser.add_argument("--chunk-sizes", type=_ints, default=[500, 1000, 1500])
+    parser.add_argument("--overlaps", type=_ints, default=[0, 100, 200])
+    parser.add_argument("--top-k", type=_ints, default=[3, 5, 8])
+    parser.add_argument("--embedder", choices=["local", "openai"], default="local")
+    parser.add_argument("--json", default=None, help="also write the rows to this file")
+    args = parser.parse_args()
+
+    sources, questions = load_corpus(args.corpus)
+    if args.embedder == "openai":
+        from utils.embed_batcher import openai_embeddings
+
+        embed = CachedEmbedder(openai_embeddings(EMBEDDING_MODEL, EMBEDDING_DIM).embed_documents)
+    else:
+        embed = CachedEmbedder(local_embed)
+    query_vectors = embed([question["question"] for question in questions])
+
+    print(f"{len(sources)} sources, {len(questions)} questions, {args.embedder} embedder")
+    print(
+        f"  {'chunker':<11}{'size':>5}{'overlap':>8}{'k':>3}{'chunks':>8}{'recall@k':>10}{'MRR':>7}"
+        f"{'in ctx':>8}{'tokens':>8}{'p50 ms':>8}{'p95 ms':>8}"
+    )
+    rows = []
+    current_setting = ("structured", CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_CHUNKS)
+    for chunker in args.chunkers:
+        for chunk_size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                if overlap >= chunk_size:
+                    continue
+                for row in evaluate(sources, questions, query_vectors, embed, chunker, chunk_size, overlap, args.top_k):
+                    row["current"] = (chunker, chunk_size, overlap, row["top_k"]) == current_setting
+                    rows.append(row)
+                    print(
+                        f"{'*' if row['current'] else ' '} {chunker:<11}{chunk_size:>5}{overlap:>8}{row['top_k']:>3}"
+                        f"{row['chunks']:>8}{row['recall']:>10.0%}{row['mrr']:>7.2f}{row['in_context']:>8.0%}"
+                        f"{row['tokens']:>8.0f}{row['p50_ms']:>8.2f}{row['p95_ms']:>8.2f}"
+                    )
+
+    current = next((row for row in rows if row["current"]), None)
+    if current:
+        better = [
+            row for row in rows
+            if row["in_context"] >= current["in_context"] and row["tokens"] < current["tokens"]
+        ]
+        better.sort(key=lambda row: row["tokens"])
+        print(f"Settings at least as accurate as the current one (in ctx) with smaller prompts: {len(better)}")
+        for row in better[:5]:
+            print(
+                f"  {row['chunker']} size={row['chunk_size']} overlap={row['overlap']} k={row['top_k']}: "
+                f"{row['in_context']:.0%} in ctx, {row['tokens']:.0f} tokens"
+            )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench/bench_vector_cache.py
+"""Compare top-k latency of the in-process hot-bot cache against Qdrant search.
+
+Usage:
+    python -m bench.bench_vector_cache [--url QDRANT_URL] [--bots 50] [--chunks 200]
+
+Without --url an in-memory local Qdrant is used. Pointing it at a real cluster
+(a throwaway collection is created and dropped) includes the network round-trip
+that the cache saves.
+"""
+import argparse
+import statistics
+import time
+import uuid
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchValue,
+    PayloadSchemaType,
+    PointStruct,
+    VectorParams,
+)
+from config import TOP_K_CHUNKS
+from utils.payload import encode_text
+from utils.vector_cache import HotBot
+
+DIM = 1536
+
+
+def _percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50={p50 * 1000:.3f}ms p99={p99 * 1000:.3f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="Qdrant URL (default: in-memory)")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=200, help="Chunks per bot")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    client = QdrantClient(url=args.url, api_key=args.api_key) if args.url else QdrantClient(":memory:")
+    collection = f"bench_{uuid.uuid4().hex[:8]}"
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=DIM, distance=Distance.COSINE),
+    )
+    client.create_payload_index(
+        collection_name=collection,
+        field_name="metadata.bot_id",
+        field_schema=PayloadSchemaType.KEYWORD,
+    )
+
+    try:
+        bot_ids = [str(uuid.uuid4()) for _ in range(args.bots)]
+        hot_bots = {}
+        for bot_id in bot_ids:
+            vectors = rng.standard_normal((args.chunks, DIM), dtype=np.float32)
+            texts = [f"chunk {i} of {bot_id}" for i in range(args.chunks)]
+            client.upsert(
+                collection_name=collection,
+                points=[
+                    PointStruct(
+                        id=str(uuid.uuid4()),
+                        vector=vector.tolist(),
+                        payload={"page_content": text, "metadata": {"bot_id": bot_id}},
+                    )
+                    for vector, text in zip(vectors, texts)
+                ],
+            )
+            hot_bots[bot_id] = HotBot(vectors, [encode_text(text) for text in texts])
+
+        qdrant_times, cache_times, overlaps = [], [], []
+        for _ in range(args.queries):
+            bot_id = bot_ids[rng.integers(len(bot_ids))]
+            query = rng.standard_normal(DIM, dtype=np.float32)
+
+            start = time.perf_counter()
+            hits = client.query_points(
+                collection_name=collection,
+                query=query.tolist(),
+                query_filter=Filter(
+                    must=[FieldCondition(key="metadata.bot_id", match=MatchValue(value=bot_id))]
+                ),
+                limit=TOP_K_CHUNKS,
+                with_payload=True,
+            ).points
+            qdrant_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            cached = hot_bots[bot_id].search(query, TOP_K_CHUNKS)
+            cache_times.append(time.perf_counter() - start)
+
+            expected = {hit.payload["page_content"] for hit in hits}
+            overlaps.append(len(expected & set(cached)) / max(1, len(expected)))
+
+        print(f"bots={args.bots} chunks/bot={args.chunks} k={TOP_K_CHUNKS} queries={args.queries}")
+        print(f"qdrant      {_percentiles(qdrant_times)}")
+        print(f"numpy cache {_percentiles(cache_times)}")
+        print(f"top-k agreement: {statistics.mean(overlaps):.3f}")
+    finally:
+        client.delete_collection(collection_name=collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# bench/fake_openai.py
+"""Local stand-in for the OpenAI API, for benchmarks.
+
+Serves /v1/embeddings (deterministic hashed bag-of-words vectors) and
+/v1/chat/completions (canned answer) with injectable latency:
+
+    FAKE_OPENAI_LATENCY_MS        base latency of every call (default 50)
+    FAKE_OPENAI_TOKEN_LATENCY_MS  extra latency per completion token (default 0)
+    FAKE_OPENAI_SLOW_RATE         fraction of calls that are slow (default 0)
+    FAKE_OPENAI_SLOW_MS           latency of a slow call (default 2000)
+
+Usage:
+    python -m bench.fake_openai [--port 8900]
+then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1.
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import os
+import random
+import re
+import threading
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+
+settings = {
+    "latency_ms": float(os.getenv("FAKE_OPENAI_LATENCY_MS", 50)),
+    "token_latency_ms": float(os.getenv("FAKE_OPENAI_TOKEN_LATENCY_MS", 0)),
+    "slow_rate": float(os.getenv("FAKE_OPENAI_SLOW_RATE", 0)),
+    "slow_ms": float(os.getenv("FAKE_OPENAI_SLOW_MS", 2000)),
+}
+stats = {"embedding_calls": 0, "embedding_inputs": 0, "chat_calls": 0}
+
+ANSWER = "This is a canned answer from the local fake OpenAI server."
+
+
+def hash_embedding(text: str, dim: int = 1536) -> list[float]:
+    """Deterministic bag-of-words embedding: similar texts get similar vectors"""
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[index] += sign
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+async def _inject_latency(extra_ms: float = 0) -> None:
+    latency = settings["latency_ms"] + extra_ms
+    if random.random() < settings["slow_rate"]:
+        latency = settings["slow_ms"]
+    await asyncio.sleep(latency / 1000)
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"]
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    dim = body.get("dimensions") or 1536
+    stats["embedding_calls"] += 1
+    stats["embedding_inputs"] += len(inputs)
+    await _inject_latency()
+    data = []
+    for i, item in enumerate(inputs):
+        # LangChain may send pre-tokenized input; hash the token ids then
+        text = item if isinstance(item, str) else " ".join(str(t) for t in item)
+        data.append({"object": "embedding", "index": i, "embedding": hash_embedding(text, dim)})
+    tokens = sum(len(str(item).split()) for item in inputs)
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["chat_calls"] += 1
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body["messages"])
+    completion_tokens = len(ANSWER.split())
+    await _inject_latency(settings["token_latency_ms"] * completion_tokens)
+    return {
+        "id": f"chatcmpl-{stats['chat_calls']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": ANSWER},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
+
+
+def run_in_thread(port: int = 8900, target=app) -> uvicorn.Server:
+    """Serve an ASGI app (the fake server by default) in a daemon thread and
+    wait until it accepts requests"""
+    server = uvicorn.Server(
+        uvicorn.Config(target, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
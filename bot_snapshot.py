@@ -0,0 +1,71 @@
+"""Export bots to a snapshot file, or restore them, without re-embedding.
+
+    python bot_snapshot.py export BOT_ID [BOT_ID ...] -o bots.snap
+    python bot_snapshot.py export --all -o all.snap
+    python bot_snapshot.py import bots.snap [--replace] [--bot-id BOT_ID ...]
+
+Snapshots hold each bot's vectors, payloads, bot record and tracker records
+(see utils/snapshot.py). Export and import stream, so memory use doesn't grow
+with bot count. Use "-" for stdout/stdin to pipe between clusters:
+
+    QDRANT_URL=... python bot_snapshot.py export --all -o - | \\
+        QDRANT_URL=... python bot_snapshot.py import -
+
+A running server caches bot records and hot bots, so restart it after
+importing with --replace over bots it has served.
+"""
+import argparse
+import logging
+import sys
+import time
+from utils.snapshot import export_bots, import_snapshot
+from utils.tracker import tracked_bot_ids
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write bots to a snapshot")
+    export_parser.add_argument("bot_ids", nargs="*")
+    export_parser.add_argument("--all", action="store_true", help="every bot in the tracker")
+    export_parser.add_argument("-o", "--output", required=True, help='snapshot file, or "-"')
+
+    import_parser = commands.add_parser("import", help="restore bots from a snapshot")
+    import_parser.add_argument("snapshot", help='snapshot file, or "-"')
+    import_parser.add_argument("--replace", action="store_true", help="overwrite existing bots")
+    import_parser.add_argument("--bot-id", action="append", help="only restore these bots")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "export":
+        if bool(args.bot_ids) == args.all:
+            parser.error("give bot ids or --all")
+        bot_ids = tracked_bot_ids() if args.all else args.bot_ids
+        if args.output == "-":
+            totals = export_bots(bot_ids, sys.stdout.buffer)
+        else:
+            with open(args.output, "wb") as out:
+                totals = export_bots(bot_ids, out)
+        logger.info(
+            f"Exported {totals['bots']} bots, {totals['points']} points, "
+            f"{totals['bytes'] / 1024 / 1024:.1f} MB in {time.perf_counter() - start:.1f}s"
+        )
+    else:
+        only = set(args.bot_id) if args.bot_id else None
+        if args.snapshot == "-":
+            totals = import_snapshot(sys.stdin.buffer, args.replace, only)
+        else:
+            with open(args.snapshot, "rb") as src:
+                totals = import_snapshot(src, args.replace, only)
+        logger.info(
+            f"Imported {totals['bots']} bots, {totals['points']} points "
+            f"({totals['skipped']} skipped) in {time.perf_counter() - start:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Bulk-create bots from a manifest, without OTP checks or per-upload calls.
+
+The manifest is CSV (with a header row) or JSONL, one bot per row with
+`email`, `name` and either `path` (a .pdf/.docx/.txt file, relative to the
+manifest) or `url`. Files are parsed and sites scraped in a process pool while
+embedding and upserting run concurrently on the event loop. Rows with the same
+email are ingested one after another, as sources of one bot.
+
+Finished rows are appended to <manifest>.checkpoint.jsonl; rerunning the same
+command skips them, so an interrupted run picks up where it stopped.
+
+    python bulk_ingest.py customers.csv [--concurrency 4] [--parse-workers 4]
+                                        [--replace] [--send-emails]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from config import INGEST_CONCURRENCY, INGEST_PARSE_WORKERS
+from utils.bot_records import delete_bot_record, get_bot_record
+from utils.embedding import store_embedding
+from utils.emailer import send_embed_script_email
+from utils.migration import bot_collections
+from utils.qdrant import delete_bot_points, ensure_collection, find_bot_by_email
+from utils.tracker import log_upload
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def read_manifest(path: str) -> list[dict]:
+    """Rows of a CSV or JSONL manifest, with sources resolved"""
+    with open(path, "r", newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    manifest = []
+    for number, row in enumerate(rows, start=1):
+        email, name = (row.get("email") or "").strip(), (row.get("name") or "").strip()
+        url, file_path = (row.get("url") or "").strip(), (row.get("path") or "").strip()
+        if not email or not name or bool(url) == bool(file_path):
+            raise SystemExit(f"Manifest row {number}: need email, name and one of path or url")
+        source = url or os.path.join(base_dir, file_path)
+        manifest.append(
+            {
+                "key": f"{email}|{url or file_path}",
+                "email": email,
+                "name": name,
+                "source": source,
+                "is_url": bool(url),
+            }
+        )
+    return manifest
+
+
+def extract_segments(source: str, is_url: bool) -> Optional[list[dict]]:
+    """Parse a file or scrape a site into segments (runs in a worker process)"""
+    if is_url:
+        from utils.scraper import scrape_site
+
+        return scrape_site(source)
+
+    from fastapi import UploadFile
+    from utils.parser import parse_file
+
+    with open(source, "rb") as f:
+        return asyncio.run(parse_file(UploadFile(file=f, filename=os.path.basename(source))))
+
+
+class Checkpoint:
+    """Append-only log of finished manifest rows"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: set[str] = set()
+        # email -> bot_id of the bots this manifest created, for the owner's next rows
+        self.bots: dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.done.add(entry["key"])
+                    except (ValueError, KeyError):
+                        continue  # Torn last line from an interrupted run
+                    if entry.get("status") == "done":
+                        self.bots[entry["key"].split("|", 1)[0]] = entry["bot_id"]
+        self._file = open(path, "a")
+
+    def record(self, key: str, **fields) -> None:
+        self._file.write(json.dumps({"key": key, **fields}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.add(key)
+        if fields.get("status") == "done":
+            self.bots[key.split("|", 1)[0]] = fields["bot_id"]
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Throughput:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.docs = self.chunks = self.tokens = self.failed = self.skipped = 0
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        return (
+            f"{self.docs} docs, {self.chunks} chunks, {self.tokens} tokens in {elapsed:.1f}s "
+            f"({self.docs / elapsed:.2f} docs/s, {self.chunks / elapsed:.1f} chunks/s, "
+            f"{self.tokens / elapsed:.0f} tokens/s); {self.skipped} skipped, {self.failed} failed"
+        )
+
+
+async def ingest(manifest: list[dict], checkpoint: Checkpoint, args) -> Throughput:
+    loop = asyncio.get_running_loop()
+    stats = Throughput()
+    # Bound parsed-but-not-embedded documents so memory stays flat on big manifests
+    in_flight = asyncio.Semaphore(args.concurrency + args.parse_workers)
+    embedding = asyncio.Semaphore(args.concurrency)
+    await asyncio.to_thread(ensure_collection)
+
+    async def ingest_row(row: dict, pool: ProcessPoolExecutor):
+        async with in_flight:
+            try:
+                # The owner's earlier rows in this manifest made a bot: add this source to it
+                bot_id = checkpoint.bots.get(row["email"])
+                existing_bot_id = None
+                if bot_id is None:
+                    existing_bot_id = await asyncio.to_thread(find_bot_by_email, row["email"])
+                if existing_bot_id and not args.replace:
+                    logger.info(f"Skipping {row['email']}: already has bot_id {existing_bot_id}")
+                    stats.skipped += 1
+                    checkpoint.record(row["key"], status="skipped", bot_id=existing_bot_id)
+                    return
+
+                segments = await loop.run_in_executor(pool, extract_segments, row["source"], row["is_url"])
+                if not segments:
+                    raise ValueError(f"no text extracted from {row['source']}")
+
+                if existing_bot_id:
+                    for collection in bot_collections(existing_bot_id):
+                        await asyncio.to_thread(delete_bot_points, existing_bot_id, collection)
+                    delete_bot_record(existing_bot_id)
+                created = bot_id is None
+                async with embedding:
+                    source_name = row["source"] if row["is_url"] else os.path.basename(row["source"])
+                    bot_id, source_id = await store_embedding(
+                        segments, row["email"], row["name"], source_name, bot_id
+                    )
+                log_upload(row["email"], bot_id, source_name, row["name"])
+                if args.send_emails and created:
+                    await asyncio.to_thread(send_embed_script_email, row["email"], bot_id, row["name"])
+            except Exception as e:
+                # Not checkpointed, so a rerun retries it
+                logger.error(f"Failed to ingest {row['key']}: {str(e)}")
+                stats.failed += 1
+                return
+
+            record = get_bot_record(bot_id) or {}
+            source = next((s for s in record.get("sources", []) if s["source_id"] == source_id), {})
+            stats.docs += 1
+            stats.chunks += source.get("chunk_count", 0)
+            stats.tokens += source.get("token_count", 0)
+            checkpoint.record(row["key"], status="done", bot_id=bot_id)
+            logger.info(f"Ingested {row['email']} as bot_id {bot_id} | {stats.report()}")
+
+    async def ingest_owner(rows: list[dict], pool: ProcessPoolExecutor):
+        # One at a time, so concurrent rows can't each create a bot for the same email
+        for row in rows:
+            await ingest_row(row, pool)
+
+    owners: dict[str, list[dict]] = {}
+    for row in manifest:
+        owners.setdefault(row["email"], []).append(row)
+    with ProcessPoolExecutor(max_workers=args.parse_workers) as pool:
+        await asyncio.gather(*(ingest_owner(rows, pool) for rows in owners.values()))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest", help="CSV or JSONL file of email, name, path/url")
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY)
+    parser.add_argument("--parse-workers", type=int, default=INGEST_PARSE_WORKERS)
+    parser.add_argument("--replace", action="store_true", help="replace existing bots")
+    parser.add_argument("--send-emails", action="store_true", help="email each customer their embed script")
+    args = parser.parse_args()
+
+    manifest = read_manifest(args.manifest)
+    checkpoint = Checkpoint(f"{args.manifest}.checkpoint.jsonl")
+    pending = [row for row in manifest if row["key"] not in checkpoint.done]
+    logger.info(f"{len(manifest)} rows, {len(manifest) - len(pending)} already done")
+    try:
+        stats = asyncio.run(ingest(pending, checkpoint, args))
+    finally:
+        checkpoint.close()
+    logger.info(f"Finished: {stats.report()}")
+
+
+if __name__ == "__main__":
+    main()
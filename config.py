@@ -2,6 +2,13 @@
 
 # Embedding model
 EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536  # Vector size of COLLECTION_NAME
+# Native vector sizes; text-embedding-3 models can also return shorter vectors
+EMBEDDING_MODEL_DIMS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
 
@@ -12,6 +19,106 @@ LLM_MAX_TOKENS = 1000
 
 # Retrieval
 TOP_K_CHUNKS = 5
+TINY_BOT_TOKEN_BUDGET = 1500  # Bots whose whole text fits this skip retrieval
+EMBED_BATCH_WINDOW_MS = 5  # How long to collect concurrent query texts
+EMBED_BATCH_MAX_SIZE = 64  # Send the batch early once this many texts are waiting
+
+# Prompt assembly
+CONTEXT_TOKEN_BUDGET = 2000
+HISTORY_TOKEN_BUDGET = 800
+HISTORY_MESSAGE_MAX_TOKENS = 200
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Word-set Jaccard similarity above which chunks are dropped
 
 # Qdrant
 COLLECTION_NAME = "docative"
+# Collection layout, applied by `python qdrant_schema.py apply`
+QDRANT_QUANTIZATION = True  # int8 copies of the vectors kept in RAM for search
+QDRANT_QUANTILE = 0.99  # Share of vector values that set the int8 range; outliers are clipped
+QDRANT_RESCORE_OVERSAMPLING = 2.0  # Quantized candidates fetched per hit, rescored with full vectors
+QDRANT_VECTORS_ON_DISK = True  # Full float32 vectors are only read for rescoring
+QDRANT_PAYLOAD_ON_DISK = True
+# Every search is filtered to one bot, so build per-bot HNSW graphs instead of a global one
+QDRANT_HNSW_M = 0
+QDRANT_HNSW_PAYLOAD_M = 16
+CHUNK_TEXT_ZSTD_LEVEL = 9  # Compression of chunk text in point payloads
+
+# Admin notifications
+ADMIN_DIGEST_BATCH_SIZE = 1  # Send a digest after this many signups
+ADMIN_DIGEST_INTERVAL_MINUTES = 0  # Also send pending signups every T minutes (0 = off)
+
+# Hot-bot vector cache
+HOT_BOT_CACHE_MAX_MB = 256  # Memory cap for cached bot vectors and texts
+HOT_BOT_MAX_CHUNKS = 500  # Bots with more chunks always use Qdrant search
+HOT_BOT_WARM_COUNT = 100  # Bots pre-loaded from the previous process at startup
+
+# Chat sessions
+SESSION_TTL_MINUTES = 30
+SESSION_MAX_COUNT = 10000  # Least recently used sessions are dropped beyond this
+SESSION_MAX_RECENT_MESSAGES = 6  # Older messages are rolled up into the summary
+SESSION_SUMMARY_MAX_TOKENS = 300
+SESSION_SUMMARY_LINE_TOKENS = 40  # Each rolled-up message is cut to this length
+
+# Admission control for /chat (per-bot values can be overridden in the bot record)
+GLOBAL_RATE_PER_SECOND = 50
+GLOBAL_RATE_BURST = 100
+BOT_RATE_PER_SECOND = 2
+BOT_RATE_BURST = 10
+BOT_MAX_IN_FLIGHT = 5
+LLM_MAX_CONCURRENCY = 32  # Concurrent LLM calls per worker
+LLM_MAX_QUEUE = 64  # Requests allowed to wait for an LLM slot
+LLM_QUEUE_TIMEOUT_SECONDS = 2
+
+# Upstream deadlines and hedging for /chat
+CHAT_REQUEST_BUDGET_SECONDS = 20  # Overall deadline for one /chat request
+EMBED_TIMEOUT_SECONDS = 3
+RETRIEVE_TIMEOUT_SECONDS = 3
+QDRANT_BULK_TIMEOUT_SECONDS = 30  # Upserts, deletes and scans of whole bots or collections
+GENERATE_TIMEOUT_SECONDS = 15
+HEDGE_PERCENTILE = 0.95  # Send a duplicate request after this latency percentile
+HEDGE_MIN_SAMPLES = 20  # Latency samples needed before hedging starts
+HEDGE_MIN_DELAY_SECONDS = 0.05
+HEDGE_BUDGET_RATIO = 0.1  # Hedges allowed per call, so hedging adds at most this much load
+HEDGE_BUDGET_BURST = 10  # Unused hedge allowance kept for bursts of slow calls
+HEDGE_THREAD_SHARE = 0.5  # No Qdrant search hedges while searches hold this share of the thread pool
+
+# Circuit breakers (embeddings, chat completions, Qdrant searches and bulk calls, SMTP)
+BREAKER_WINDOW = 20  # Recent calls considered
+BREAKER_MIN_CALLS = 10  # Calls needed before the breaker can trip
+BREAKER_FAILURE_RATE = 0.5  # Share of failed or slow calls that trips the breaker
+BREAKER_OPEN_SECONDS = 30  # Fail fast for this long before probing again
+BREAKER_SLOW_CALL_RATIO = 0.5  # Calls taking this share of their timeout count as slow
+BREAKER_HALF_OPEN_PROBES = 1
+SMTP_TIMEOUT_SECONDS = 10
+
+# Per-request profiling (X-Profile: 1 with the admin key, or random sampling)
+PROFILE_SAMPLE_RATE = 0.0  # Fraction of requests profiled without the header
+PROFILE_INTERVAL_MS = 5
+PROFILE_DIR = "profiles"
+PROFILE_MAX_FILES = 50  # Oldest profiles are deleted beyond this
+
+# Per-bot cost and latency ledger
+LEDGER_DB = "db/ledger.sqlite3"
+LEDGER_BATCH_SIZE = 200  # Entries written per transaction
+LEDGER_FLUSH_SECONDS = 2  # Maximum delay before queued entries are written
+LEDGER_MAX_AGE_DAYS = 90  # Older entries are deleted
+LEDGER_MAX_ROWS = 5_000_000  # Oldest entries are deleted beyond this
+LEDGER_PRUNE_EVERY = 10_000  # Entries written between prunes (and one at startup)
+
+# Bulk ingestion (bulk_ingest.py)
+INGEST_CONCURRENCY = 4  # Documents embedded and upserted at once
+INGEST_PARSE_WORKERS = 4  # Processes parsing files and scraping URLs
+
+# Bot snapshots (bot_snapshot.py)
+SNAPSHOT_BATCH_SIZE = 256  # Points read, written and upserted at a time
+
+# Re-embedding migration to a new embedding model (/admin/migration)
+MIGRATION_STATE_FILE = "db/migration.json"
+MIGRATION_CHUNKS_PER_SECOND = 50  # Throttle so live traffic keeps most of the API quota
+MIGRATION_BATCH_SIZE = 64  # Chunks re-embedded and upserted at a time
+
+# Vector garbage collection (/admin/vector-gc)
+VECTOR_GC_STATE_FILE = "db/vector_gc.json"
+VECTOR_GC_INTERVAL_MINUTES = 0  # Run the reconciler in the background every N minutes (0 = off)
+VECTOR_GC_DRY_RUN = True  # Background runs only report what they would delete
+VECTOR_GC_GRACE_MINUTES = 60  # Garbage is deleted only once seen this long, so in-flight uploads are safe
+VECTOR_GC_POINTS_PER_SECOND = 500  # Delete throttle, to keep Qdrant responsive
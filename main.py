@@ -1,32 +1,77 @@
-from fastapi import FastAPI, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, Form, HTTPException, Header
+from fastapi.responses import JSONResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 from utils.parser import parse_file
+from utils.chunker import document_text
 from utils.embedding import store_embedding
 from utils.emailer import (
     send_embed_script_email,
     generate_script_tag,
     send_admin_notification,
+    flush_admin_digest,
 )
-from utils.tracker import log_upload
+from utils.tracker import log_upload, export_records_gzip
 from utils.otp import generate_otp, store_otp, verify_otp, is_verified, send_otp_email
 from utils.scraper import scrape_site
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_qdrant import QdrantVectorStore
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+from utils.context import build_prompt_inputs, count_tokens
+from utils.prompt import get_chat_prompt, prompt_cache_usage
+from utils.sessions import get_or_create_session, append_turn, session_history
+from utils.bot_records import get_bot_record, delete_bot_record, bot_index, record_stamp
+from utils.migration import (
+    abort_migration,
+    bot_collections,
+    migration_progress,
+    resume_migration,
+    start_migration,
+)
+from utils.embed_batcher import get_query_embedder, query_embedders, embed_latency
+from utils.singleflight import SingleFlight, normalize_question
+from utils.admission import admission
+from utils.hedging import Deadline, LatencyTracker, ThreadGauge, hedged
+from utils.circuit_breaker import breakers, CircuitOpenError
+from utils.metrics import (
+    CallbackMetric,
+    MetricsMiddleware,
+    record_cache_event,
+    record_tokens,
+    render as render_metrics,
+    stage_timer,
+    timed,
+)
+from utils.sessions import session_storage
+from utils.profiler import ProfilingMiddleware
+from utils import ledger
+from utils.vector_cache import (
+    hot_bot_cache,
+    load_hot_bot,
+    save_hot_bot_ids,
+    warm_hot_bot_cache,
+)
+from utils.warmup import preload
+from utils.sources import bot_sources, remove_source
+from utils.vector_gc import last_gc_report, run_gc
+from utils.qdrant import get_qdrant_client, delete_bot_points, find_bot_by_email, search_bot
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 from config import (
-    COLLECTION_NAME,
-    EMBEDDING_MODEL,
+    EMBEDDING_MODEL_DIMS,
     LLM_MODEL,
     LLM_TEMPERATURE,
     LLM_MAX_TOKENS,
     TOP_K_CHUNKS,
+    HOT_BOT_MAX_CHUNKS,
+    ADMIN_DIGEST_INTERVAL_MINUTES,
+    CHAT_REQUEST_BUDGET_SECONDS,
+    EMBED_TIMEOUT_SECONDS,
+    RETRIEVE_TIMEOUT_SECONDS,
+    GENERATE_TIMEOUT_SECONDS,
+    HEDGE_THREAD_SHARE,
+    VECTOR_GC_DRY_RUN,
+    VECTOR_GC_INTERVAL_MINUTES,
 )
 import logging
 
@@ -36,8 +81,131 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-app = FastAPI()
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+
+async def admin_digest_loop():
+    """Periodically send pending admin digests when time-based batching is on"""
+    while True:
+        await asyncio.sleep(60)
+        try:
+            await asyncio.to_thread(flush_admin_digest)
+        except Exception as e:
+            logger.error(f"Failed to send admin digest: {str(e)}")
+
+
+async def vector_gc_loop():
+    """Periodically reconcile Qdrant with the tracker and bot records"""
+    while True:
+        await asyncio.sleep(VECTOR_GC_INTERVAL_MINUTES * 60)
+        try:
+            await run_gc(dry_run=VECTOR_GC_DRY_RUN)
+        except Exception as e:
+            logger.error(f"Vector GC failed: {str(e)}")
+
+
+# Set once heavy dependencies are loaded and caches are warm; gates /readyz
+readiness = {"ready": False, "error": None}
+
+
+async def warm_up():
+    """Load heavy dependencies and pre-warm caches without blocking startup"""
+    try:
+        await asyncio.to_thread(preload)
+        if QDRANT_URL:
+            await asyncio.to_thread(warm_hot_bot_cache, get_qdrant_client())
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.error(f"Warm-up failed: {str(e)}")
+        return
+    readiness["ready"] = True
+    logger.info("Ready to serve traffic")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(warm_up())]
+    # Embedding migrations run in one worker at a time; this one stands by or picks up
+    # a migration interrupted by a restart
+    tasks.append(resume_migration())
+    if ADMIN_DIGEST_INTERVAL_MINUTES > 0:
+        tasks.append(asyncio.create_task(admin_digest_loop()))
+    if VECTOR_GC_INTERVAL_MINUTES > 0:
+        tasks.append(asyncio.create_task(vector_gc_loop()))
+    yield
+    for task in tasks:
+        task.cancel()
+    save_hot_bot_ids()
+    ledger.close_ledger()
+    # Don't lose signups still waiting for a digest
+    try:
+        flush_admin_digest(force=True)
+    except Exception as e:
+        logger.error(f"Failed to send admin digest on shutdown: {str(e)}")
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Coalesces identical first-turn /chat questions
+chat_flights = SingleFlight()
+
+# Latency history of the upstream stages, used to time hedged requests
+retrieve_latency = LatencyTracker("qdrant search")
+search_threads = ThreadGauge()
+# Same size as asyncio's default thread pool
+SEARCH_HEDGE_MAX_THREADS = HEDGE_THREAD_SHARE * min(32, (os.cpu_count() or 1) + 4)
+generate_latency = LatencyTracker("chat completion")
+
+# Counters kept by the components themselves, read at scrape time
+CallbackMetric(
+    "docative_circuit_open",
+    "1 if the dependency's circuit breaker is open or half-open",
+    ("dependency",),
+    lambda: {name: int(b.state != "closed") for name, b in breakers.items()},
+)
+CallbackMetric(
+    "docative_coalesced_requests_total",
+    "First-turn chat requests by single-flight outcome",
+    ("outcome",),
+    lambda: {"computed": chat_flights.calls, "shared": chat_flights.saved},
+    type="counter",
+)
+CallbackMetric(
+    "docative_hedged_requests_total",
+    "Hedged duplicate upstream requests sent",
+    ("stage",),
+    lambda: {t.name: t.hedges for t in (embed_latency, retrieve_latency, generate_latency)},
+    type="counter",
+)
+CallbackMetric(
+    "docative_embedding_batches_total",
+    "Query embedding batches sent and texts embedded through them",
+    ("kind",),
+    lambda: {
+        "batches": sum(e.calls for e in query_embedders.values()),
+        "texts": sum(e.texts for e in query_embedders.values()),
+    },
+    type="counter",
+)
+CallbackMetric(
+    "docative_admission_rejected_total",
+    "Chat requests rejected by admission control",
+    (),
+    lambda: {(): admission.rejected},
+    type="counter",
+)
+CallbackMetric(
+    "docative_hot_bot_cache_bytes",
+    "Memory used by the hot-bot vector cache",
+    (),
+    lambda: {(): hot_bot_cache.bytes_used},
+)
+CallbackMetric(
+    "docative_sessions",
+    "Chat sessions held in memory",
+    (),
+    lambda: {(): len(session_storage)},
+)
 # CORS middleware for all origins
 app.add_middleware(
     CORSMiddleware,
@@ -47,12 +215,36 @@ app.add_middleware(
     allow_headers=["Content-Type", "Accept", "Authorization", "X-Requested-With"],
     expose_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware, admin_key=ADMIN_API_KEY)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request, exc: CircuitOpenError):
+    logger.warning(f"Failing fast: {str(exc)}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.name} is temporarily unavailable, please retry"},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
+
+def require_admin(x_admin_key: Optional[str]):
+    """Reject requests that don't carry the admin API key"""
+    if not ADMIN_API_KEY or x_admin_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Admin authentication required")
 
 
 class ChatRequest(BaseModel):
     question: str
     bot_id: str
-    history: list[dict] = []  # Optional history
+    session_id: Optional[str] = None  # Server-side history; returned by /chat
+    history: list[dict] = []  # Optional history (older widgets without sessions)
+
+
+class MigrationRequest(BaseModel):
+    model: str
+    dim: Optional[int] = None  # Defaults to the model's native size
 
 
 class OTPRequest(BaseModel):
@@ -79,29 +271,28 @@ def read_root():
     return {"message": "Chatbot API is live 🎉"}
 
 
-# Add this function to check if user has existing bot
-async def check_existing_bot(email: str) -> Optional[str]:
-    """Check if user already has a bot and return bot_id if exists"""
-    embedding = OpenAIEmbeddings(api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL)
-    vectorstore = QdrantVectorStore.from_existing_collection(
-        collection_name=COLLECTION_NAME,
-        embedding=embedding,
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: dependencies are loaded and caches warmed"""
+    if readiness["ready"]:
+        return {"status": "ready"}
+    return JSONResponse(
+        status_code=503,
+        content={"status": "failed" if readiness["error"] else "starting", "error": readiness["error"]},
     )
 
-    # Search for points with metadata.email = email
-    points = vectorstore.client.scroll(
-        collection_name=COLLECTION_NAME,
-        scroll_filter=Filter(
-            must=[FieldCondition(key="metadata.email", match=MatchValue(value=email))]
-        ),
-        limit=1,
-    )[0]
 
-    if points:
-        return points[0].payload.get("metadata", {}).get("bot_id")
-    return None
+# Add this function to check if user has existing bot
+@timed("check_existing_bot")
+async def check_existing_bot(email: str) -> Optional[str]:
+    """Check if user already has a bot and return bot_id if exists"""
+    return await asyncio.to_thread(find_bot_by_email, email)
 
 
 # Add this endpoint to check for existing bot
@@ -111,6 +302,94 @@ async def check_bot_exists(email: str = Form(...)):
     return {"has_existing_bot": bot_id is not None, "bot_id": bot_id}
 
 
+@app.get("/admin/user-records")
+def download_user_records(x_admin_key: Optional[str] = Header(None)):
+    """Download the full user records export as gzip-compressed JSON"""
+    require_admin(x_admin_key)
+    return Response(
+        content=export_records_gzip(),
+        media_type="application/gzip",
+        headers={
+            "Content-Disposition": 'attachment; filename="user_records.json.gz"'
+        },
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/usage")
+def usage_report(days: int = 7, limit: int = 20, x_admin_key: Optional[str] = Header(None)):
+    """Bots ranked by OpenAI token usage over the last days"""
+    require_admin(x_admin_key)
+    return {"days": days, "bots": ledger.top_bots(days, limit)}
+
+
+@app.get("/admin/usage/{bot_id}")
+def bot_usage_report(bot_id: str, days: int = 7, x_admin_key: Optional[str] = Header(None)):
+    """Latency percentiles and tokens per day for one bot"""
+    require_admin(x_admin_key)
+    return ledger.bot_report(bot_id, days)
+
+
+@app.get("/admin/circuit-breakers")
+def circuit_breaker_status(x_admin_key: Optional[str] = Header(None)):
+    """Current state of the circuit breaker of each dependency"""
+    require_admin(x_admin_key)
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+@app.get("/admin/migration")
+def migration_status(x_admin_key: Optional[str] = Header(None)):
+    """Progress and ETA of the embedding model migration"""
+    require_admin(x_admin_key)
+    return migration_progress()
+
+
+@app.post("/admin/migration")
+async def start_embedding_migration(
+    request: MigrationRequest, x_admin_key: Optional[str] = Header(None)
+):
+    """Start re-embedding every bot with a new embedding model in the background"""
+    require_admin(x_admin_key)
+    dim = request.dim or EMBEDDING_MODEL_DIMS.get(request.model)
+    if not dim:
+        raise HTTPException(status_code=400, detail=f"Unknown vector size for {request.model}")
+    try:
+        await asyncio.to_thread(start_migration, request.model, dim)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    resume_migration()
+    return migration_progress()
+
+
+@app.delete("/admin/migration")
+async def abort_embedding_migration(x_admin_key: Optional[str] = Header(None)):
+    """Stop the migration and move migrated bots back to the old collection"""
+    require_admin(x_admin_key)
+    try:
+        return await abort_migration()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/vector-gc")
+def vector_gc_status(x_admin_key: Optional[str] = Header(None)):
+    """Report of the last vector garbage collection run"""
+    require_admin(x_admin_key)
+    return last_gc_report() or {"status": "never run"}
+
+
+@app.post("/admin/vector-gc")
+async def run_vector_gc(dry_run: bool = True, x_admin_key: Optional[str] = Header(None)):
+    """Find vectors no bot owns, and delete those past the grace period unless dry_run"""
+    require_admin(x_admin_key)
+    return await run_gc(dry_run=dry_run)
+
+
 # Add endpoint to send OTP
 @app.post("/send-otp")
 async def send_otp_endpoint(email: str = Form(...)):
@@ -127,6 +406,8 @@ async def send_otp_endpoint(email: str = Form(...)):
         return JSONResponse(
             content={"message": "OTP sent successfully", "email": email}
         )
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.error(f"Failed to send OTP: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send OTP: {str(e)}")
@@ -153,9 +434,24 @@ async def upload_doc(
     email: str = Form(...),
     name: str = Form(...),
     replace: bool = Form(False),
+    append: bool = Form(False),  # Add the document to the existing bot instead
+):
+    with ledger.track("upload"):
+        response = await process_upload(file, url, email, name, replace, append)
+        ledger.set_status(response)
+        return response
+
+
+async def process_upload(
+    file: Optional[UploadFile],
+    url: Optional[str],
+    email: str,
+    name: str,
+    replace: bool,
+    append: bool = False,
 ):
     logger.info(
-        f"Processing upload for email: {email}, name: {name}, replace: {replace}"
+        f"Processing upload for email: {email}, name: {name}, replace: {replace}, append: {append}"
     )
     
     # Check if email is verified
@@ -181,10 +477,16 @@ async def upload_doc(
             status_code=400, 
             detail="Provide either a file or a URL, not both"
         )
+
+    if replace and append:
+        raise HTTPException(
+            status_code=400,
+            detail="Choose either replace or append, not both"
+        )
     
     # Check if user has existing bot and replace is not True
     existing_bot_id = await check_existing_bot(email)
-    if existing_bot_id and not replace:
+    if existing_bot_id and not (replace or append):
         return JSONResponse(
             status_code=409,
             content={
@@ -196,35 +498,22 @@ async def upload_doc(
     
     # If replace is True and existing bot exists, delete it
     if existing_bot_id and replace:
-        embedding = OpenAIEmbeddings(api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL)
-        vectorstore = QdrantVectorStore.from_existing_collection(
-            collection_name=COLLECTION_NAME,
-            embedding=embedding,
-            url=QDRANT_URL,
-            api_key=QDRANT_API_KEY,
-        )
         # Delete all points with this bot_id
-        vectorstore.client.delete(
-            collection_name=COLLECTION_NAME,
-            points_selector=Filter(
-                must=[
-                    FieldCondition(
-                        key="metadata.bot_id", match=MatchValue(value=existing_bot_id)
-                    )
-                ]
-            ),
-        )
+        for collection in bot_collections(existing_bot_id):
+            delete_bot_points(existing_bot_id, collection)
+        hot_bot_cache.invalidate(existing_bot_id)
+        delete_bot_record(existing_bot_id)
         logger.info(f"Deleted existing bot with bot_id: {existing_bot_id}")
     
     # Get text from either file or URL
     if url:
         try:
-            text = scrape_site(url)
+            segments = scrape_site(url)
             source_type = "URL"
             source_name = url
             
             # Check if scraping returned any content
-            if not text or len(text.strip()) < 10:
+            if len(document_text(segments).strip()) < 10:
                 raise HTTPException(
                     status_code=400, 
                     detail="Unable to extract content from the provided URL. The website might be empty, blocked, or not accessible."
@@ -254,7 +543,7 @@ async def upload_doc(
                     detail="Failed to scrape the website. Please check the URL and try again."
                 )
     elif file:
-        text = await parse_file(file)
+        segments = await parse_file(file)
         source_type = "file"
         source_name = file.filename
     else:
@@ -264,22 +553,44 @@ async def upload_doc(
             detail="Either a file or URL must be provided"
         )
     
-    if not text:
+    if not segments:
         raise HTTPException(
             status_code=400, 
             detail=f"Failed to extract text from the provided {source_type}"
         )
     
-    bot_id = await store_embedding(text, email, name)
+    if existing_bot_id and append:
+        # Only the new document is embedded; the bot_id and embed script stay the same
+        bot_id, source_id = await store_embedding(segments, email, name, source_name, existing_bot_id)
+        ledger.set_bot_id(bot_id)
+        log_upload(email, bot_id, source_name, name)
+        return JSONResponse(
+            content={
+                "email": email,
+                "bot_id": bot_id,
+                "source_id": source_id,
+                "name": name,
+                "script_tag": generate_script_tag(bot_id, name),
+                "message": f"Added the {source_type} to your existing chatbot",
+            }
+        )
+
+    bot_id, source_id = await store_embedding(segments, email, name, source_name)
+    ledger.set_bot_id(bot_id)
     log_upload(email, bot_id, source_name, name)
     
     # Generate script tag
     script_tag = generate_script_tag(bot_id, name)
     
+    message = f"Embedding stored successfully from {source_type} and email sent"
     try:
         send_embed_script_email(email, bot_id, name)
         # Send admin notification
         send_admin_notification(email, name, bot_id, source_name)
+    except CircuitOpenError as e:
+        # The bot is stored; the response carries the script tag the email would have
+        logger.warning(f"Skipped emails for bot_id {bot_id}: {str(e)}")
+        message = f"Embedding stored successfully from {source_type}; the email could not be sent"
     except Exception as e:
         logger.error(f"Failed to send email: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
@@ -288,110 +599,209 @@ async def upload_doc(
         content={
             "email": email,
             "bot_id": bot_id,
+            "source_id": source_id,
             "name": name,
             "script_tag": script_tag,
-            "message": f"Embedding stored successfully from {source_type} and email sent",
+            "message": message,
         }
     )
 
 
-@app.post("/chat")
-async def chat(request: ChatRequest):
-    logger.info(f"Processing chat request for bot_id: {request.bot_id}")
+async def owned_bot(email: str) -> str:
+    """bot_id of a verified email's bot, or the HTTP error to return"""
+    if not is_verified(email):
+        raise HTTPException(status_code=403, detail="Please verify your email address first")
+    bot_id = await check_existing_bot(email)
+    if not bot_id:
+        raise HTTPException(status_code=404, detail="No chatbot found for this email")
+    return bot_id
+
+
+@app.post("/sources")
+async def list_sources(email: str = Form(...)):
+    """Documents the email's bot is built from"""
+    bot_id = await owned_bot(email)
+    sources = await asyncio.to_thread(bot_sources, bot_id)
+    return {
+        "bot_id": bot_id,
+        "sources": [
+            {key: source[key] for key in ("source_id", "name", "chunk_count", "added_at")}
+            for source in sources
+        ],
+    }
+
+
+@app.post("/remove-source")
+async def remove_source_endpoint(email: str = Form(...), source_id: str = Form(...)):
+    """Remove one document from the email's bot, keeping the bot_id"""
+    bot_id = await owned_bot(email)
     try:
-        # Initialize LangChain components
-        embedding = OpenAIEmbeddings(api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL)
-        vectorstore = QdrantVectorStore.from_existing_collection(
-            collection_name=COLLECTION_NAME,
-            embedding=embedding,
-            url=QDRANT_URL,
-            api_key=QDRANT_API_KEY,
-        )
-
-        # Verify bot_id exists in collection
-        points = vectorstore.client.scroll(
-            collection_name=COLLECTION_NAME,
-            scroll_filter=Filter(
-                must=[
-                    FieldCondition(
-                        key="metadata.bot_id", match=MatchValue(value=request.bot_id)
-                    )
-                ]
-            ),
-            limit=1,
-        )[0]
-        if not points:
-            logger.warning(f"No content found for bot_id: {request.bot_id}")
+        record = await remove_source(bot_id, source_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Source not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"bot_id": bot_id, "source_id": source_id, "sources_left": len(record["sources"])}
+
+
+async def retrieve_context(bot_id: str, question: str, deadline: Deadline) -> list[str]:
+    """Find the chunks of a bot most relevant to the question"""
+    # Tiny bots use their whole content, skipping query embedding and search.
+    # The stamp is taken first, so a change made while we load is seen next time.
+    stamp = record_stamp(bot_id)
+    bot_record = get_bot_record(bot_id)
+    context_pack = bot_record.get("context_pack") if bot_record else None
+    if context_pack is not None:
+        record_cache_event("context_pack", hit=True)
+        return [context_pack]
+    record_cache_event("context_pack", hit=False)
+    # Where the bot's vectors live; differs per bot during an embedding migration
+    collection, model, dim = bot_index(bot_record)
+
+    # Small, hot bots are searched in-process instead of over the network
+    hot_bot = hot_bot_cache.get(bot_id, stamp)
+    record_cache_event("hot_bot", hit=hot_bot is not None)
+    if hot_bot is None and not hot_bot_cache.is_large(bot_id, stamp):
+        # Verify bot_id exists in collection, loading it if it is small enough
+        with stage_timer("chat.lookup"):
+            point_count, hot_bot = await asyncio.to_thread(
+                load_hot_bot, get_qdrant_client(), bot_id, collection
+            )
+        if not point_count:
+            logger.warning(f"No content found for bot_id: {bot_id}")
             raise HTTPException(
-                status_code=404, detail=f"No content found for bot_id: {request.bot_id}"
+                status_code=404,
+                detail=f"No content found for bot_id: {bot_id}",
             )
-
-        # Retrieve relevant context
-        retriever = vectorstore.as_retriever(
-            search_kwargs={
-                "filter": {
-                    "must": [
-                        {"key": "metadata.bot_id", "match": {"value": request.bot_id}}
-                    ]
-                },
-                "k": TOP_K_CHUNKS,
-            }
+        if hot_bot is not None:
+            hot_bot_cache.put(bot_id, hot_bot, stamp)
+        elif point_count > HOT_BOT_MAX_CHUNKS:
+            hot_bot_cache.mark_large(bot_id, stamp)
+
+    # Concurrent questions share one batched embeddings call
+    with stage_timer("chat.embed"):
+        query_vector = await asyncio.wait_for(
+            get_query_embedder(model, dim).embed(question),
+            deadline.stage(EMBED_TIMEOUT_SECONDS),
         )
-        context_docs = retriever.invoke(request.question)
-        context = "\n".join([doc.page_content for doc in context_docs])
-
-        # Format chat history for prompt
-        history_text = ""
-        if request.history:
-            history_text = (
-                "\n".join(
-                    [
-                        f"{msg['sender']}: {msg['text']}"
-                        for msg in request.history[-10:]
-                    ]  # Limit to last 10 messages
-                )
-                + "\n"
-            )
-
-        # Define prompt template
-        prompt_template = PromptTemplate(
-            input_variables=["context", "history", "question"],
-            template="""You are Docative, an AI chatbot created from the user's content, representing him, his documents, website, or portfolio. Use the provided context to answer questions concisely and accurately, reflecting the tone and intent of the content (e.g., professional for resumes, engaging for websites). Be creative with details as long as they align with the context. If the context lacks relevant information, use conversation history (if available) to inform follow-ups or politely say, "I don't have enough info from your content to answer that, but feel free to ask something related!" For questions unrelated to the context, respond positively with general knowledge or encouragement, keeping it relevant to person's goals.
-Context: {context}
-Conversation History:
-{history}
-Current Question: {question}
-Answer:""",
+    record_tokens(embedding=count_tokens(question))
+    if hot_bot is not None:
+        with stage_timer("chat.retrieve_local"):
+            return hot_bot.search(query_vector, TOP_K_CHUNKS)
+
+    with stage_timer("chat.retrieve_qdrant"), breakers["qdrant"].guard():
+        return await hedged(
+            lambda: asyncio.to_thread(
+                search_threads.run, search_bot, bot_id, query_vector, TOP_K_CHUNKS, collection
+            ),
+            retrieve_latency,
+            deadline.stage(RETRIEVE_TIMEOUT_SECONDS),
+            # A losing search keeps its thread, so only hedge while the pool has room
+            lambda: search_threads.running < SEARCH_HEDGE_MAX_THREADS,
         )
 
-        # Set up LLM
-        llm = ChatOpenAI(
-            api_key=OPENAI_API_KEY,
-            model=LLM_MODEL,
-            temperature=LLM_TEMPERATURE,
-            max_tokens=LLM_MAX_TOKENS,
-        )
 
-        # Create chain using RunnableSequence (modern approach)
-        chain = prompt_template | llm
+async def answer_question(
+    bot_id: str, question: str, history: list[dict], summary: str
+) -> str:
+    """Run the retrieve and generate pipeline for one question"""
+    deadline = Deadline(CHAT_REQUEST_BUDGET_SECONDS)
+    context_texts = await retrieve_context(bot_id, question, deadline)
 
-        # Run the query with history
-        inputs = {
-            "context": context,
-            "history": history_text,
-            "question": request.question,
-        }
-        logger.info(f"Invoking LLM chain")
-        answer = chain.invoke(inputs).content.strip()
+    # Fit context and chat history into the prompt token budget
+    with stage_timer("chat.build_prompt"):
+        context, history_text = build_prompt_inputs(context_texts, history, summary)
 
-        if not answer:
-            logger.warning(f"No relevant content found for bot_id: {request.bot_id}")
-            raise HTTPException(
-                status_code=404, detail="No relevant content found for this bot_id"
+    # Set up LLM
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(
+        api_key=OPENAI_API_KEY,
+        model=LLM_MODEL,
+        temperature=LLM_TEMPERATURE,
+        max_tokens=LLM_MAX_TOKENS,
+        timeout=GENERATE_TIMEOUT_SECONDS,
+        max_retries=0,  # Hedging replaces the client's own retries
+    )
+
+    # Create chain using RunnableSequence (modern approach)
+    chain = get_chat_prompt() | llm
+
+    # Run the query with history
+    inputs = {
+        "context": context,
+        "history": history_text,
+        "question": question,
+    }
+    logger.info(f"Invoking LLM chain")
+    async with admission.llm_slot():
+        with stage_timer("chat.generate"), breakers["chat_completions"].guard():
+            response = await hedged(
+                lambda: chain.ainvoke(inputs),
+                generate_latency,
+                deadline.stage(GENERATE_TIMEOUT_SECONDS),
             )
+    answer = response.content.strip()
+    usage = prompt_cache_usage(response)
+    record_tokens(
+        prompt=usage["prompt_tokens"],
+        cached_prompt=usage["cached_prompt_tokens"],
+        completion=usage["completion_tokens"],
+    )
+    logger.info(
+        f"LLM usage for bot_id {bot_id}: "
+        f"{usage['cached_prompt_tokens']} cached / "
+        f"{usage['uncached_prompt_tokens']} uncached prompt tokens, "
+        f"{usage['completion_tokens']} completion tokens"
+    )
+
+    if not answer:
+        logger.warning(f"No relevant content found for bot_id: {bot_id}")
+        raise HTTPException(
+            status_code=404, detail="No relevant content found for this bot_id"
+        )
+    return answer
 
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    with ledger.track("chat", request.bot_id):
+        response = await handle_chat(request)
+        ledger.set_status(response)
+        return response
+
+
+async def handle_chat(request: ChatRequest):
+    logger.info(f"Processing chat request for bot_id: {request.bot_id}")
+    try:
+        bot_record = get_bot_record(request.bot_id)
+        limits = bot_record.get("limits") if bot_record else None
+        # Use server-side session history unless an older widget sent its own
+        session_id, session = get_or_create_session(request.session_id, request.bot_id)
+        summary, history = session_history(session)
+        if not history and not summary and request.history:
+            history = request.history
+
+        async def admitted_answer():
+            async with admission.admit(request.bot_id, limits):
+                return await answer_question(request.bot_id, request.question, history, summary)
+
+        if not history and not summary:
+            # Identical first-turn questions in flight share one answer; only the
+            # request that computes it is admitted, since the others add no load
+            key = (request.bot_id, normalize_question(request.question))
+            answer = await chat_flights.do(key, admitted_answer)
+        else:
+            answer = await admitted_answer()
+
+        append_turn(session, request.question, answer)
         logger.info(f"Chat response generated for bot_id: {request.bot_id}")
-        return {"answer": answer}
+        return {"answer": answer, "session_id": session_id}
+    except (HTTPException, CircuitOpenError):
+        raise
+    except asyncio.TimeoutError:
+        logger.error(f"Chat request timed out for bot_id: {request.bot_id}")
+        raise HTTPException(status_code=504, detail="Chat request timed out")
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         raise HTTPException(
@@ -0,0 +1,225 @@
+"""Create the Qdrant collections and keep their layout in line with config.py.
+
+    python qdrant_schema.py status [--collection NAME ...]
+    python qdrant_schema.py apply [--collection NAME ...] [--dry-run]
+    python qdrant_schema.py compact [--collection NAME ...] [--dry-run]
+
+`apply` creates a missing collection with the configured layout, and updates
+an existing one in place: int8 quantization, HNSW graph settings, on-disk
+vectors and payloads, and the payload indexes (metadata.bot_id as a tenant
+index). Qdrant rebuilds segments in the background and keeps serving.
+
+The vector size can't change in place. To use shorter text-embedding-3
+vectors, migrate to them (POST /admin/migration {"model":
+"text-embedding-3-small", "dim": 512}), then point COLLECTION_NAME and
+EMBEDDING_DIM at the migrated collection.
+
+`compact` rewrites points stored before chunk text was compressed (plain
+`page_content` plus email and name in every payload) in the compact layout of
+utils/payload.py, moving email and name into the bot records, and reports the
+payload bytes saved.
+
+By default the commands cover COLLECTION_NAME and the target collection of
+an active migration.
+"""
+import argparse
+import logging
+from config import (
+    COLLECTION_NAME,
+    EMBEDDING_DIM,
+    QDRANT_HNSW_M,
+    QDRANT_HNSW_PAYLOAD_M,
+    QDRANT_PAYLOAD_ON_DISK,
+    QDRANT_QUANTIZATION,
+    QDRANT_VECTORS_ON_DISK,
+)
+from utils.bot_records import get_bot_record, save_bot_record
+from utils.chunker import structure
+from utils.migration import active_migration
+from utils.payload import chunk_payload, payload_size
+from utils.qdrant import (
+    PAYLOAD_INDEXES,
+    QDRANT_URL,
+    collection_layout,
+    ensure_collection,
+    get_qdrant_client,
+    index_schema,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COMPACT_BATCH_SIZE = 256
+
+
+def layout_changes(collection: str) -> tuple[dict, list[str], list[str]]:
+    """What differs from the configured layout.
+
+    Returns update_collection arguments, payload indexes to (re)create, and a
+    line describing each change.
+    """
+    from qdrant_client.http.models import CollectionParamsDiff, Disabled, VectorParamsDiff
+
+    info = get_qdrant_client().get_collection(collection)
+    params, hnsw = info.config.params, info.config.hnsw_config
+    wanted = collection_layout(params.vectors.size)
+    update, indexes, changes = {}, [], []
+
+    if bool(params.vectors.on_disk) != QDRANT_VECTORS_ON_DISK:
+        update["vectors_config"] = {"": VectorParamsDiff(on_disk=QDRANT_VECTORS_ON_DISK)}
+        changes.append(f"vectors on disk: {bool(params.vectors.on_disk)} -> {QDRANT_VECTORS_ON_DISK}")
+    if bool(params.on_disk_payload) != QDRANT_PAYLOAD_ON_DISK:
+        update["collection_params"] = CollectionParamsDiff(on_disk_payload=QDRANT_PAYLOAD_ON_DISK)
+        changes.append(f"payload on disk: {bool(params.on_disk_payload)} -> {QDRANT_PAYLOAD_ON_DISK}")
+    if (hnsw.m, hnsw.payload_m) != (QDRANT_HNSW_M, QDRANT_HNSW_PAYLOAD_M):
+        update["hnsw_config"] = wanted["hnsw_config"]
+        changes.append(
+            f"hnsw m/payload_m: {hnsw.m}/{hnsw.payload_m} -> {QDRANT_HNSW_M}/{QDRANT_HNSW_PAYLOAD_M}"
+        )
+    if info.config.quantization_config != wanted["quantization_config"]:
+        update["quantization_config"] = wanted["quantization_config"] or Disabled.DISABLED
+        quantized = info.config.quantization_config is not None
+        changes.append(f"int8 quantization: {quantized} -> {QDRANT_QUANTIZATION}")
+
+    for field_name in PAYLOAD_INDEXES:
+        current = info.payload_schema.get(field_name)
+        is_tenant = bool(getattr(current and current.params, "is_tenant", False))
+        wanted_tenant = index_schema(field_name).is_tenant
+        if current is None or is_tenant != wanted_tenant:
+            indexes.append(field_name)
+            changes.append(f"payload index {field_name}" + (" (tenant)" if wanted_tenant else ""))
+    return update, indexes, changes
+
+
+def vector_memory(collection: str) -> str:
+    """Rough RAM needed for a collection's vectors, now and in the configured layout"""
+    info = get_qdrant_client().get_collection(collection)
+    params = info.config.params
+    points, dim = info.points_count or 0, params.vectors.size
+    current = 0 if params.vectors.on_disk else points * dim * 4
+    if info.config.quantization_config is not None:
+        current += points * dim
+    configured = 0 if QDRANT_VECTORS_ON_DISK else points * dim * 4
+    if QDRANT_QUANTIZATION:
+        configured += points * dim
+    return (
+        f"{points} points x {dim} dims; vectors in RAM ~{current / 1024 / 1024:.1f} MB now, "
+        f"~{configured / 1024 / 1024:.1f} MB configured"
+    )
+
+
+def compact_payloads(collection: str, dry_run: bool) -> dict:
+    """Rewrite legacy payloads in the compact layout, one batch request per page"""
+    from qdrant_client.http.models import OverwritePayloadOperation, SetPayload
+
+    client = get_qdrant_client()
+    totals = {"points": 0, "compacted": 0, "bytes_before": 0, "bytes_after": 0}
+    backfilled, offset = set(), None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=COMPACT_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        operations = []
+        for point in points:
+            size = payload_size(point.payload)
+            totals["points"] += 1
+            totals["bytes_before"] += size
+            if "page_content" not in point.payload:
+                totals["bytes_after"] += size
+                continue
+            metadata = point.payload.get("metadata", {})
+            bot_id = metadata.get("bot_id")
+            # Keep the source tag bot_sources() set on legacy points, and any chunk structure
+            compact = chunk_payload(
+                bot_id, point.payload["page_content"], metadata.get("source_id"), **structure(metadata)
+            )
+            totals["compacted"] += 1
+            totals["bytes_after"] += payload_size(compact)
+            operations.append(
+                OverwritePayloadOperation(overwrite_payload=SetPayload(payload=compact, points=[point.id]))
+            )
+            if bot_id not in backfilled:
+                # Owner lookups by email read the bot record once the payload no longer has it
+                backfilled.add(bot_id)
+                record = get_bot_record(bot_id) or {}
+                if not dry_run and not record.get("email") and metadata.get("email"):
+                    save_bot_record(bot_id, {**record, "email": metadata["email"], "name": metadata.get("name")})
+        if operations and not dry_run:
+            client.batch_update_points(collection_name=collection, update_operations=operations)
+        if offset is None:
+            return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    status_parser = commands.add_parser("status", help="compare collections with the configured layout")
+    apply_parser = commands.add_parser("apply", help="create or update collections")
+    apply_parser.add_argument("--dry-run", action="store_true", help="only list the changes")
+    compact_parser = commands.add_parser("compact", help="compress legacy chunk payloads")
+    compact_parser.add_argument("--dry-run", action="store_true", help="only measure the savings")
+    for command_parser in (status_parser, apply_parser, compact_parser):
+        command_parser.add_argument("--collection", action="append", help="default: the active collections")
+    args = parser.parse_args()
+
+    if QDRANT_URL == ":memory:" and args.command != "compact":
+        raise SystemExit("Local Qdrant ignores collection layout settings; set QDRANT_URL to a server")
+    collections = args.collection
+    if not collections:
+        collections = [COLLECTION_NAME]
+        migration = active_migration()
+        if migration:
+            collections.append(migration["target_collection"])
+
+    client = get_qdrant_client()
+    existing = {collection.name for collection in client.get_collections().collections}
+    for collection in collections:
+        if args.command == "compact":
+            if collection in existing:
+                totals = compact_payloads(collection, args.dry_run)
+                saved = totals["bytes_before"] - totals["bytes_after"]
+                logger.info(
+                    f"{collection}: {'would compact' if args.dry_run else 'compacted'} "
+                    f"{totals['compacted']}/{totals['points']} points, payloads "
+                    f"{totals['bytes_before'] / 1024 / 1024:.1f} MB -> {totals['bytes_after'] / 1024 / 1024:.1f} MB "
+                    f"({saved / max(totals['bytes_before'], 1):.0%} saved)"
+                )
+            continue
+        if collection not in existing:
+            if args.command == "apply" and not args.dry_run and collection == COLLECTION_NAME:
+                ensure_collection(collection, EMBEDDING_DIM)
+                logger.info(f"✅ Created collection {collection} ({EMBEDDING_DIM} dims)")
+            else:
+                logger.info(f"Collection {collection} does not exist")
+            continue
+
+        size = client.get_collection(collection).config.params.vectors.size
+        if collection == COLLECTION_NAME and size != EMBEDDING_DIM:
+            logger.warning(f"⚠️ {collection} has {size}-dim vectors but EMBEDDING_DIM is {EMBEDDING_DIM}")
+        update, indexes, changes = layout_changes(collection)
+        logger.info(f"{collection}: {vector_memory(collection)}")
+        if not changes:
+            logger.info(f"{collection} matches the configured layout")
+            continue
+        for change in changes:
+            logger.info(f"{collection}: {change}")
+        if args.command == "status" or args.dry_run:
+            continue
+
+        if update:
+            client.update_collection(collection_name=collection, **update)
+        for field_name in indexes:
+            client.create_payload_index(
+                collection_name=collection,
+                field_name=field_name,
+                field_schema=index_schema(field_name),
+            )
+        logger.info(f"✅ Updated {collection}; Qdrant re-optimizes its segments in the background")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# utils/admission.py
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Optional
+from fastapi import HTTPException
+from config import (
+    GLOBAL_RATE_PER_SECOND,
+    GLOBAL_RATE_BURST,
+    BOT_RATE_PER_SECOND,
+    BOT_RATE_BURST,
+    BOT_MAX_IN_FLIGHT,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+)
+
+MAX_TRACKED_BOTS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionController:
+    """Rate limits and concurrency caps in front of /chat.
+
+    Per-bot limits default to the config values and can be overridden by a
+    "limits" dict in the bot record (rate_per_second, burst, max_in_flight).
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(GLOBAL_RATE_PER_SECOND, GLOBAL_RATE_BURST)
+        self.bot_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.bot_in_flight: dict[str, int] = {}
+        self.llm_waiting = 0
+        self.rejected = 0
+        self._llm_semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = Lock()
+
+    def _bot_bucket(self, bot_id: str, limits: dict) -> TokenBucket:
+        rate = limits.get("rate_per_second", BOT_RATE_PER_SECOND)
+        burst = limits.get("burst", BOT_RATE_BURST)
+        bucket = self.bot_buckets.get(bot_id)
+        if bucket is None or bucket.rate != rate or bucket.burst != burst:
+            bucket = TokenBucket(rate, burst)
+            self.bot_buckets[bot_id] = bucket
+        self.bot_buckets.move_to_end(bot_id)
+        while len(self.bot_buckets) > MAX_TRACKED_BOTS:
+            self.bot_buckets.popitem(last=False)
+        return bucket
+
+    @asynccontextmanager
+    async def admit(self, bot_id: str, limits: Optional[dict] = None):
+        """Admit one request for a bot or raise 429 with Retry-After"""
+        limits = limits or {}
+        with self._lock:
+            retry_after = self._bot_bucket(bot_id, limits).try_acquire()
+            if retry_after:
+                self.rejected += 1
+                raise _reject(429, "Too many requests for this bot", retry_after)
+            retry_after = self.global_bucket.try_acquire()
+            if retry_after:
+                self.rejected += 1
+                raise _reject(429, "Too many requests", retry_after)
+            in_flight = self.bot_in_flight.get(bot_id, 0)
+            if in_flight >= limits.get("max_in_flight", BOT_MAX_IN_FLIGHT):
+                self.rejected += 1
+                raise _reject(429, "Too many concurrent requests for this bot", 1)
+            self.bot_in_flight[bot_id] = in_flight + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.bot_in_flight[bot_id] -= 1
+                if not self.bot_in_flight[bot_id]:
+                    del self.bot_in_flight[bot_id]
+
+    @asynccontextmanager
+    async def llm_slot(self):
+        """Hold one of LLM_MAX_CONCURRENCY slots, waiting briefly in a bounded queue"""
+        if self._llm_semaphore is None:
+            self._llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        if self._llm_semaphore.locked() and self.llm_waiting >= LLM_MAX_QUEUE:
+            self.rejected += 1
+            raise _reject(503, "Server is at capacity, please retry", LLM_QUEUE_TIMEOUT_SECONDS)
+
+        self.llm_waiting += 1
+        try:
+            await asyncio.wait_for(self._llm_semaphore.acquire(), LLM_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise _reject(503, "Server is at capacity, please retry", LLM_QUEUE_TIMEOUT_SECONDS)
+        finally:
+            self.llm_waiting -= 1
+        try:
+            yield
+        finally:
+            self._llm_semaphore.release()
+
+
+admission = AdmissionController()
@@ -0,0 +1,129 @@
+# utils/bot_records.py
+import json
+import os
+from threading import Lock
+from typing import Optional
+from config import COLLECTION_NAME, EMBEDDING_DIM, EMBEDDING_MODEL
+
+BOT_RECORDS_DIR = "db/bots"
+BOT_EMAILS_FILE = "db/bot_emails.json"
+lock = Lock()
+
+# In-process copy of records already read from disk, with the file stamp they were read at,
+# so records written by other workers (e.g. a migration switching a bot) are picked up
+_records_cache: dict[str, tuple[tuple, dict]] = {}
+# email -> bot_id for records that carry an email, loaded on first use
+_emails: Optional[dict[str, str]] = None
+
+
+def _record_path(bot_id: str) -> str:
+    # bot_ids are uuids; basename() guards against path tricks from request input
+    return os.path.join(BOT_RECORDS_DIR, f"{os.path.basename(bot_id)}.json")
+
+
+def _stamp(path: str) -> Optional[tuple]:
+    """Changes whenever the file is replaced"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _write_json(path: str, data) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _email_index() -> dict[str, str]:
+    global _emails
+    if _emails is None:
+        _emails = {}
+        if os.path.exists(BOT_EMAILS_FILE):
+            with open(BOT_EMAILS_FILE, "r") as f:
+                _emails = json.load(f)
+    return _emails
+
+
+def save_bot_record(bot_id: str, record: dict) -> None:
+    """Write the per-bot record (one small file per bot)"""
+    lock.acquire()
+    try:
+        os.makedirs(BOT_RECORDS_DIR, exist_ok=True)
+        path = _record_path(bot_id)
+        _write_json(path, record)
+        _records_cache[bot_id] = (_stamp(path), record)
+        email = record.get("email")
+        if email and _email_index().get(email) != bot_id:
+            _emails[email] = bot_id
+            _write_json(BOT_EMAILS_FILE, _emails)
+    finally:
+        lock.release()
+
+
+def record_stamp(bot_id: str) -> Optional[tuple]:
+    """Version of a bot's record file, shared by all workers; None if it has none"""
+    return _stamp(_record_path(bot_id))
+
+
+def get_bot_record(bot_id: str) -> Optional[dict]:
+    """Return the per-bot record, or None for bots ingested before records existed"""
+    path = _record_path(bot_id)
+    stamp = _stamp(path)
+    if stamp is None:
+        _records_cache.pop(bot_id, None)
+        return None
+    cached = _records_cache.get(bot_id)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, "r") as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        return None
+    _records_cache[bot_id] = (stamp, record)
+    return record
+
+
+def delete_bot_record(bot_id: str) -> None:
+    lock.acquire()
+    try:
+        _records_cache.pop(bot_id, None)
+        path = _record_path(bot_id)
+        if os.path.exists(path):
+            os.remove(path)
+        emails = _email_index()
+        owned = [email for email, owner in emails.items() if owner == bot_id]
+        if owned:
+            for email in owned:
+                del emails[email]
+            _write_json(BOT_EMAILS_FILE, emails)
+    finally:
+        lock.release()
+
+
+def bot_for_email(email: str) -> Optional[str]:
+    """bot_id of the bot whose record carries this email, if any"""
+    with lock:
+        return _email_index().get(email)
+
+
+def indexed_bot_ids() -> set[str]:
+    """bot_ids that own an email in the email index"""
+    with lock:
+        return set(_email_index().values())
+
+
+def bot_index(record: Optional[dict]) -> tuple[str, str, int]:
+    """Collection, embedding model and vector size holding a bot's vectors.
+
+    Records written before per-bot indexes existed use the configured defaults.
+    """
+    record = record or {}
+    return (
+        record.get("collection") or COLLECTION_NAME,
+        record.get("embedding_model") or EMBEDDING_MODEL,
+        record.get("embedding_dim") or EMBEDDING_DIM,
+    )
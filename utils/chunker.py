@@ -0,0 +1,161 @@
+# utils/chunker.py
+"""Structure-aware chunking.
+
+Parsers return a document as segments: runs of text with the page they are on,
+the heading path above them and the URL they came from, where known.
+
+Chunks end on section boundaries: whole sections of the same URL that share
+a heading (subsections of one section, or sections of a document without
+headings) are packed into a chunk while they fit in CHUNK_SIZE, under that
+heading, so short sections don't become one tiny vector each. No section is
+cut in two unless it is longer than CHUNK_SIZE on its own; those are split
+with overlap, like flat text, and only their first piece may join the
+sections before it. Page breaks don't end a chunk; it records the pages it spans
+instead.
+"""
+from typing import Optional
+from config import CHUNK_OVERLAP, CHUNK_SIZE
+
+STRUCTURE_KEYS = ("url", "page", "page_end", "headings")
+
+
+def make_segment(
+    text: str,
+    page: Optional[int] = None,
+    headings: Optional[list[str]] = None,
+    url: Optional[str] = None,
+) -> dict:
+    segment = {"text": text}
+    if page is not None:
+        segment["page"] = page
+    if headings:
+        segment["headings"] = list(headings)
+    if url:
+        segment["url"] = url
+    return segment
+
+
+def push_heading(path: list[tuple[int, str]], level: int, title: str) -> list[tuple[int, str]]:
+    """Heading path after a heading of this level; path holds (level, title) pairs"""
+    return [item for item in path if item[0] < level] + [(level, title)]
+
+
+def heading_titles(path: list[tuple[int, str]]) -> list[str]:
+    return [title for _, title in path]
+
+
+def document_text(segments: list[dict]) -> str:
+    return "\n\n".join(segment["text"] for segment in segments)
+
+
+def structure(chunk: dict) -> dict:
+    """Where a chunk came from, for its payload metadata"""
+    return {key: chunk[key] for key in STRUCTURE_KEYS if key in chunk}
+
+
+def _sections(segments: list[dict]) -> list[dict]:
+    """Consecutive segments with the same URL and heading path, joined"""
+    sections = []
+    for segment in segments:
+        text = segment["text"].strip()
+        if not text:
+            continue
+        key = (segment.get("url"), segment.get("headings", []))
+        if sections and sections[-1]["key"] == key:
+            section = sections[-1]
+            section["text"] += "\n\n"
+        else:
+            section = {"key": key, "text": "", "pages": []}
+            sections.append(section)
+        if "page" in segment:
+            # (offset in the section text, page number)
+            section["pages"].append((len(section["text"]), segment["page"]))
+        section["text"] += text
+    return sections
+
+
+def _pages(pages: list[tuple[int, int]], start: int, end: int) -> dict:
+    first = [page for offset, page in pages if offset <= start]
+    inside = [page for offset, page in pages if start < offset < end]
+    if not first and not inside:
+        return {}
+    first_page = first[-1] if first else inside[0]
+    last_page = inside[-1] if inside else first_page
+    if last_page == first_page:
+        return {"page": first_page}
+    return {"page": first_page, "page_end": last_page}
+
+
+def _common_headings(chunk: dict, after: dict) -> list[str]:
+    common = []
+    for a, b in zip(chunk.get("headings", []), after.get("headings", [])):
+        if a != b:
+            break
+        common.append(a)
+    return common
+
+
+def _can_pack(chunk: dict, after: dict, chunk_size: int) -> bool:
+    """Whether two chunks of whole sections go together without losing their heading"""
+    return (
+        chunk.get("url") == after.get("url")
+        and len(chunk["text"]) + 2 + len(after["text"]) <= chunk_size
+        and (
+            bool(_common_headings(chunk, after))
+            or chunk.get("headings", []) == after.get("headings", [])
+        )
+    )
+
+
+def _pack(chunk: dict, after: dict) -> dict:
+    """One chunk from two adjacent ones, under their common heading"""
+    packed = {"text": chunk["text"] + "\n\n" + after["text"]}
+    if "url" in chunk:
+        packed["url"] = chunk["url"]
+    if "page" in chunk or "page" in after:
+        pages = [chunk.get(key) for key in ("page", "page_end")] + [after.get(key) for key in ("page", "page_end")]
+        pages = [page for page in pages if page is not None]
+        packed["page"] = min(pages)
+        if max(pages) != packed["page"]:
+            packed["page_end"] = max(pages)
+    common = _common_headings(chunk, after)
+    if common:
+        packed["headings"] = common
+    return packed
+
+
+def chunk_segments(
+    segments: list[dict],
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+) -> list[dict]:
+    """Chunks of at most chunk_size characters: {"text", "url", "page", "page_end", "headings"}
+
+    Only "text" is always present.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+    )
+    chunks = []
+    whole = []  # Per chunk: made of whole sections, so it may be packed further
+    for section in _sections(segments):
+        url, headings = section["key"]
+        text = section["text"]
+        pieces = splitter.split_text(text) if len(text) > chunk_size else [text]
+        cursor = 0
+        for i, piece in enumerate(pieces):
+            start = text.find(piece, cursor)
+            if start < 0:
+                start = cursor
+            cursor = start + 1
+            chunk = make_segment(piece, headings=headings, url=url)
+            chunk.update(_pages(section["pages"], start, start + len(piece)))
+            # Packing joins chunks at section boundaries only
+            if i == 0 and chunks and whole[-1] and _can_pack(chunks[-1], chunk, chunk_size):
+                chunk = _pack(chunks.pop(), chunk)
+                whole.pop()
+            chunks.append(chunk)
+            whole.append(len(pieces) == 1)
+    return chunks
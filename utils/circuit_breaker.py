@@ -0,0 +1,163 @@
+# utils/circuit_breaker.py
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from typing import Optional
+from config import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATE,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_PROBES,
+    BREAKER_SLOW_CALL_RATIO,
+    EMBED_BATCH_MAX_SIZE,
+    EMBED_TIMEOUT_SECONDS,
+    GENERATE_TIMEOUT_SECONDS,
+    QDRANT_BULK_TIMEOUT_SECONDS,
+    RETRIEVE_TIMEOUT_SECONDS,
+    SMTP_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Trips when too many recent calls fail or are slower than slow_call_seconds.
+
+    For batch calls, slow_call_seconds applies per batch_size items.
+    """
+
+    def __init__(self, name: str, slow_call_seconds: float, batch_size: int = 1):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.batch_size = batch_size
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._outcomes: deque = deque(maxlen=BREAKER_WINDOW)  # True = bad call
+        self._probes = 0
+        self._half_opened = 0  # Counts half-open periods, so probes know which one they belong to
+        self._lock = Lock()
+
+    def _before_call(self) -> Optional[int]:
+        """Returns the half-open period when the call is a probe, else None"""
+        with self._lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < BREAKER_OPEN_SECONDS:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, BREAKER_OPEN_SECONDS - waited)
+                self.state = HALF_OPEN
+                self._probes = 0
+                self._half_opened += 1
+                logger.info(f"Circuit {self.name} half-open, probing")
+            if self.state == HALF_OPEN:
+                if self._probes >= BREAKER_HALF_OPEN_PROBES:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 1)
+                self._probes += 1
+                return self._half_opened
+            return None
+
+    def _is_current_probe(self, probe: Optional[int]) -> bool:
+        return probe is not None and self.state == HALF_OPEN and probe == self._half_opened
+
+    def _record(self, bad: bool, probe: Optional[int]) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not self._is_current_probe(probe):
+                    return  # Started before the breaker opened; only probes decide
+                self._probes -= 1
+                if bad:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"Circuit {self.name} closed")
+                return
+            self._outcomes.append(bad)
+            if (
+                self.state == CLOSED
+                and len(self._outcomes) >= BREAKER_MIN_CALLS
+                and sum(self._outcomes) / len(self._outcomes) >= BREAKER_FAILURE_RATE
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._outcomes.clear()
+        logger.warning(f"Circuit {self.name} opened")
+
+    def _release_probe(self, probe: Optional[int]) -> None:
+        with self._lock:
+            if self._is_current_probe(probe):
+                self._probes -= 1
+
+    @contextmanager
+    def guard(self, items: int = 1):
+        """Wrap one call to the dependency; raises CircuitOpenError while open.
+
+        items is the batch size of a batch call, which scales the slow-call threshold.
+        """
+        probe = self._before_call()
+        slow_call_seconds = self.slow_call_seconds * max(1, math.ceil(items / self.batch_size))
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Cancelled by the caller (e.g. a hedge won): says nothing about health
+            self._release_probe(probe)
+            raise
+        except Exception:
+            self._record(True, probe)
+            raise
+        else:
+            self._record(time.monotonic() - start > slow_call_seconds, probe)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self._outcomes),
+                "recent_failure_rate": (
+                    sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+                ),
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+breakers = {
+    name: CircuitBreaker(name, slow_call_seconds=timeout * BREAKER_SLOW_CALL_RATIO, batch_size=batch_size)
+    for name, timeout, batch_size in [
+        ("embeddings", EMBED_TIMEOUT_SECONDS, 1),
+        # Document embedding for uploads and migrations, kept apart so bulk work can't
+        # open the breaker that serves /chat queries
+        ("ingest_embeddings", EMBED_TIMEOUT_SECONDS, EMBED_BATCH_MAX_SIZE),
+        ("chat_completions", GENERATE_TIMEOUT_SECONDS, 1),
+        ("qdrant", RETRIEVE_TIMEOUT_SECONDS, 1),
+        # Qdrant writes and scans outside /chat, likewise kept apart from its searches
+        ("qdrant_bulk", QDRANT_BULK_TIMEOUT_SECONDS, 1),
+        ("smtp", SMTP_TIMEOUT_SECONDS, 1),
+    ]
+}
@@ -0,0 +1,146 @@
+# utils/context.py
+import logging
+import re
+from functools import lru_cache
+from config import (
+    CHUNK_OVERLAP,
+    CONTEXT_TOKEN_BUDGET,
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_MESSAGE_MAX_TOKENS,
+    NEAR_DUPLICATE_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+MIN_MERGE_OVERLAP = 20  # Shorter suffix/prefix matches are likely coincidence
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most max_tokens tokens"""
+    tokens = _encoding().encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding().decode(tokens[:max_tokens])
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of a that is a prefix of b"""
+    for size in range(min(len(a), len(b), CHUNK_OVERLAP), MIN_MERGE_OVERLAP - 1, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+
+def merge_chunks(texts: list[str]) -> list[str]:
+    """Join chunks that overlap because the splitter cut them from the same passage.
+
+    Order of the first occurrence (i.e. relevance order) is kept.
+    """
+    merged: list[str] = []
+    for text in texts:
+        for i, existing in enumerate(merged):
+            if text in existing:
+                break
+            size = _overlap(existing, text)
+            if size:
+                merged[i] = existing + text[size:]
+                break
+            size = _overlap(text, existing)
+            if size:
+                merged[i] = text + existing[size:]
+                break
+        else:
+            merged.append(text)
+    return merged
+
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def drop_near_duplicates(texts: list[str]) -> list[str]:
+    """Greedy MMR-style selection: keep a chunk only if it adds something new"""
+    selected: list[str] = []
+    selected_words: list[set] = []
+    for text in texts:
+        words = set(re.findall(r"\w+", text.lower()))
+        if any(_similarity(words, seen) >= NEAR_DUPLICATE_THRESHOLD for seen in selected_words):
+            continue
+        selected.append(text)
+        selected_words.append(words)
+    return selected
+
+
+def build_context(texts: list[str], budget: int = CONTEXT_TOKEN_BUDGET) -> tuple[str, int, int]:
+    """Assemble retrieved chunks into a context string within a token budget.
+
+    Returns the context, its token count and the raw token count before assembly.
+    """
+    raw_tokens = sum(count_tokens(t) for t in texts)
+    parts = []
+    used = 0
+    for text in drop_near_duplicates(merge_chunks(texts)):
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            remaining = budget - used
+            if remaining > 0:
+                parts.append(truncate_tokens(text, remaining))
+                used = budget
+            break
+        parts.append(text)
+        used += tokens
+    return "\n".join(parts), used, raw_tokens
+
+
+def build_history(history: list[dict], budget: int = HISTORY_TOKEN_BUDGET) -> tuple[str, int, int]:
+    """Format the most recent messages that fit in the token budget.
+
+    Long messages are truncated to HISTORY_MESSAGE_MAX_TOKENS. Returns the
+    history text, its token count and the raw token count of the last 10 messages.
+    """
+    recent = history[-10:]  # Limit to last 10 messages
+    lines = [f"{msg['sender']}: {msg['text']}" for msg in recent]
+    raw_tokens = sum(count_tokens(line) for line in lines)
+
+    kept = []
+    used = 0
+    # Walk backwards so the newest messages are the last to be dropped
+    for line in reversed(lines):
+        line = truncate_tokens(line, HISTORY_MESSAGE_MAX_TOKENS)
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            break
+        kept.append(line)
+        used += tokens
+
+    if not kept:
+        return "", 0, raw_tokens
+    return "\n".join(reversed(kept)) + "\n", used, raw_tokens
+
+
+def build_prompt_inputs(
+    texts: list[str], history: list[dict], summary: str = ""
+) -> tuple[str, str]:
+    """Build the context and history prompt inputs, logging the tokens saved"""
+    context, context_tokens, raw_context_tokens = build_context(texts)
+    history_text, history_tokens, raw_history_tokens = build_history(history)
+    if summary:
+        history_text = f"Summary of earlier conversation:\n{summary}\n{history_text}"
+    logger.info(
+        f"Prompt tokens: context {context_tokens} (saved {raw_context_tokens - context_tokens}), "
+        f"history {history_tokens} (saved {raw_history_tokens - history_tokens})"
+    )
+    return context, history_text
@@ -1,13 +1,19 @@
 import os
 import smtplib
 import html
-import json
+from threading import Lock
 from email.message import EmailMessage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from config import (
+    ADMIN_DIGEST_BATCH_SIZE,
+    ADMIN_DIGEST_INTERVAL_MINUTES,
+    SMTP_TIMEOUT_SECONDS,
+)
+from utils.circuit_breaker import breakers
+from utils.metrics import timed
 
 load_dotenv()
 
@@ -17,12 +23,18 @@ SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 
+# Signups not yet included in an admin digest (in production, use Redis or database)
+_pending_signups: list[dict] = []
+_last_digest_at = datetime.now(timezone.utc)
+_digest_lock = Lock()
+
 
 def generate_script_tag(bot_id: str, name: str) -> str:
     """Generate the script tag for embedding the chatbot."""
     return f'<script src="https://www.upindersangha.com/docative-widget.js" data-bot-id="{bot_id}" data-name="{name}"></script>'
 
 
+@timed("send_embed_script_email")
 def send_embed_script_email(to_email: str, bot_id: str, name: str) -> None:
     """Send an email with the chatbot embed script tag."""
     # Escape user inputs for safety
@@ -344,9 +356,10 @@ https://www.upindersangha.com/docative
     msg.attach(MIMEText(html_content, "html"))
     # Send email with error handling
     try:
-        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as smtp:
-            smtp.login(SMTP_USER, SMTP_PASS)
-            smtp.send_message(msg)
+        with breakers["smtp"].guard():
+            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS) as smtp:
+                smtp.login(SMTP_USER, SMTP_PASS)
+                smtp.send_message(msg)
     except smtplib.SMTPException as e:
         raise Exception(f"Failed to send email: {str(e)}") from e
 
@@ -354,15 +367,90 @@ https://www.upindersangha.com/docative
 def send_admin_notification(
     new_user_email: str, new_user_name: str, bot_id: str, filename: str
 ) -> None:
-    """Send a notification email to admin with new user details and user_records.json."""
-    # Create multipart/alternative email
+    """Record a new user and send the admin digest once it is due."""
+    record = {
+        "email": new_user_email,
+        "name": new_user_name,
+        "bot_id": bot_id,
+        "filename": filename,
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC"),
+    }
+    with _digest_lock:
+        _pending_signups.append(record)
+    flush_admin_digest()
+
+
+def flush_admin_digest(force: bool = False) -> int:
+    """Send pending signups as one digest if the batch size or interval is reached.
+
+    Returns the number of signups included in the digest (0 if nothing was sent).
+    """
+    global _last_digest_at
+    with _digest_lock:
+        if not _pending_signups:
+            return 0
+        due = (
+            force
+            or len(_pending_signups) >= ADMIN_DIGEST_BATCH_SIZE
+            or (
+                ADMIN_DIGEST_INTERVAL_MINUTES > 0
+                and datetime.now(timezone.utc) - _last_digest_at
+                >= timedelta(minutes=ADMIN_DIGEST_INTERVAL_MINUTES)
+            )
+        )
+        if not due:
+            return 0
+        records = list(_pending_signups)
+        _pending_signups.clear()
+        _last_digest_at = datetime.now(timezone.utc)
+
+    try:
+        _send_admin_digest(records)
+    except Exception:
+        # Put the records back so the next digest picks them up
+        with _digest_lock:
+            _pending_signups[:0] = records
+        raise
+    return len(records)
+
+
+@timed("send_admin_digest")
+def _send_admin_digest(records: list[dict]) -> None:
+    """Send a digest email to admin with the signups since the last digest."""
+    count = len(records)
+    if count == 1:
+        subject = f"New Docative User: {records[0]['name']}"
+    else:
+        subject = f"{count} New Docative Users"
+
     msg = MIMEMultipart("alternative")
-    msg["Subject"] = f"New Docative User: {new_user_name}"
+    msg["Subject"] = subject
     msg["From"] = SENDER_EMAIL
     msg["To"] = SENDER_EMAIL
     msg["Reply-To"] = SENDER_EMAIL
     msg["MIME-Version"] = "1.0"
 
+    user_details_html = "".join(
+        f"""
+            <div class="user-details">
+                <p><strong>Name:</strong> {html.escape(r['name'])}</p>
+                <p><strong>Email:</strong> {html.escape(r['email'])}</p>
+                <p><strong>Bot ID:</strong> {html.escape(r['bot_id'])}</p>
+                <p><strong>Uploaded File:</strong> {html.escape(r['filename'])}</p>
+                <p><strong>Timestamp:</strong> {r['timestamp']}</p>
+            </div>"""
+        for r in records
+    )
+    user_details_text = "\n".join(
+        f"""- Name: {r['name']}
+- Email: {r['email']}
+- Bot ID: {r['bot_id']}
+- Uploaded File: {r['filename']}
+- Timestamp: {r['timestamp']}
+"""
+        for r in records
+    )
+
     # HTML content
     html_content = f"""
     <!DOCTYPE html>
@@ -370,7 +458,7 @@ def send_admin_notification(
     <head>
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>New Docative User</title>
+        <title>New Docative Users</title>
         <style>
             body {{
                 font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -412,23 +500,17 @@ def send_admin_notification(
     </head>
     <body>
         <div class="header">
-            <h1>🎉 New Docative User</h1>
-            <p>A new user has signed up for Docative!</p>
+            <h1>🎉 New Docative Users</h1>
+            <p>{count} new user(s) signed up for Docative since the last digest!</p>
         </div>
         
         <div class="content">
             <h2>User Details</h2>
-            <div class="user-details">
-                <p><strong>Name:</strong> {html.escape(new_user_name)}</p>
-                <p><strong>Email:</strong> {html.escape(new_user_email)}</p>
-                <p><strong>Bot ID:</strong> {html.escape(bot_id)}</p>
-                <p><strong>Uploaded File:</strong> {html.escape(filename)}</p>
-                <p><strong>Timestamp:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}</p>
-            </div>
+            {user_details_html}
             
-            <p>This user has successfully uploaded a document and received their chatbot embed script.</p>
+            <p>These users have successfully uploaded a document and received their chatbot embed script.</p>
             
-            <p>The complete user_records.json file is attached to this email for your reference.</p>
+            <p>The complete user records export can be downloaded on demand from the admin endpoint.</p>
         </div>
         
         <div class="footer">
@@ -441,58 +523,29 @@ def send_admin_notification(
 
     # Plain text content
     plain_text_content = f"""
-New Docative User Notification
+New Docative Users Digest
 
-A new user has signed up for Docative!
+{count} new user(s) signed up for Docative since the last digest!
 
 User Details:
-- Name: {new_user_name}
-- Email: {new_user_email}
-- Bot ID: {bot_id}
-- Uploaded File: {filename}
-- Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}
-
-This user has successfully uploaded a document and received their chatbot embed script.
+{user_details_text}
+These users have successfully uploaded a document and received their chatbot embed script.
 
-The complete user_records.json file is attached to this email for your reference.
+The complete user records export can be downloaded on demand from the admin endpoint.
 
 Best regards,
 Docative System
     """
 
-    # Create a new multipart message for attachments
-    msg_with_attachment = MIMEMultipart()
-    msg_with_attachment["Subject"] = msg["Subject"]
-    msg_with_attachment["From"] = msg["From"]
-    msg_with_attachment["To"] = msg["To"]
-    msg_with_attachment["Reply-To"] = msg["Reply-To"]
-    msg_with_attachment["MIME-Version"] = msg["MIME-Version"]
-
-    # Attach the alternative content (HTML and plain text)
-    msg_with_attachment.attach(msg)
-
-    # Attach user_records.json file
-    try:
-        with open("db/user_records.json", "r") as f:
-            user_records_data = f.read()
-
-        attachment = MIMEApplication(user_records_data, _subtype="json")
-        attachment.add_header(
-            "Content-Disposition", "attachment", filename="user_records.json"
-        )
-        msg_with_attachment.attach(attachment)
-    except Exception as e:
-        # If we can't read the file, just log it and continue
-        print(f"Warning: Could not attach user_records.json: {str(e)}")
-
-    # Attach HTML and plain text parts to the alternative message
+    # Attach HTML and plain text parts
     msg.attach(MIMEText(plain_text_content, "plain"))
     msg.attach(MIMEText(html_content, "html"))
 
     # Send email with error handling
     try:
-        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as smtp:
-            smtp.login(SMTP_USER, SMTP_PASS)
-            smtp.send_message(msg_with_attachment)
+        with breakers["smtp"].guard():
+            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS) as smtp:
+                smtp.login(SMTP_USER, SMTP_PASS)
+                smtp.send_message(msg)
     except smtplib.SMTPException as e:
         raise Exception(f"Failed to send admin notification email: {str(e)}") from e
@@ -0,0 +1,144 @@
+# utils/embed_batcher.py
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_DIM,
+    EMBEDDING_MODEL_DIMS,
+    EMBED_BATCH_WINDOW_MS,
+    EMBED_BATCH_MAX_SIZE,
+    EMBED_TIMEOUT_SECONDS,
+)
+from utils.hedging import LatencyTracker, hedged
+from utils.circuit_breaker import breakers
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+
+class EmbeddingBatcher:
+    """Collect query texts from concurrent requests into one embeddings call.
+
+    A batch is sent when EMBED_BATCH_MAX_SIZE texts are waiting or
+    EMBED_BATCH_WINDOW_MS has passed since the first one arrived.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str]], Awaitable[list[list[float]]]],
+        window_ms: float = EMBED_BATCH_WINDOW_MS,
+        max_batch: int = EMBED_BATCH_MAX_SIZE,
+    ):
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.calls = 0  # Upstream embeddings calls made
+        self.texts = 0  # Texts embedded through the batcher
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+    async def _collect(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Send in the background so the next window starts collecting right away
+            task = self._loop.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        # Identical questions in the same window are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        self.calls += 1
+        self.texts += len(batch)
+        try:
+            vectors = await self.embed_fn(unique_texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+
+embed_latency = LatencyTracker("embeddings")
+
+
+def openai_dimensions(model: str, dim: int) -> Optional[int]:
+    """The `dimensions` argument to request dim-sized vectors from a model"""
+    return None if EMBEDDING_MODEL_DIMS.get(model) == dim else dim
+
+
+def openai_embeddings(model: str, dim: int, **kwargs):
+    """LangChain OpenAIEmbeddings returning dim-sized vectors"""
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(
+        api_key=OPENAI_API_KEY,
+        model=model,
+        dimensions=openai_dimensions(model, dim),
+        **kwargs,
+    )
+
+
+def _openai_embed_fn(model: str, dim: int):
+    embeddings = None  # Created on first use
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        nonlocal embeddings
+        if embeddings is None:
+            # Hedging replaces the client's own retries
+            embeddings = openai_embeddings(
+                model, dim, timeout=EMBED_TIMEOUT_SECONDS, max_retries=0
+            )
+        with breakers["embeddings"].guard():
+            return await hedged(
+                lambda: embeddings.aembed_documents(texts), embed_latency, EMBED_TIMEOUT_SECONDS
+            )
+
+    return embed
+
+
+# One batcher per embedding model, since a migration can leave bots on two
+query_embedders: dict[tuple[str, int], EmbeddingBatcher] = {}
+
+
+def get_query_embedder(model: str = EMBEDDING_MODEL, dim: int = EMBEDDING_DIM) -> EmbeddingBatcher:
+    embedder = query_embedders.get((model, dim))
+    if embedder is None:
+        embedder = query_embedders[(model, dim)] = EmbeddingBatcher(_openai_embed_fn(model, dim))
+    return embedder
+
+
+query_embedder = get_query_embedder()
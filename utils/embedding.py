@@ -1,82 +1,111 @@
-import os
+import asyncio
 import uuid
 import logging
-from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PayloadSchemaType
-from config import EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, COLLECTION_NAME
+from typing import Optional
+from config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_DIM,
+    COLLECTION_NAME,
+)
+from utils.bot_records import bot_index, get_bot_record, save_bot_record
+from utils.chunker import chunk_segments, document_text, structure
+from utils.circuit_breaker import breakers
+from utils.context import count_tokens
+from utils.embed_batcher import openai_embeddings
+from utils.migration import dual_write
+from utils.payload import chunk_payload
+from utils.qdrant import get_qdrant_client, ensure_collection
+from utils.sources import bot_sources, new_source, with_sources
+from utils.vector_cache import hot_bot_cache
+from utils.metrics import timed, stage_timer, record_tokens
+
+UPSERT_BATCH_SIZE = 64
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+@timed("store_embedding")
+async def store_embedding(
+    segments: list[dict],
+    email: str,
+    name: str,
+    source_name: Optional[str] = None,
+    bot_id: Optional[str] = None,
+) -> tuple[str, str]:
+    """Embed a parsed document's segments as a new bot, or as another source of bot_id.
 
-async def store_embedding(text: str, email: str, name: str) -> str:
-    # Generate a unique bot_id
-    bot_id = str(uuid.uuid4())
-    
-    # Initialize text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len
-    )
+    Returns the bot_id and the source_id of the document.
+    """
+    # Heavy client libraries are imported on first upload, not at startup
+    from qdrant_client.http.models import PointStruct
+
+    appending = bot_id is not None
+    if appending:
+        # Tags the points of bots from before sources existed, so do it before adding ours
+        sources = await asyncio.to_thread(bot_sources, bot_id)
+    else:
+        bot_id = str(uuid.uuid4())
+        sources = []
     
-    # Split text into chunks
-    chunks = text_splitter.split_text(text)
+    # Split into chunks along pages, sections and URLs
+    with stage_timer("store_embedding.split"):
+        chunks = chunk_segments(segments)
+    texts = [chunk["text"] for chunk in chunks]
+    text = document_text(segments)
+    token_count = count_tokens(text)
+    source = new_source(source_name, texts, text, token_count)
     
+    # Appends go where the bot's vectors are, which an embedding migration may have changed
+    if appending:
+        collection, model, dim = bot_index(get_bot_record(bot_id))
+    else:
+        collection, model, dim = COLLECTION_NAME, EMBEDDING_MODEL, EMBEDDING_DIM
+
     # Initialize LangChain embeddings
-    embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL)
+    embeddings = openai_embeddings(model, dim)
     
-    # Initialize Qdrant client directly
-    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    client = get_qdrant_client()
+    ensure_collection(collection, dim)
     
-    # Check if collection exists
-    collections = client.get_collections().collections
-    collection_names = [collection.name for collection in collections]
-    
-    # Create collection if it doesn't exist (with proper indexes)
-    if COLLECTION_NAME not in collection_names:
-        client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
-        )
-        
-        # Create indexes for metadata fields we want to filter on
-        client.create_payload_index(
-            collection_name=COLLECTION_NAME,
-            field_name="metadata.bot_id",
-            field_schema=PayloadSchemaType.KEYWORD,
-        )
-        
-        client.create_payload_index(
-            collection_name=COLLECTION_NAME,
-            field_name="metadata.email",
-            field_schema=PayloadSchemaType.KEYWORD,
-        )
-        
-        client.create_payload_index(
-            collection_name=COLLECTION_NAME,
-            field_name="metadata.name",
-            field_schema=PayloadSchemaType.KEYWORD,
+    # Embed the chunks, then store them with compressed text; email and name go in the bot record
+    with stage_timer("store_embedding.embed"), breakers["ingest_embeddings"].guard(len(texts)):
+        vectors = await embeddings.aembed_documents(texts)
+
+    points = [
+        PointStruct(
+            id=str(uuid.uuid4()),
+            vector=vector,
+            payload=chunk_payload(bot_id, chunk["text"], source["source_id"], **structure(chunk)),
         )
-        
-        logger.info(f"Created new collection {COLLECTION_NAME} with indexes")
-    
-    # Create Qdrant vector store
-    vectorstore = QdrantVectorStore.from_texts(
-        texts=chunks,
-        embedding=embeddings,
-        metadatas=[{"bot_id": bot_id, "email": email, "name": name} for _ in chunks],
-        ids=[str(uuid.uuid4()) for _ in chunks],
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
-        collection_name=COLLECTION_NAME,
-    )
-    
-    logger.info(f"Stored embedding for bot_id: {bot_id}, email: {email}")
-    return bot_id
\ No newline at end of file
+        for chunk, vector in zip(chunks, vectors)
+    ]
+    for start in range(0, len(points), UPSERT_BATCH_SIZE):
+        with stage_timer("store_embedding.upsert"), breakers["qdrant_bulk"].guard():
+            await asyncio.to_thread(
+                client.upsert,
+                collection_name=collection,
+                points=points[start : start + UPSERT_BATCH_SIZE],
+            )
+    # While a migration to a new embedding model runs, write the new model's vectors too
+    index = {
+        "collection": collection,
+        "embedding_model": model,
+        "embedding_dim": dim,
+    }
+    with stage_timer("store_embedding.dual_write"):
+        index = await dual_write(bot_id, points, collection) or index
+    record_tokens(embedding=token_count)
+
+    if appending:
+        # Re-read the record: it may have changed while we embedded. The bot keeps
+        # being served from its collection, which now has the new chunks too.
+        record = get_bot_record(bot_id) or {}
+        sources = record.get("sources", sources)
+        hot_bot_cache.invalidate(bot_id)
+    else:
+        record = {"email": email, "name": name, **index}
+    # Record bot size; tiny bots get a context pack so /chat can skip retrieval
+    save_bot_record(bot_id, with_sources(record, sources + [source]))
+
+    logger.info(f"Stored embedding for bot_id: {bot_id}, source: {source['source_id']}, email: {email}")
+    return bot_id, source["source_id"]
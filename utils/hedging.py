@@ -0,0 +1,144 @@
+# utils/hedging.py
+import asyncio
+import logging
+from collections import deque
+from threading import Lock
+from typing import Any, Awaitable, Callable, Optional
+from config import (
+    HEDGE_BUDGET_BURST,
+    HEDGE_BUDGET_RATIO,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MIN_DELAY_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one upstream stage"""
+
+    def __init__(self, name: str, window: int = 500):
+        self.name = name
+        self.samples: deque = deque(maxlen=window)
+        self.hedges = 0  # Hedged duplicates issued
+        self.hedge_wins = 0  # Times the duplicate answered first
+        self.hedges_denied = 0  # Hedges skipped for lack of budget or capacity
+        self._budget = float(HEDGE_BUDGET_BURST)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def earn_hedge(self) -> None:
+        """Every call adds HEDGE_BUDGET_RATIO of a hedge to the budget"""
+        self._budget = min(HEDGE_BUDGET_BURST, self._budget + HEDGE_BUDGET_RATIO)
+
+    def spend_hedge(self) -> bool:
+        if self._budget < 1:
+            return False
+        self._budget -= 1
+        return True
+
+    def hedge_delay(self) -> float:
+        """Adaptive delay before hedging: the current p95 latency"""
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return float("inf")
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE))
+        return max(HEDGE_MIN_DELAY_SECONDS, ordered[index])
+
+
+class ThreadGauge:
+    """Counts calls of one kind running in worker threads.
+
+    Cancelling an asyncio.to_thread task doesn't stop its thread, so a hedged
+    attempt that lost keeps its worker until the call returns.
+    """
+
+    def __init__(self):
+        self.running = 0
+        self._lock = Lock()
+
+    def run(self, fn: Callable, *args) -> Any:
+        with self._lock:
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+class Deadline:
+    """Overall request budget that per-stage timeouts are carved out of"""
+
+    def __init__(self, budget: float):
+        self.expires = asyncio.get_running_loop().time() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - asyncio.get_running_loop().time())
+
+    def stage(self, cap: float) -> float:
+        """Timeout for the next stage: its own cap, but never past the deadline"""
+        return min(cap, self.remaining())
+
+
+async def hedged(
+    call: Callable[[], Awaitable[Any]],
+    tracker: LatencyTracker,
+    timeout: float,
+    can_hedge: Optional[Callable[[], bool]] = None,
+) -> Any:
+    """Run call() with a hard timeout, issuing one duplicate after the p95 delay.
+
+    The duplicate is only sent while the tracker's hedge budget lasts and
+    can_hedge(), if given, allows it. The first successful response wins;
+    the other attempt's task is cancelled, which stops an HTTP call but not
+    a thread started by asyncio.to_thread.
+    Raises asyncio.TimeoutError when no attempt finishes within the timeout.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tracker.earn_hedge()
+    tasks = {loop.create_task(call())}
+    hedge_task = None
+    may_hedge = True
+    last_error = None
+    try:
+        while True:
+            elapsed = loop.time() - start
+            if elapsed >= timeout:
+                raise asyncio.TimeoutError(f"{tracker.name} timed out after {timeout:.1f}s")
+            if tasks:
+                wait = timeout - elapsed
+                if may_hedge:
+                    wait = min(wait, max(0.0, tracker.hedge_delay() - elapsed))
+                done, _ = await asyncio.wait(
+                    tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        tracker.record(loop.time() - start)
+                        if task is hedge_task:
+                            tracker.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+
+            # Slow or failed first attempt: send one duplicate
+            if may_hedge and (
+                not tasks or loop.time() - start >= tracker.hedge_delay()
+            ):
+                may_hedge = False
+                if (can_hedge is None or can_hedge()) and tracker.spend_hedge():
+                    tracker.hedges += 1
+                    logger.info(f"Hedging {tracker.name} request")
+                    hedge_task = loop.create_task(call())
+                    tasks.add(hedge_task)
+                else:
+                    tracker.hedges_denied += 1
+            if not tasks:
+                raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
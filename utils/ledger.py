@@ -0,0 +1,288 @@
+# utils/ledger.py
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from config import (
+    LEDGER_DB,
+    LEDGER_BATCH_SIZE,
+    LEDGER_FLUSH_SECONDS,
+    LEDGER_MAX_AGE_DAYS,
+    LEDGER_MAX_ROWS,
+    LEDGER_PRUNE_EVERY,
+)
+from utils.circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Ledger entry of the request being handled, filled in by the stages it runs
+current_entry: ContextVar[Optional[dict]] = ContextVar("ledger_entry", default=None)
+
+TOKEN_FIELDS = ("prompt_tokens", "cached_prompt_tokens", "completion_tokens", "embedding_tokens")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    bot_id TEXT,
+    endpoint TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    embedding_tokens INTEGER NOT NULL DEFAULT 0,
+    stages TEXT,
+    cache TEXT
+);
+CREATE INDEX IF NOT EXISTS usage_bot_ts ON usage (bot_id, ts);
+CREATE INDEX IF NOT EXISTS usage_ts ON usage (ts);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(LEDGER_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _prune(conn: sqlite3.Connection) -> None:
+    """Delete entries older than LEDGER_MAX_AGE_DAYS and the oldest beyond LEDGER_MAX_ROWS"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=LEDGER_MAX_AGE_DAYS)).timestamp()
+    with conn:
+        deleted = conn.execute("DELETE FROM usage WHERE ts < ?", (cutoff,)).rowcount
+        deleted += conn.execute(
+            "DELETE FROM usage WHERE ts < (SELECT ts FROM usage ORDER BY ts DESC LIMIT 1 OFFSET ?)",
+            (LEDGER_MAX_ROWS - 1,),
+        ).rowcount
+    if deleted:
+        logger.info(f"Pruned {deleted} ledger entries")
+
+
+class LedgerWriter(threading.Thread):
+    """Writes ledger entries in batches on a background thread"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.queue: queue.Queue = queue.Queue()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        conn = _connect()
+        since_prune = LEDGER_PRUNE_EVERY
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            batch = []
+            deadline = time.monotonic() + LEDGER_FLUSH_SECONDS
+            while len(batch) < LEDGER_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            batch,
+                        )
+                except Exception as e:
+                    logger.error(f"Failed to write {len(batch)} ledger entries: {str(e)}")
+            since_prune += len(batch)
+            if since_prune >= LEDGER_PRUNE_EVERY:
+                since_prune = 0
+                try:
+                    _prune(conn)
+                except Exception as e:
+                    logger.error(f"Failed to prune the ledger: {str(e)}")
+        conn.close()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+_writer: Optional[LedgerWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _enqueue(row: tuple) -> None:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = LedgerWriter()
+                _writer.start()
+    _writer.queue.put(row)
+
+
+def close_ledger() -> None:
+    """Flush pending entries (call at shutdown)"""
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+def add_tokens(**tokens) -> None:
+    entry = current_entry.get()
+    if entry is not None:
+        for field, count in tokens.items():
+            entry[field] += count
+
+
+def add_stage(stage: str, seconds: float) -> None:
+    entry = current_entry.get()
+    if entry is not None:
+        entry["stages"][stage] = entry["stages"].get(stage, 0) + seconds
+
+
+def set_bot_id(bot_id: str) -> None:
+    """Attach the current request to a bot once its id is known (e.g. after upload)"""
+    entry = current_entry.get()
+    if entry is not None:
+        entry["bot_id"] = bot_id
+
+
+def set_status(response) -> None:
+    """Record the status of a response returned rather than raised (e.g. a JSONResponse)"""
+    entry = current_entry.get()
+    if entry is not None:
+        entry["status"] = getattr(response, "status_code", 200)
+
+
+def add_cache_event(cache: str, hit: bool) -> None:
+    entry = current_entry.get()
+    if entry is not None:
+        entry["cache"][cache] = hit
+
+
+@contextmanager
+def track(endpoint: str, bot_id: Optional[str] = None):
+    """Record one request in the ledger; stages fill in the yielded entry.
+
+    Pass a returned response to set_status, or the request is recorded as 200.
+    """
+    entry = {"bot_id": bot_id, "status": 200, "stages": {}, "cache": {}}
+    entry.update({field: 0 for field in TOKEN_FIELDS})
+    token = current_entry.set(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    except CircuitOpenError:
+        entry["status"] = 503  # What the app's handler for it answers
+        raise
+    except Exception as e:
+        entry["status"] = getattr(e, "status_code", 500)
+        raise
+    finally:
+        current_entry.reset(token)
+        now = datetime.now(timezone.utc)
+        _enqueue(
+            (
+                now.timestamp(),
+                now.strftime("%Y-%m-%d"),
+                entry["bot_id"],
+                endpoint,
+                entry["status"],
+                time.perf_counter() - start,
+                *(entry[field] for field in TOKEN_FIELDS),
+                json.dumps(entry["stages"]),
+                json.dumps(entry["cache"]),
+            )
+        )
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def bot_report(bot_id: str, days: int = 7) -> dict:
+    """Latency percentiles, tokens per day and average stage times for one bot"""
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).timestamp()
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT endpoint, latency, stages FROM usage WHERE bot_id = ? AND ts >= ?",
+            (bot_id, since),
+        ).fetchall()
+        per_day = conn.execute(
+            f"SELECT day, COUNT(*), {', '.join(f'SUM({f})' for f in TOKEN_FIELDS)} "
+            "FROM usage WHERE bot_id = ? AND ts >= ? GROUP BY day ORDER BY day",
+            (bot_id, since),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    endpoints = {}
+    stage_totals: dict[str, list] = {}
+    for endpoint, latency, stages in rows:
+        endpoints.setdefault(endpoint, []).append(latency)
+        for stage, seconds in json.loads(stages or "{}").items():
+            stage_totals.setdefault(stage, []).append(seconds)
+
+    return {
+        "bot_id": bot_id,
+        "days": days,
+        "endpoints": {
+            endpoint: {
+                "requests": len(latencies),
+                "p50_seconds": _percentile(latencies, 0.5),
+                "p99_seconds": _percentile(latencies, 0.99),
+            }
+            for endpoint, latencies in endpoints.items()
+        },
+        "avg_stage_seconds": {
+            stage: sum(values) / len(values) for stage, values in stage_totals.items()
+        },
+        "per_day": [
+            {"day": day, "requests": count, **dict(zip(TOKEN_FIELDS, sums))}
+            for day, count, *sums in per_day
+        ],
+    }
+
+
+def top_bots(days: int = 7, limit: int = 20) -> list[dict]:
+    """Bots ranked by total tokens, with request counts and latency percentiles"""
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).timestamp()
+    conn = _connect()
+    try:
+        totals = conn.execute(
+            f"SELECT bot_id, COUNT(*), {', '.join(f'SUM({f})' for f in TOKEN_FIELDS)} "
+            "FROM usage WHERE ts >= ? AND bot_id IS NOT NULL GROUP BY bot_id "
+            f"ORDER BY {' + '.join(f'SUM({f})' for f in TOKEN_FIELDS)} DESC LIMIT ?",
+            (since, limit),
+        ).fetchall()
+        report = []
+        for bot_id, count, *sums in totals:
+            latencies = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT latency FROM usage WHERE bot_id = ? AND ts >= ?",
+                    (bot_id, since),
+                )
+            ]
+            report.append(
+                {
+                    "bot_id": bot_id,
+                    "requests": count,
+                    **dict(zip(TOKEN_FIELDS, sums)),
+                    "p50_seconds": _percentile(latencies, 0.5),
+                    "p99_seconds": _percentile(latencies, 0.99),
+                }
+            )
+        return report
+    finally:
+        conn.close()
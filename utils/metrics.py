@@ -0,0 +1,216 @@
+# utils/metrics.py
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable
+from utils.ledger import add_stage, add_cache_event, add_tokens
+
+# Seconds; covers in-process cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback at scrape time"""
+
+    def __init__(
+        self, name: str, help: str, labels: tuple, collect: Callable[[], dict], type: str = "gauge"
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        self.type = type
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, value in self.collect().items():
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+REGISTRY: list = []
+
+stage_seconds = Histogram(
+    "docative_stage_seconds", "Latency of pipeline stages", labels=("stage",)
+)
+request_seconds = Histogram(
+    "docative_request_seconds",
+    "Latency of HTTP requests",
+    labels=("method", "endpoint", "status"),
+)
+llm_tokens = Counter(
+    "docative_llm_tokens_total",
+    "Tokens sent to and received from OpenAI",
+    labels=("kind",),
+)
+cache_events = Counter(
+    "docative_cache_events_total",
+    "Cache lookups by cache and result",
+    labels=("cache", "result"),
+)
+
+
+def record_cache_event(cache: str, hit: bool) -> None:
+    """Count a cache lookup in the metrics and the request's ledger entry"""
+    cache_events.inc(cache=cache, result="hit" if hit else "miss")
+    add_cache_event(cache, hit)
+
+
+def record_tokens(prompt: int = 0, cached_prompt: int = 0, completion: int = 0, embedding: int = 0) -> None:
+    """Count OpenAI tokens in the metrics and the request's ledger entry"""
+    llm_tokens.inc(cached_prompt, kind="cached_prompt")
+    llm_tokens.inc(prompt - cached_prompt, kind="uncached_prompt")
+    llm_tokens.inc(completion, kind="completion")
+    llm_tokens.inc(embedding, kind="embedding")
+    add_tokens(
+        prompt_tokens=prompt,
+        cached_prompt_tokens=cached_prompt,
+        completion_tokens=completion,
+        embedding_tokens=embedding,
+    )
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Record how long the wrapped block takes under docative_stage_seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        add_stage(stage, elapsed)
+
+
+def timed(stage: str):
+    """Decorator version of stage_timer for sync and async functions"""
+
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Route templates keep label cardinality bounded
+            endpoint = getattr(route, "path", "unmatched")
+            request_seconds.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                endpoint=endpoint,
+                status=str(status["code"]),
+            )
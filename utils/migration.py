@@ -0,0 +1,481 @@
+# utils/migration.py
+"""Online migration of every bot to a new embedding model.
+
+A migration re-embeds the stored chunk texts of each bot into a shadow
+collection sized for the new model, throttled to MIGRATION_CHUNKS_PER_SECOND,
+and switches the bot over by updating its bot record once all of its chunks
+are in. Bots keep being served from their old collection until then.
+Uploads made while a migration is active are written to both collections.
+
+Once a migration has completed, point config.COLLECTION_NAME,
+EMBEDDING_MODEL and EMBEDDING_DIM at the new collection and model; the old
+collection can then be dropped.
+
+The state file is shared by every worker process. Changes are read-modify-
+writes under a file lock, readers pick up other workers' writes by the
+file's stamp, and only the worker holding the run lock copies bots; the
+others stand by and take over if it exits.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+from config import (
+    COLLECTION_NAME,
+    EMBEDDING_DIM,
+    EMBEDDING_MODEL,
+    MIGRATION_BATCH_SIZE,
+    MIGRATION_CHUNKS_PER_SECOND,
+    MIGRATION_STATE_FILE,
+)
+from utils.bot_records import bot_index, get_bot_record, save_bot_record
+from utils.circuit_breaker import CircuitOpenError, breakers
+from utils.embed_batcher import openai_embeddings
+from utils.payload import payload_text
+from utils.qdrant import bot_filter, ensure_collection, get_qdrant_client, source_filter
+from utils.vector_cache import hot_bot_cache
+
+logger = logging.getLogger(__name__)
+
+STANDBY_POLL_SECONDS = 5  # How often workers without the run lock check for work
+
+_cached: dict = {"stamp": None, "state": None}
+_task: Optional[asyncio.Task] = None
+_wake: Optional[asyncio.Event] = None
+# Progress of the current process, for the rate and ETA
+_run = {"started_at": 0.0, "chunks_at_start": 0}
+
+
+def _stamp() -> Optional[tuple]:
+    try:
+        stat = os.stat(MIGRATION_STATE_FILE)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _load_state() -> Optional[dict]:
+    """The migration state as last written by any worker; treat as read-only"""
+    stamp = _stamp()
+    if stamp != _cached["stamp"]:
+        state = None
+        if stamp is not None:
+            with open(MIGRATION_STATE_FILE, "r") as f:
+                state = json.load(f)
+        _cached.update(stamp=stamp, state=state)
+    return _cached["state"]
+
+
+@contextmanager
+def _file_lock(suffix: str, blocking: bool = True):
+    """Exclusive lock shared by every worker process; yields False if not blocking and taken"""
+    os.makedirs(os.path.dirname(MIGRATION_STATE_FILE) or ".", exist_ok=True)
+    with open(MIGRATION_STATE_FILE + suffix, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _update_state(change: Callable[[Optional[dict]], Optional[dict]]) -> Optional[dict]:
+    """Apply a change to the freshly read state and write it back, atomically across workers.
+
+    change gets a copy of the state and returns the new state.
+    """
+    with _file_lock(".lock"):
+        _cached["stamp"] = None
+        state = _load_state()
+        state = change(json.loads(json.dumps(state)) if state else None)
+        tmp_path = MIGRATION_STATE_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, MIGRATION_STATE_FILE)
+        _cached["stamp"] = None
+    return _load_state()
+
+
+def active_migration() -> Optional[dict]:
+    """The migration new uploads must be dual-written for, if any"""
+    state = _load_state()
+    if state and state["status"] in ("running", "completed"):
+        # Finished once the config itself points at the new collection
+        if state["target_collection"] != COLLECTION_NAME:
+            return state
+    return None
+
+
+def bot_collections(bot_id: str) -> set[str]:
+    """Every collection that may hold points of a bot"""
+    collections = {COLLECTION_NAME, bot_index(get_bot_record(bot_id))[0]}
+    migration = active_migration()
+    if migration:
+        collections.add(migration["target_collection"])
+    return collections
+
+
+def _scan_bots(collection: str) -> tuple[list[str], int]:
+    """Bot ids in a collection, and its total number of chunks"""
+    client = get_qdrant_client()
+    bot_ids: dict[str, None] = {}
+    chunks, offset = 0, None
+    while True:
+        with breakers["qdrant_bulk"].guard():
+            points, offset = client.scroll(
+                collection_name=collection,
+                limit=1000,
+                offset=offset,
+                with_payload=["metadata.bot_id"],
+                with_vectors=False,
+            )
+        for point in points:
+            bot_ids[point.payload["metadata"]["bot_id"]] = None
+        chunks += len(points)
+        if offset is None:
+            return list(bot_ids), chunks
+
+
+def start_migration(model: str, dim: int) -> dict:
+    """Create the shadow collection and plan the migration (blocking)"""
+    state = _load_state()
+    if state and state["status"] == "running":
+        raise ValueError("A migration is already running")
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", model).strip("_")
+    target = f"{COLLECTION_NAME}__{slug}_{dim}"
+    if target == COLLECTION_NAME or (model, dim) == (EMBEDDING_MODEL, EMBEDDING_DIM):
+        raise ValueError("Bots already use this embedding model")
+    ensure_collection(target, dim)
+    bot_ids, chunks = _scan_bots(COLLECTION_NAME)
+    new_state = {
+        "status": "running",
+        "source_collection": COLLECTION_NAME,
+        "source_model": EMBEDDING_MODEL,
+        "source_dim": EMBEDDING_DIM,
+        "target_collection": target,
+        "target_model": model,
+        "target_dim": dim,
+        "started_at": time.time(),
+        "finished_at": None,
+        "bots": bot_ids,
+        "cursor": 0,  # bots[:cursor] are done
+        "failed": {},
+        "dual_written": [],
+        "total_chunks": chunks,
+        "chunks_done": 0,
+    }
+
+    def begin(state: Optional[dict]) -> dict:
+        if state and state["status"] == "running":
+            raise ValueError("A migration is already running")
+        return new_state
+
+    state = _update_state(begin)
+    logger.info(f"Migrating {len(bot_ids)} bots ({chunks} chunks) to {model} in {target}")
+    return state
+
+
+class Throttle:
+    """Paces work to a steady number of units per second"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.next_at = time.monotonic()
+
+    async def wait(self, units: int) -> None:
+        now = time.monotonic()
+        start = max(self.next_at, now)
+        self.next_at = start + units / self.rate
+        await asyncio.sleep(start - now)
+
+
+def _switch_bot(bot_id: str, state: dict) -> None:
+    """Point a bot's record at the migrated collection (one atomic file write)"""
+    record = dict(get_bot_record(bot_id) or {})
+    record.update(
+        collection=state["target_collection"],
+        embedding_model=state["target_model"],
+        embedding_dim=state["target_dim"],
+    )
+    save_bot_record(bot_id, record)
+    # Cached vectors came from the old model
+    hot_bot_cache.invalidate(bot_id)
+
+
+async def _upsert_reembedded(embeddings, state: dict, points: list) -> None:
+    from qdrant_client.http.models import PointStruct
+
+    texts = [payload_text(point.payload) for point in points]
+    with breakers["ingest_embeddings"].guard(len(texts)):
+        vectors = await embeddings.aembed_documents(texts)
+    with breakers["qdrant_bulk"].guard():
+        await asyncio.to_thread(
+            get_qdrant_client().upsert,
+            collection_name=state["target_collection"],
+            points=[
+                PointStruct(id=point.id, vector=vector, payload=point.payload)
+                for point, vector in zip(points, vectors)
+            ],
+        )
+
+
+def _live_sources(bot_id: str) -> Optional[set[str]]:
+    """source_ids a bot has now, or None for bots without sources"""
+    record = get_bot_record(bot_id)
+    if record is None or "sources" not in record:
+        return None
+    return {source["source_id"] for source in record["sources"]}
+
+
+def _is_running() -> bool:
+    state = _load_state()
+    return state is not None and state["status"] == "running"
+
+
+async def migrate_bot(bot_id: str, state: dict, embeddings, throttle: Throttle) -> Optional[int]:
+    """Re-embed one bot into the shadow collection and switch it over.
+
+    Returns the number of chunks copied, or None when the migration was
+    stopped before the bot was done.
+    """
+    had_record = get_bot_record(bot_id) is not None
+    source, _, _ = bot_index(get_bot_record(bot_id))
+    if source == state["target_collection"]:
+        return 0  # Dual-written while the migration ran
+    client = get_qdrant_client()
+    chunks, offset = 0, None
+    copied_sources = set()
+    while True:
+        if not _is_running():
+            return None  # Aborted, possibly by another worker
+        with breakers["qdrant_bulk"].guard():
+            points, offset = await asyncio.to_thread(
+                client.scroll,
+                collection_name=source,
+                scroll_filter=bot_filter(bot_id),
+                limit=MIGRATION_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+        # Skip sources removed since the scroll started
+        live = _live_sources(bot_id)
+        if live is not None:
+            live.add(None)
+            points = [point for point in points if point.payload.get("metadata", {}).get("source_id") in live]
+        if points:
+            await throttle.wait(len(points))
+            await _upsert_reembedded(embeddings, state, points)
+            chunks += len(points)
+            copied_sources.update(point.payload.get("metadata", {}).get("source_id") for point in points)
+        if offset is None:
+            break
+    if had_record and get_bot_record(bot_id) is None:
+        # Replaced or deleted while we copied it
+        with breakers["qdrant_bulk"].guard():
+            await asyncio.to_thread(
+                client.delete,
+                collection_name=state["target_collection"],
+                points_selector=bot_filter(bot_id),
+            )
+        return chunks
+    # A source removed between the check and our upsert would be back; delete it again
+    live = _live_sources(bot_id)
+    removed = copied_sources - live - {None} if live is not None else set()
+    for source_id in removed:
+        with breakers["qdrant_bulk"].guard():
+            await asyncio.to_thread(
+                client.delete,
+                collection_name=state["target_collection"],
+                points_selector=source_filter(bot_id, source_id),
+            )
+    if chunks:
+        _switch_bot(bot_id, state)
+    return chunks
+
+
+async def dual_write(bot_id: str, points: list, collection: str = COLLECTION_NAME) -> Optional[dict]:
+    """Write a new upload's chunks, stored in collection, to the shadow collection too.
+
+    Returns the bot record fields pointing at the shadow collection, or None
+    when no migration is active.
+    """
+    state = active_migration()
+    if state is None:
+        return None
+    index = {
+        "collection": state["target_collection"],
+        "embedding_model": state["target_model"],
+        "embedding_dim": state["target_dim"],
+    }
+    if collection == state["target_collection"]:
+        return index  # Appended to a bot that was already migrated
+    embeddings = openai_embeddings(state["target_model"], state["target_dim"])
+    for start in range(0, len(points), MIGRATION_BATCH_SIZE):
+        await _upsert_reembedded(embeddings, state, points[start : start + MIGRATION_BATCH_SIZE])
+
+    def add(current: Optional[dict]) -> Optional[dict]:
+        if current is not None and bot_id not in current["dual_written"]:
+            current["dual_written"].append(bot_id)
+        return current
+
+    await asyncio.to_thread(_update_state, add)
+    return index
+
+
+def migration_progress() -> dict:
+    state = _load_state()
+    if state is None:
+        return {"status": "none"}
+    elapsed = time.monotonic() - _run["started_at"] if _run["started_at"] else 0
+    rate = (state["chunks_done"] - _run["chunks_at_start"]) / elapsed if elapsed else 0.0
+    remaining = max(0, state["total_chunks"] - state["chunks_done"])
+    return {
+        "status": state["status"],
+        "source_collection": state["source_collection"],
+        "target_collection": state["target_collection"],
+        "target_model": state["target_model"],
+        "target_dim": state["target_dim"],
+        "bots_done": state["cursor"],
+        "bots_total": len(state["bots"]),
+        "bots_failed": len(state["failed"]),
+        "bots_dual_written": len(state["dual_written"]),
+        "chunks_done": state["chunks_done"],
+        "chunks_total": state["total_chunks"],
+        "percent": round(100 * state["chunks_done"] / state["total_chunks"], 1)
+        if state["total_chunks"]
+        else 100.0,
+        # Rate and ETA are only known in the worker copying bots
+        "chunks_per_second": round(rate, 2),
+        "eta_seconds": round(remaining / rate) if rate and state["status"] == "running" else None,
+    }
+
+
+async def run_migration() -> None:
+    """Migrate the remaining bots; the caller holds the run lock"""
+    state = _load_state()
+    embeddings = openai_embeddings(state["target_model"], state["target_dim"])
+    throttle = Throttle(MIGRATION_CHUNKS_PER_SECOND)
+    _run.update(started_at=time.monotonic(), chunks_at_start=state["chunks_done"])
+    while True:
+        state = _load_state()
+        if state is None or state["status"] != "running" or state["cursor"] >= len(state["bots"]):
+            break
+        cursor = state["cursor"]
+        bot_id = state["bots"][cursor]
+        failure = None
+        try:
+            chunks = await migrate_bot(bot_id, state, embeddings, throttle)
+        except CircuitOpenError as e:
+            # A dependency is down; retry the same bot once it may be back
+            await asyncio.sleep(e.retry_after)
+            continue
+        except Exception as e:
+            logger.error(f"Failed to migrate bot_id {bot_id}: {str(e)}")
+            chunks, failure = 0, str(e)
+        if chunks is None:
+            break
+
+        def advance(current: Optional[dict]) -> Optional[dict]:
+            if current is None or current["status"] != "running" or current["cursor"] != cursor:
+                return current
+            current["cursor"] += 1
+            current["chunks_done"] += chunks
+            if failure:
+                current["failed"][bot_id] = failure
+            return current
+
+        await asyncio.to_thread(_update_state, advance)
+        progress = migration_progress()
+        logger.info(
+            f"Migrated {progress['bots_done']}/{progress['bots_total']} bots "
+            f"({progress['percent']}%), ETA {progress['eta_seconds']}s"
+        )
+
+    def complete(current: Optional[dict]) -> Optional[dict]:
+        if current and current["status"] == "running" and current["cursor"] >= len(current["bots"]):
+            current.update(status="completed", finished_at=time.time())
+            logger.info(f"Migration to {current['target_collection']} completed")
+        return current
+
+    await asyncio.to_thread(_update_state, complete)
+
+
+async def _migration_worker() -> None:
+    """Copy bots while this worker holds the run lock; stand by otherwise"""
+    while True:
+        if _is_running():
+            with _file_lock(".run.lock", blocking=False) as leader:
+                if leader:
+                    try:
+                        await run_migration()
+                    except Exception as e:
+                        logger.error(f"Migration run failed: {str(e)}")
+                    else:
+                        continue
+        _wake.clear()
+        try:
+            await asyncio.wait_for(_wake.wait(), STANDBY_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def resume_migration() -> asyncio.Task:
+    """Start this worker's migration task (call at startup), or wake it after a start"""
+    global _task, _wake
+    if _task is None or _task.done():
+        _wake = asyncio.Event()
+        _task = asyncio.create_task(_migration_worker())
+    _wake.set()
+    return _task
+
+
+async def abort_migration() -> dict:
+    """Stop the migration, move switched bots back and drop the shadow collection"""
+
+    def abort(current: Optional[dict]) -> dict:
+        if current is None or current["status"] not in ("running", "completed"):
+            raise ValueError("No migration to abort")
+        current["status"] = "aborted"
+        return current
+
+    state = await asyncio.to_thread(_update_state, abort)
+    # The worker copying bots stops at its next batch; wait for it so that no bot
+    # is switched over after we moved them back
+    with open(MIGRATION_STATE_FILE + ".run.lock", "a") as run_lock:
+        await asyncio.to_thread(fcntl.flock, run_lock, fcntl.LOCK_EX)
+        try:
+            for bot_id in state["bots"] + state["dual_written"]:
+                record = get_bot_record(bot_id)
+                if record and record.get("collection") == state["target_collection"]:
+                    save_bot_record(
+                        bot_id,
+                        {
+                            **record,
+                            "collection": state["source_collection"],
+                            "embedding_model": state["source_model"],
+                            "embedding_dim": state["source_dim"],
+                        },
+                    )
+                    hot_bot_cache.invalidate(bot_id)
+            with breakers["qdrant_bulk"].guard():
+                await asyncio.to_thread(get_qdrant_client().delete_collection, state["target_collection"])
+        finally:
+            fcntl.flock(run_lock, fcntl.LOCK_UN)
+
+    def finish(current: Optional[dict]) -> Optional[dict]:
+        if current is not None:
+            current["finished_at"] = time.time()
+        return current
+
+    await asyncio.to_thread(_update_state, finish)
+    logger.info(f"Migration to {state['target_collection']} aborted")
+    return migration_progress()
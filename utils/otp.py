@@ -7,6 +7,9 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from config import SMTP_TIMEOUT_SECONDS
+from utils.circuit_breaker import breakers
+from utils.metrics import timed
 
 load_dotenv()
 
@@ -56,6 +59,7 @@ def is_verified(email: str) -> bool:
     return email in otp_storage and otp_storage[email]["verified"]
 
 
+@timed("send_otp_email")
 def send_otp_email(to_email: str, otp: str) -> None:
     """Send OTP verification email"""
     safe_to_email = html.escape(to_email)
@@ -156,6 +160,7 @@ def send_otp_email(to_email: str, otp: str) -> None:
     msg.attach(html_part)
 
     # Send email
-    with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
-        server.login(SMTP_USER, SMTP_PASS)
-        server.send_message(msg)
+    with breakers["smtp"].guard():
+        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS) as server:
+            server.login(SMTP_USER, SMTP_PASS)
+            server.send_message(msg)
@@ -1,37 +1,83 @@
-import pdfplumber
-import docx
 import os
+import re
 from fastapi import UploadFile
 from typing import Union
 import io
+from utils.chunker import heading_titles, make_segment, push_heading
+from utils.metrics import timed
 
-async def parse_file(file: UploadFile) -> Union[str, None]:
-    content = ""
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+@timed("parse_file")
+async def parse_file(file: UploadFile) -> Union[list[dict], None]:
+    """Segments of an uploaded document (see utils.chunker), or None for unsupported types"""
     filename = (file.filename or "").lower()
 
     if filename.endswith(".pdf"):
-        content = await parse_pdf(file)
+        segments = await parse_pdf(file)
     elif filename.endswith(".docx"):
-        content = await parse_docx(file)
+        segments = await parse_docx(file)
     elif filename.endswith(".txt"):
         content = await file.read()
-        content = content.decode("utf-8")
+        segments = text_segments(content.decode("utf-8"))
     else:
         return None
 
-    return content.strip()
+    return [segment for segment in segments if segment["text"].strip()]
+
+def text_segments(text: str) -> list[dict]:
+    """Plain text, split into sections at markdown headings (# Title)"""
+    segments = []
+    path = []
+    lines = []
+    in_code = False
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        match = None if in_code else MARKDOWN_HEADING.match(line)
+        if not match:
+            lines.append(line)
+            continue
+        segments.append(make_segment("\n".join(lines).strip(), headings=heading_titles(path)))
+        path = push_heading(path, len(match.group(1)), match.group(2))
+        lines = [line]
+    segments.append(make_segment("\n".join(lines).strip(), headings=heading_titles(path)))
+    return segments
+
+async def parse_pdf(file: UploadFile) -> list[dict]:
+    import pdfplumber
 
-async def parse_pdf(file: UploadFile) -> str:
-    text = ""
     file_bytes = await file.read()
     with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
+        return [
+            make_segment(page.extract_text() or "", page=number)
+            for number, page in enumerate(pdf.pages, 1)
+        ]
+
+async def parse_docx(file: UploadFile) -> list[dict]:
+    import docx
 
-async def parse_docx(file: UploadFile) -> str:
     # Ensure the file is seekable by reading into a BytesIO object
     file.file.seek(0)
     content = io.BytesIO(file.file.read())
     doc = docx.Document(content)
-    return "\n".join([para.text for para in doc.paragraphs])
\ No newline at end of file
+
+    # A new section starts at every Title / Heading N paragraph
+    segments = []
+    path = []
+    paragraphs = []
+    for para in doc.paragraphs:
+        style = para.style.name if para.style is not None else ""
+        level = None
+        if style == "Title":
+            level = 0
+        elif style.startswith("Heading ") and style[8:].isdigit():
+            level = int(style[8:])
+        if level is None or not para.text.strip():
+            paragraphs.append(para.text)
+            continue
+        segments.append(make_segment("\n".join(paragraphs).strip(), headings=heading_titles(path)))
+        path = push_heading(path, level, para.text.strip())
+        paragraphs = [para.text]
+    segments.append(make_segment("\n".join(paragraphs).strip(), headings=heading_titles(path)))
+    return segments
@@ -0,0 +1,64 @@
+# utils/payload.py
+"""Compact point payloads.
+
+A point stores only its bot_id, the source_id of the document it came from,
+where in the document the chunk is (url, page, page_end and headings, when
+the parser knows them) and its chunk text, zstd-compressed and
+base64-encoded (payloads are JSON).
+Per-bot fields like email and name live in the bot record. Points written before this layout carry `page_content`
+and the full metadata; every reader accepts both.
+"""
+import base64
+import json
+import threading
+from typing import Optional
+import zstandard
+from config import CHUNK_TEXT_ZSTD_LEVEL
+
+# zstd contexts can't be shared between threads
+_local = threading.local()
+
+
+def _zstd() -> tuple[zstandard.ZstdCompressor, zstandard.ZstdDecompressor]:
+    if not hasattr(_local, "zstd"):
+        _local.zstd = (
+            zstandard.ZstdCompressor(level=CHUNK_TEXT_ZSTD_LEVEL),
+            zstandard.ZstdDecompressor(),
+        )
+    return _local.zstd
+
+
+def encode_text(text: str) -> str:
+    return base64.b64encode(_zstd()[0].compress(text.encode())).decode("ascii")
+
+
+def decode_text(blob: str) -> str:
+    return _zstd()[1].decompress(base64.b64decode(blob)).decode()
+
+
+def chunk_payload(bot_id: str, text: str, source_id: Optional[str] = None, **structure) -> dict:
+    """Payload of a chunk; structure is utils.chunker.structure(chunk)"""
+    metadata = {"bot_id": bot_id}
+    if source_id:
+        metadata["source_id"] = source_id
+    metadata.update(structure)
+    return {"metadata": metadata, "text_zst": encode_text(text)}
+
+
+def encoded_text(payload: dict) -> str:
+    """The compressed chunk text of a payload in either layout"""
+    if "text_zst" in payload:
+        return payload["text_zst"]
+    return encode_text(payload.get("page_content", ""))
+
+
+def payload_text(payload: dict) -> str:
+    """The chunk text of a payload in either layout"""
+    if "text_zst" in payload:
+        return decode_text(payload["text_zst"])
+    return payload.get("page_content", "")
+
+
+def payload_size(payload: dict) -> int:
+    """Bytes a payload takes as JSON"""
+    return len(json.dumps(payload, separators=(",", ":")).encode())
@@ -0,0 +1,112 @@
+# utils/profiler.py
+import os
+import logging
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+from config import PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_MAX_FILES
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{code.co_qualname}"
+
+
+class RequestSampler(threading.Thread):
+    """Samples the stack of one request while it runs.
+
+    The request runs on the event loop thread, interleaved with others, so a
+    sample only counts when the stack passes through the request's own anchor
+    frame (the middleware call that started the profile). Work handed off to
+    worker threads (asyncio.to_thread) is not sampled.
+    """
+
+    def __init__(self, thread_id: int, anchor, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.anchor = anchor
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame)
+                if frame is self.anchor:
+                    break
+                frame = frame.f_back
+            if frame is None:
+                # Another request (or the loop itself) was running
+                continue
+            self.samples[";".join(_frame_name(f) for f in reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _rotate() -> None:
+    files = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)),
+        key=os.path.getmtime,
+    )
+    for path in files[:-PROFILE_MAX_FILES]:
+        os.remove(path)
+
+
+def write_profile(samples: Counter, method: str, path: str) -> str:
+    """Write samples in collapsed-stack format (flamegraph.pl, speedscope)"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    filename = f"{stamp}_{method}_{slug}.folded"
+    with open(os.path.join(PROFILE_DIR, filename), "w") as f:
+        for stack, count in samples.items():
+            f.write(f"{stack} {count}\n")
+    _rotate()
+    return filename
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests on demand.
+
+    A request is profiled when it carries "X-Profile: 1" together with the
+    admin key in "X-Admin-Key", or when it is picked by PROFILE_SAMPLE_RATE.
+    Otherwise the only cost is a header lookup.
+    """
+
+    def __init__(self, app, admin_key: Optional[str]):
+        self.app = app
+        self.admin_key = admin_key
+
+    def _wanted(self, scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile") == b"1" and self.admin_key:
+            return headers.get(b"x-admin-key") == self.admin_key.encode()
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = RequestSampler(
+            threading.get_ident(), sys._getframe(), PROFILE_INTERVAL_MS / 1000
+        )
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            filename = write_profile(sampler.samples, scope["method"], scope["path"])
+            logger.info(f"Wrote profile {filename} ({sum(sampler.samples.values())} samples)")
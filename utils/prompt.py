@@ -0,0 +1,49 @@
+# utils/prompt.py
+import logging
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+    from langchain_core.prompts import ChatPromptTemplate
+
+logger = logging.getLogger(__name__)
+
+# Stable instructions first, then per-bot context, then the volatile history and
+# question, so the prompt prefix stays byte-identical for provider prompt caching.
+# OpenAI only caches prompts of 1024 tokens or more, and these instructions are
+# about 170, so the instructions alone never hit the cache. A cache hit needs the
+# context to repeat as well. That happens for bots answered from their context
+# pack, which is the same for every question, once the pack is about 850 tokens
+# or longer. Retrieved context changes with the question, so it is rarely cached.
+# Padding the instructions to 1024 tokens would cost more than it saves.
+SYSTEM_INSTRUCTIONS = """You are Docative, an AI chatbot created from the user's content, representing him, his documents, website, or portfolio. Use the provided context to answer questions concisely and accurately, reflecting the tone and intent of the content (e.g., professional for resumes, engaging for websites). Be creative with details as long as they align with the context. If the context lacks relevant information, use conversation history (if available) to inform follow-ups or politely say, "I don't have enough info from your content to answer that, but feel free to ask something related!" For questions unrelated to the context, respond positively with general knowledge or encouragement, keeping it relevant to person's goals."""
+
+@lru_cache(maxsize=1)
+def get_chat_prompt() -> "ChatPromptTemplate":
+    """Chat prompt, compiled once per process on first use"""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", SYSTEM_INSTRUCTIONS),
+            ("system", "Context: {context}"),
+            (
+                "human",
+                "Conversation History:\n{history}\nCurrent Question: {question}\nAnswer:",
+            ),
+        ]
+    )
+
+
+def prompt_cache_usage(message: "BaseMessage") -> dict:
+    """Split the prompt tokens of an LLM response into cached and uncached"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens", 0)
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_prompt_tokens": cached_tokens,
+        "uncached_prompt_tokens": prompt_tokens - cached_tokens,
+        "completion_tokens": usage.get("output_tokens", 0),
+    }
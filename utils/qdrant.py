@@ -0,0 +1,209 @@
+# utils/qdrant.py
+import os
+import functools
+import logging
+from threading import Lock
+from typing import Optional, TYPE_CHECKING
+from dotenv import load_dotenv
+from utils.bot_records import bot_for_email
+from utils.circuit_breaker import breakers
+from utils.payload import payload_text
+from config import (
+    COLLECTION_NAME,
+    EMBEDDING_DIM,
+    QDRANT_HNSW_M,
+    QDRANT_HNSW_PAYLOAD_M,
+    QDRANT_PAYLOAD_ON_DISK,
+    QDRANT_QUANTILE,
+    QDRANT_QUANTIZATION,
+    QDRANT_RESCORE_OVERSAMPLING,
+    QDRANT_VECTORS_ON_DISK,
+)
+
+# qdrant_client is slow to import, so it is loaded on first use
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
+    from qdrant_client.http.models import Filter, KeywordIndexParams, ScalarQuantization
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+
+_client: Optional["QdrantClient"] = None
+_client_lock = Lock()
+_ready_collections: set[str] = set()
+
+# Payload fields we filter on
+PAYLOAD_INDEXES = ("metadata.bot_id", "metadata.email", "metadata.name")
+
+
+class _SerializedClient:
+    """Runs one call at a time on a client that isn't thread-safe.
+
+    The in-memory client is called from asyncio.to_thread workers, and concurrent
+    calls corrupt its collections.
+    """
+
+    def __init__(self, client: "QdrantClient"):
+        self._client = client
+        self._lock = Lock()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+
+        return call
+
+
+def get_qdrant_client() -> "QdrantClient":
+    """Process-wide Qdrant client, so requests reuse its connection pool.
+
+    QDRANT_URL=":memory:" runs Qdrant in-process (benchmarks and local runs).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from qdrant_client import QdrantClient
+
+                if QDRANT_URL == ":memory:":
+                    _client = _SerializedClient(QdrantClient(location=":memory:"))
+                    logger.info("Using in-memory Qdrant")
+                else:
+                    _client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    return _client
+
+
+def quantization_config() -> Optional["ScalarQuantization"]:
+    if not QDRANT_QUANTIZATION:
+        return None
+    from qdrant_client.http.models import ScalarQuantization, ScalarQuantizationConfig, ScalarType
+
+    return ScalarQuantization(
+        scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=QDRANT_QUANTILE, always_ram=True)
+    )
+
+
+def index_schema(field_name: str) -> "KeywordIndexParams":
+    from qdrant_client.http.models import KeywordIndexParams, KeywordIndexType
+
+    # Every search is scoped to one bot, so Qdrant stores each bot's points together
+    return KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=field_name == "metadata.bot_id")
+
+
+def collection_layout(dim: int) -> dict:
+    """create_collection arguments for the layout configured in config.py"""
+    from qdrant_client.http.models import Distance, HnswConfigDiff, VectorParams
+
+    return {
+        "vectors_config": VectorParams(size=dim, distance=Distance.COSINE, on_disk=QDRANT_VECTORS_ON_DISK),
+        "on_disk_payload": QDRANT_PAYLOAD_ON_DISK,
+        "hnsw_config": HnswConfigDiff(m=QDRANT_HNSW_M, payload_m=QDRANT_HNSW_PAYLOAD_M),
+        "quantization_config": quantization_config(),
+    }
+
+
+def ensure_collection(collection: str = COLLECTION_NAME, dim: int = EMBEDDING_DIM) -> None:
+    """Create a collection and its payload indexes on first use.
+
+    Existing collections are left as they are; qdrant_schema.py brings them
+    up to date with the configured layout.
+    """
+    if collection in _ready_collections:
+        return
+    client = get_qdrant_client()
+    with breakers["qdrant"].guard():
+        collections = client.get_collections().collections
+    if collection not in [existing.name for existing in collections]:
+        client.create_collection(collection_name=collection, **collection_layout(dim))
+        for field_name in PAYLOAD_INDEXES:
+            client.create_payload_index(
+                collection_name=collection,
+                field_name=field_name,
+                field_schema=index_schema(field_name),
+            )
+        logger.info(f"Created new collection {collection} with indexes")
+    _ready_collections.add(collection)
+
+
+def payload_filter(key: str, value: str) -> "Filter":
+    """Filter matching points whose payload key equals value"""
+    from qdrant_client.http.models import FieldCondition, Filter, MatchValue
+
+    return Filter(must=[FieldCondition(key=key, match=MatchValue(value=value))])
+
+
+def bot_filter(bot_id: str) -> "Filter":
+    return payload_filter("metadata.bot_id", bot_id)
+
+
+def source_filter(bot_id: str, source_id: str) -> "Filter":
+    """Filter matching the points of one source of a bot"""
+    from qdrant_client.http.models import FieldCondition, Filter, MatchValue
+
+    return Filter(
+        must=[
+            FieldCondition(key="metadata.bot_id", match=MatchValue(value=bot_id)),
+            FieldCondition(key="metadata.source_id", match=MatchValue(value=source_id)),
+        ]
+    )
+
+
+def find_bot_by_email(email: str) -> Optional[str]:
+    """bot_id of the bot owned by an email, if any"""
+    bot_id = bot_for_email(email)
+    if bot_id:
+        return bot_id
+    # Points written before emails moved to bot records carry metadata.email
+    with breakers["qdrant"].guard():
+        points = get_qdrant_client().scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=payload_filter("metadata.email", email),
+            limit=1,
+        )[0]
+    if points:
+        return points[0].payload.get("metadata", {}).get("bot_id")
+    return None
+
+
+def delete_bot_points(bot_id: str, collection: str = COLLECTION_NAME) -> None:
+    """Delete all points of a bot"""
+    with breakers["qdrant_bulk"].guard():
+        get_qdrant_client().delete(
+            collection_name=collection,
+            points_selector=bot_filter(bot_id),
+        )
+
+
+def search_bot(
+    bot_id: str, query_vector: list[float], k: int, collection: str = COLLECTION_NAME
+) -> list[str]:
+    """Texts of the k chunks of a bot closest to the query vector.
+
+    Only the hits' payloads are fetched and decompressed.
+    """
+    search_params = None
+    if QDRANT_QUANTIZATION:
+        from qdrant_client.http.models import QuantizationSearchParams, SearchParams
+
+        # Rank on the int8 vectors, then rescore the best candidates with the full ones
+        search_params = SearchParams(
+            quantization=QuantizationSearchParams(rescore=True, oversampling=QDRANT_RESCORE_OVERSAMPLING)
+        )
+    points = get_qdrant_client().query_points(
+        collection_name=collection,
+        query=query_vector,
+        query_filter=bot_filter(bot_id),
+        search_params=search_params,
+        limit=k,
+        with_payload=True,
+    ).points
+    return [payload_text(point.payload) for point in points]
@@ -1,16 +1,22 @@
 # utils/scraper.py
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin, urldefrag
 from urllib.robotparser import RobotFileParser
 import time
 import logging
-from typing import Set, Dict, Tuple
+from typing import Set, Dict, Tuple, TYPE_CHECKING
 from collections import deque
+from utils.chunker import heading_titles, make_segment, push_heading
+from utils.metrics import timed
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 logger = logging.getLogger(__name__)
 
-def scrape_site(url: str, max_depth: int = 2, max_pages: int = 20, max_char: int = 50000) -> str:
+_HEADING_MARK = "\x00"  # Wraps "<level><title>" in the page text
+
+@timed("scrape_site")
+def scrape_site(url: str, max_depth: int = 2, max_pages: int = 20, max_char: int = 50000) -> list[dict]:
     """
     Scrape a website starting from the given URL, following links within the same domain.
     
@@ -21,8 +27,13 @@ def scrape_site(url: str, max_depth: int = 2, max_pages: int = 20, max_char: int
         max_char: Maximum number of characters to store
         
     Returns:
-        Concatenated text from all scraped pages (truncated at 50,000 chars)
+        Segments of all scraped pages, one per section of each page, with the
+        page URL and heading path (see utils.chunker); at most max_char
+        characters in total
     """
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         # Parse the starting URL to get domain
         parsed_url = urlparse(url)
@@ -31,14 +42,15 @@ def scrape_site(url: str, max_depth: int = 2, max_pages: int = 20, max_char: int
         # Check robots.txt
         if not _is_allowed_by_robots(url, base_url):
             logger.warning(f"Scraping disallowed by robots.txt for URL: {url}")
-            return ""
+            return []
         
         # Initialize crawling
         visited_urls: Set[str] = set()
         queue: deque = deque()
         queue.append((url, 0))  # (url, depth)
         visited_urls.add(url)
-        extracted_text = ""
+        segments = []
+        extracted_chars = 0
         pages_scraped = 0
         
         # Set headers to identify our bot
@@ -65,16 +77,19 @@ def scrape_site(url: str, max_depth: int = 2, max_pages: int = 20, max_char: int
                 # Parse the page
                 soup = BeautifulSoup(response.text, "html.parser")
                 
-                # Extract clean text
-                page_text = _extract_text(soup)
-                if page_text:
-                    extracted_text += page_text + " "
+                # Collect links first: marking the headings replaces them, links and all
+                links = _find_links(soup, current_url, base_url) if depth < max_depth else set()
+                
+                # Extract clean text, split at headings
+                page_segments = _extract_segments(soup, current_url)
+                if page_segments:
+                    segments += page_segments
+                    extracted_chars += sum(len(segment["text"]) for segment in page_segments)
                     pages_scraped += 1
                     logger.info(f"Scraped {current_url} ({pages_scraped}/{max_pages} pages)")
                 
                 # If we haven't reached max_pages and haven't exceeded max_depth, find links
                 if pages_scraped < max_pages and depth < max_depth:
-                    links = _find_links(soup, current_url, base_url)
                     for link in links:
                         # Skip if already visited or not allowed by robots
                         if link not in visited_urls and _is_allowed_by_robots(link, base_url):
@@ -89,15 +104,21 @@ def scrape_site(url: str, max_depth: int = 2, max_pages: int = 20, max_char: int
                 continue
         
         # Truncate if needed
-        if len(extracted_text) > max_char:
-            extracted_text = extracted_text[:max_char]
+        if extracted_chars > max_char:
+            remaining = max_char
+            for i, segment in enumerate(segments):
+                if len(segment["text"]) >= remaining:
+                    segment["text"] = segment["text"][:remaining]
+                    segments = segments[: i + 1]
+                    break
+                remaining -= len(segment["text"])
             logger.info(f"Extracted text truncated to {max_char} characters.")
             
-        return extracted_text.strip()
+        return segments
     
     except Exception as e:
         logger.error(f"Error in scrape_site: {str(e)}")
-        return ""
+        return []
 
 def _is_allowed_by_robots(url: str, base_url: str) -> bool:
     """Check if URL is allowed by robots.txt"""
@@ -112,17 +133,35 @@ def _is_allowed_by_robots(url: str, base_url: str) -> bool:
         # If we can't check robots.txt, we'll proceed with caution
         return True
 
-def _extract_text(soup: BeautifulSoup) -> str:
-    """Extract clean text from BeautifulSoup object"""
+def _extract_segments(soup: "BeautifulSoup", url: str) -> list[dict]:
+    """Extract clean text from BeautifulSoup object, one segment per section"""
     # Remove script, style, and other non-content elements
     for element in soup(["script", "style", "noscript", "iframe", "svg"]):
         element.decompose()
     
+    # Mark headings so the section boundaries survive get_text
+    for heading in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6"]):
+        title = heading.get_text(separator=' ', strip=True)
+        heading.replace_with(f"{_HEADING_MARK}{heading.name[1]}{title}{_HEADING_MARK}")
+    
     # Get text and clean up whitespace
     text = soup.get_text(separator=' ', strip=True)
-    return text
+    segments = []
+    path = []
+    body = ""
+    for i, part in enumerate(text.split(_HEADING_MARK)):
+        if i % 2 == 0:
+            body += part
+            continue
+        if not part[1:]:
+            continue  # Empty heading
+        segments.append(make_segment(body.strip(), headings=heading_titles(path), url=url))
+        path = push_heading(path, int(part[0]), part[1:])
+        body = part[1:]
+    segments.append(make_segment(body.strip(), headings=heading_titles(path), url=url))
+    return [segment for segment in segments if segment["text"]]
 
-def _find_links(soup: BeautifulSoup, current_url: str, base_url: str) -> Set[str]:
+def _find_links(soup: "BeautifulSoup", current_url: str, base_url: str) -> Set[str]:
     """Find all valid links within the same domain"""
     links = set()
     parsed_base = urlparse(base_url)
@@ -0,0 +1,73 @@
+# utils/sessions.py
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Optional
+from config import (
+    SESSION_TTL_MINUTES,
+    SESSION_MAX_COUNT,
+    SESSION_MAX_RECENT_MESSAGES,
+    SESSION_SUMMARY_MAX_TOKENS,
+    SESSION_SUMMARY_LINE_TOKENS,
+)
+from utils.context import count_tokens, truncate_tokens
+
+# Bounded in-memory session storage (in production, use Redis or database)
+session_storage: "OrderedDict[str, dict]" = OrderedDict()
+lock = Lock()
+
+
+def _new_session(bot_id: str) -> tuple[str, dict]:
+    session_id = str(uuid.uuid4())
+    session = {"bot_id": bot_id, "summary": "", "messages": []}
+    return session_id, session
+
+
+def get_or_create_session(session_id: Optional[str], bot_id: str) -> tuple[str, dict]:
+    """Return a live session for this bot, creating a new one if needed"""
+    with lock:
+        now = datetime.now()
+        session = session_storage.get(session_id) if session_id else None
+        if session is None or session["expiry"] < now or session["bot_id"] != bot_id:
+            session_storage.pop(session_id, None)
+            session_id, session = _new_session(bot_id)
+            session_storage[session_id] = session
+        session["expiry"] = now + timedelta(minutes=SESSION_TTL_MINUTES)
+        session_storage.move_to_end(session_id)
+
+        # Drop least recently used sessions beyond the cap
+        while len(session_storage) > SESSION_MAX_COUNT:
+            session_storage.popitem(last=False)
+        return session_id, session
+
+
+def append_turn(session: dict, question: str, answer: str) -> None:
+    """Add a question/answer turn, rolling older messages into the summary"""
+    with lock:
+        session["messages"].append({"sender": "user", "text": question})
+        session["messages"].append({"sender": "bot", "text": answer})
+
+        overflow = len(session["messages"]) - SESSION_MAX_RECENT_MESSAGES
+        if overflow <= 0:
+            return
+        rolled_up = session["messages"][:overflow]
+        del session["messages"][:overflow]
+
+        lines = session["summary"].splitlines()
+        lines += [
+            truncate_tokens(f"{msg['sender']}: {msg['text']}", SESSION_SUMMARY_LINE_TOKENS)
+            for msg in rolled_up
+        ]
+        summary = "\n".join(lines)
+        # Keep the most recent part of the summary when it outgrows its budget
+        while len(lines) > 1 and count_tokens(summary) > SESSION_SUMMARY_MAX_TOKENS:
+            lines.pop(0)
+            summary = "\n".join(lines)
+        session["summary"] = truncate_tokens(summary, SESSION_SUMMARY_MAX_TOKENS)
+
+
+def session_history(session: dict) -> tuple[str, list[dict]]:
+    """Snapshot of the running summary and recent messages"""
+    with lock:
+        return session["summary"], list(session["messages"])
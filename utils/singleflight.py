@@ -0,0 +1,58 @@
+# utils/singleflight.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Share one in-flight computation between concurrent callers with the same key"""
+
+    def __init__(self):
+        self.calls = 0  # Computations actually run
+        self.saved = 0  # Callers that reused an in-flight computation
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                return await self._lead(key, fn)
+            self.saved += 1
+            logger.debug(f"Coalesced request for key {key!r} ({self.saved} saved so far)")
+            try:
+                # shield() so a disconnecting follower doesn't cancel everyone's result
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # This caller was cancelled
+                # The leader was cancelled (its client left): try again, leading if no one else is
+                self.saved -= 1
+
+    async def _lead(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.calls += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Not the followers' failure: they retry instead of inheriting it
+            future.cancel()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question for coalescing"""
+    return " ".join(question.lower().split())
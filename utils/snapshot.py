@@ -0,0 +1,213 @@
+# utils/snapshot.py
+"""Portable bot snapshots: vectors, payloads and records, no re-embedding.
+
+A snapshot is a stream of frames, so bots of any size are written and read
+with memory bounded by SNAPSHOT_BATCH_SIZE:
+
+    MAGIC
+    BOT     zlib(JSON {bot_id, dim, bot_record, tracker_records})
+    POINTS  uint32 count, uint32 dim, float32[count * dim], zlib(JSON [{id, payload}])
+    ...     (more POINTS frames)
+    END_BOT
+    ...     (more bots)
+    END
+
+Each frame is a 1-byte type and a uint64 body length, then the body.
+"""
+import json
+import logging
+import struct
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional
+import numpy as np
+from config import COLLECTION_NAME, SNAPSHOT_BATCH_SIZE
+from utils.bot_records import bot_index, delete_bot_record, get_bot_record, save_bot_record
+from utils.circuit_breaker import breakers
+from utils.migration import bot_collections
+from utils.qdrant import bot_filter, delete_bot_points, ensure_collection, get_qdrant_client
+from utils.tracker import records_for_bot, restore_records
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DOCSNAP1"
+BOT, POINTS, END_BOT, END = b"B", b"P", b"E", b"Z"
+FRAME_HEADER = struct.Struct("<cQ")
+POINTS_HEADER = struct.Struct("<II")
+
+
+def _write_frame(out: BinaryIO, kind: bytes, body: bytes = b"") -> None:
+    out.write(FRAME_HEADER.pack(kind, len(body)))
+    out.write(body)
+
+
+def _read_frames(src: BinaryIO) -> Iterator[tuple[bytes, bytes]]:
+    if src.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a bot snapshot")
+    while True:
+        header = src.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise ValueError("Snapshot is truncated")
+        kind, length = FRAME_HEADER.unpack(header)
+        body = src.read(length)
+        if len(body) < length:
+            raise ValueError("Snapshot is truncated")
+        if kind == END:
+            return
+        yield kind, body
+
+
+def _scroll_bot(bot_id: str, collection: str) -> Iterator[list]:
+    """Pages of a bot's points, with vectors and payloads"""
+    client = get_qdrant_client()
+    offset = None
+    while True:
+        with breakers["qdrant_bulk"].guard():
+            points, offset = client.scroll(
+                collection_name=collection,
+                scroll_filter=bot_filter(bot_id),
+                limit=SNAPSHOT_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+        if points:
+            yield points
+        if offset is None:
+            return
+
+
+def export_bots(bot_ids: Iterable[str], out: BinaryIO) -> dict:
+    """Stream the given bots into a snapshot; bots without points are skipped"""
+    out.write(MAGIC)
+    totals = {"bots": 0, "points": 0, "bytes": len(MAGIC)}
+    for bot_id in bot_ids:
+        started = False
+        bot_record = get_bot_record(bot_id)
+        collection, _, _ = bot_index(bot_record)
+        for points in _scroll_bot(bot_id, collection):
+            vectors = np.asarray([point.vector for point in points], dtype=np.float32)
+            if not started:
+                header = {
+                    "bot_id": bot_id,
+                    "dim": vectors.shape[1],
+                    "bot_record": bot_record,
+                    "tracker_records": records_for_bot(bot_id),
+                }
+                _write_frame(out, BOT, zlib.compress(json.dumps(header).encode()))
+                started = True
+            payloads = [{"id": str(point.id), "payload": point.payload} for point in points]
+            body = (
+                POINTS_HEADER.pack(*vectors.shape)
+                + vectors.tobytes()
+                + zlib.compress(json.dumps(payloads).encode())
+            )
+            _write_frame(out, POINTS, body)
+            totals["points"] += len(points)
+            totals["bytes"] += FRAME_HEADER.size + len(body)
+        if started:
+            _write_frame(out, END_BOT)
+            totals["bots"] += 1
+            logger.info(f"Exported bot_id {bot_id}")
+        else:
+            logger.warning(f"Skipping bot_id {bot_id}: no points found")
+    _write_frame(out, END)
+    return totals
+
+
+def iter_bot_vectors(src: BinaryIO) -> Iterator[tuple[str, np.ndarray]]:
+    """(bot_id, vectors) of every bot in a snapshot, for offline analysis"""
+    bot_id, batches = None, []
+    for kind, body in _read_frames(src):
+        if kind == BOT:
+            bot_id, batches = json.loads(zlib.decompress(body))["bot_id"], []
+        elif kind == POINTS:
+            count, dim = POINTS_HEADER.unpack_from(body)
+            start = POINTS_HEADER.size
+            vectors = np.frombuffer(body[start : start + count * dim * 4], dtype=np.float32)
+            batches.append(vectors.reshape(count, dim))
+        elif kind == END_BOT:
+            yield bot_id, np.concatenate(batches)
+
+
+def _collection_dim() -> int:
+    with breakers["qdrant_bulk"].guard():
+        info = get_qdrant_client().get_collection(COLLECTION_NAME)
+    return info.config.params.vectors.size
+
+
+def _bot_exists(bot_id: str) -> bool:
+    """Whether the bot has a record, or points in any collection it may be in"""
+    if get_bot_record(bot_id) is not None:
+        return True
+    client = get_qdrant_client()
+    for collection in bot_collections(bot_id):
+        with breakers["qdrant_bulk"].guard():
+            if not client.collection_exists(collection):
+                continue
+            points, _ = client.scroll(
+                collection_name=collection, scroll_filter=bot_filter(bot_id), limit=1
+            )
+        if points:
+            return True
+    return False
+
+
+def import_snapshot(src: BinaryIO, replace: bool = False, only: Optional[set] = None) -> dict:
+    """Restore bots from a snapshot with batched upserts.
+
+    Bots that already exist are skipped unless replace is set. Point ids are
+    kept, so importing the same snapshot twice is harmless.
+    """
+    from qdrant_client.http.models import PointStruct
+
+    ensure_collection()
+    client = get_qdrant_client()
+    dim = _collection_dim()
+    totals = {"bots": 0, "skipped": 0, "points": 0}
+    header, restoring = None, False
+
+    for kind, body in _read_frames(src):
+        if kind == BOT:
+            header = json.loads(zlib.decompress(body))
+            bot_id = header["bot_id"]
+            restoring = only is None or bot_id in only
+            if restoring and header["dim"] != dim:
+                raise ValueError(
+                    f"bot_id {bot_id} has {header['dim']}-dim vectors, collection has {dim}"
+                )
+            if restoring and _bot_exists(bot_id):
+                if replace:
+                    for collection in bot_collections(bot_id):
+                        delete_bot_points(bot_id, collection)
+                    # The snapshot's record, if it has one, is saved at END_BOT
+                    delete_bot_record(bot_id)
+                else:
+                    logger.info(f"Skipping bot_id {bot_id}: already exists")
+                    restoring = False
+            if not restoring:
+                totals["skipped"] += 1
+        elif kind == POINTS and restoring:
+            count, point_dim = POINTS_HEADER.unpack_from(body)
+            vector_bytes = count * point_dim * 4
+            start = POINTS_HEADER.size
+            vectors = np.frombuffer(body[start : start + vector_bytes], dtype=np.float32)
+            vectors = vectors.reshape(count, point_dim)
+            payloads = json.loads(zlib.decompress(body[start + vector_bytes :]))
+            with breakers["qdrant_bulk"].guard():
+                client.upsert(
+                    collection_name=COLLECTION_NAME,
+                    points=[
+                        PointStruct(id=item["id"], vector=vector.tolist(), payload=item["payload"])
+                        for item, vector in zip(payloads, vectors)
+                    ],
+                )
+            totals["points"] += count
+        elif kind == END_BOT and restoring:
+            bot_id = header["bot_id"]
+            if header["bot_record"] is not None:
+                # Restored into this cluster's main collection, whatever it was in before
+                save_bot_record(bot_id, {**header["bot_record"], "collection": COLLECTION_NAME})
+            restore_records(header["tracker_records"])
+            totals["bots"] += 1
+            logger.info(f"Imported bot_id {bot_id}")
+    return totals
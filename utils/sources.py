@@ -0,0 +1,125 @@
+# utils/sources.py
+"""Documents (sources) a bot is built from.
+
+Every point carries the source_id of the upload it came from, and the bot
+record lists the sources with their sizes. Adding a source embeds only the
+new document; removing one is a filtered delete.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+from config import TINY_BOT_TOKEN_BUDGET, TOP_K_CHUNKS
+from utils.bot_records import bot_index, get_bot_record, save_bot_record
+from utils.circuit_breaker import breakers
+from utils.migration import bot_collections
+from utils.qdrant import bot_filter, get_qdrant_client, source_filter
+from utils.tracker import records_for_bot
+from utils.vector_cache import hot_bot_cache
+
+logger = logging.getLogger(__name__)
+
+
+def new_source(name: Optional[str], chunks: list[str], text: str, token_count: int) -> dict:
+    """Record entry for a freshly embedded document"""
+    if len(chunks) <= TOP_K_CHUNKS:
+        context_pack = "\n".join(chunks)
+    elif token_count <= TINY_BOT_TOKEN_BUDGET:
+        context_pack = text
+    else:
+        context_pack = None
+    return {
+        "source_id": uuid.uuid4().hex,
+        "name": name,
+        "chunk_count": len(chunks),
+        "char_count": len(text),
+        "token_count": token_count,
+        "added_at": datetime.now(timezone.utc).isoformat(),
+        "context_pack": context_pack,
+    }
+
+
+def with_sources(record: dict, sources: list[dict]) -> dict:
+    """The record with these sources and the bot totals derived from them"""
+    chunk_count = sum(source["chunk_count"] for source in sources)
+    token_count = sum(source["token_count"] for source in sources)
+    packs = [source["context_pack"] for source in sources]
+    context_pack = None
+    if sources and None not in packs and (chunk_count <= TOP_K_CHUNKS or token_count <= TINY_BOT_TOKEN_BUDGET):
+        # Small enough for /chat to skip retrieval
+        context_pack = "\n".join(packs)
+    else:
+        # Per-source texts only matter while the whole bot fits in a prompt
+        sources = [{**source, "context_pack": None} for source in sources]
+    return {
+        **record,
+        "sources": sources,
+        "chunk_count": chunk_count,
+        "char_count": sum(source["char_count"] for source in sources),
+        "token_count": token_count,
+        "context_pack": context_pack,
+    }
+
+
+def bot_sources(bot_id: str) -> list[dict]:
+    """Sources of a bot; bots from before sources existed get their points tagged as one"""
+    record = get_bot_record(bot_id) or {}
+    if "sources" in record:
+        return record["sources"]
+
+    client = get_qdrant_client()
+    source_id = uuid.uuid4().hex
+    for collection in bot_collections(bot_id):
+        with breakers["qdrant_bulk"].guard():
+            client.set_payload(
+                collection_name=collection,
+                payload={"source_id": source_id},
+                key="metadata",
+                points=bot_filter(bot_id),
+            )
+    chunk_count = record.get("chunk_count")
+    if chunk_count is None:
+        with breakers["qdrant_bulk"].guard():
+            chunk_count = client.count(
+                collection_name=bot_index(record)[0], count_filter=bot_filter(bot_id)
+            ).count
+    uploads = records_for_bot(bot_id)
+    source = {
+        "source_id": source_id,
+        "name": uploads[-1].get("filename") if uploads else None,
+        "chunk_count": chunk_count,
+        "char_count": record.get("char_count", 0),
+        "token_count": record.get("token_count", 0),
+        "added_at": uploads[-1].get("timestamp") if uploads else None,
+        "context_pack": record.get("context_pack"),
+    }
+    save_bot_record(bot_id, with_sources(record, [source]))
+    logger.info(f"Tagged existing points of bot_id {bot_id} as source {source_id}")
+    return [source]
+
+
+async def remove_source(bot_id: str, source_id: str) -> dict:
+    """Delete one source's points from every collection holding the bot"""
+    sources = await asyncio.to_thread(bot_sources, bot_id)
+    if source_id not in [source["source_id"] for source in sources]:
+        raise KeyError(source_id)
+    if len(sources) == 1:
+        raise ValueError("Cannot remove the only source of a bot")
+
+    client = get_qdrant_client()
+    for collection in bot_collections(bot_id):
+        with breakers["qdrant_bulk"].guard():
+            await asyncio.to_thread(
+                client.delete,
+                collection_name=collection,
+                points_selector=source_filter(bot_id, source_id),
+            )
+    # Re-read: another source may have been added while we deleted
+    record = get_bot_record(bot_id) or {}
+    remaining = [source for source in record.get("sources", sources) if source["source_id"] != source_id]
+    record = with_sources(record, remaining)
+    save_bot_record(bot_id, record)
+    hot_bot_cache.invalidate(bot_id)
+    logger.info(f"Removed source {source_id} from bot_id {bot_id}")
+    return record
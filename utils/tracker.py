@@ -1,3 +1,4 @@
+import gzip
 import json
 import os
 from datetime import datetime, timezone
@@ -27,4 +28,68 @@ def log_upload(email, bot_id, filename, name):
                 f.seek(0)
                 json.dump(existing, f, indent=2)
     finally:
-        lock.release()
\ No newline at end of file
+        lock.release()
+
+def export_records_gzip() -> bytes:
+    """Return the full user records file as gzip-compressed JSON."""
+    lock.acquire()
+    try:
+        if not os.path.exists(TRACKING_FILE):
+            data = b"[]"
+        else:
+            with open(TRACKING_FILE, "rb") as f:
+                data = f.read()
+    finally:
+        lock.release()
+    return gzip.compress(data)
+
+def records_for_bot(bot_id):
+    """All upload records of one bot"""
+    lock.acquire()
+    try:
+        if not os.path.exists(TRACKING_FILE):
+            return []
+        with open(TRACKING_FILE, "r") as f:
+            return [record for record in json.load(f) if record.get("bot_id") == bot_id]
+    finally:
+        lock.release()
+
+def tracked_bot_ids():
+    """Unique bot ids in upload order"""
+    lock.acquire()
+    try:
+        if not os.path.exists(TRACKING_FILE):
+            return []
+        with open(TRACKING_FILE, "r") as f:
+            return list(dict.fromkeys(record.get("bot_id") for record in json.load(f)))
+    finally:
+        lock.release()
+
+def current_bot_ids():
+    """The latest bot of every email, i.e. the bots still in use"""
+    lock.acquire()
+    try:
+        if not os.path.exists(TRACKING_FILE):
+            return set()
+        with open(TRACKING_FILE, "r") as f:
+            latest = {record.get("email"): record.get("bot_id") for record in json.load(f)}
+        return set(latest.values())
+    finally:
+        lock.release()
+
+def restore_records(records):
+    """Append upload records as-is (e.g. from a snapshot), skipping ones already present"""
+    lock.acquire()
+    try:
+        existing = []
+        if os.path.exists(TRACKING_FILE):
+            with open(TRACKING_FILE, "r") as f:
+                existing = json.load(f)
+        seen = {(r.get("bot_id"), r.get("timestamp")) for r in existing}
+        added = [r for r in records if (r.get("bot_id"), r.get("timestamp")) not in seen]
+        if added:
+            with open(TRACKING_FILE, "w") as f:
+                json.dump(existing + added, f, indent=2)
+        return len(added)
+    finally:
+        lock.release()
@@ -0,0 +1,200 @@
+# utils/vector_cache.py
+import os
+import json
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, TYPE_CHECKING
+import numpy as np
+from utils.circuit_breaker import breakers
+from utils.bot_records import bot_index, get_bot_record, record_stamp
+from utils.payload import decode_text, encoded_text
+from utils.qdrant import bot_filter
+from config import (
+    COLLECTION_NAME,
+    HOT_BOT_CACHE_MAX_MB,
+    HOT_BOT_MAX_CHUNKS,
+    HOT_BOT_WARM_COUNT,
+)
+
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
+
+logger = logging.getLogger(__name__)
+
+HOT_BOTS_FILE = "db/hot_bots.json"
+MAX_LARGE_BOTS = 10000  # Too-big bots remembered, so they aren't counted on every request
+
+
+class HotBot:
+    """Vectors and compressed chunk texts of one bot, ready for brute-force search"""
+
+    def __init__(self, vectors: np.ndarray, texts: list[str]):
+        # Collection uses cosine distance, so normalize once and search with a dot product
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.vectors = np.ascontiguousarray(vectors / norms, dtype=np.float32)
+        # Texts as stored in payloads (utils.payload.encode_text); only hits are decoded
+        self.texts = texts
+        self.nbytes = self.vectors.nbytes + sum(len(t) for t in texts)
+
+    def search(self, query_vector, k: int) -> list[str]:
+        """Return the texts of the top-k chunks for a query vector"""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.vectors @ query
+        k = min(k, len(self.texts))
+        if k < len(self.texts):
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        else:
+            top = np.argsort(-scores)
+        return [decode_text(self.texts[i]) for i in top]
+
+
+class HotBotCache:
+    """LRU cache of small bots, capped by total memory.
+
+    Entries are kept with the stamp of the bot record they were loaded under
+    (utils.bot_records.record_stamp). Every change to a bot's points saves or
+    deletes its record, so a lookup with a different stamp means another
+    worker changed the bot: the entry is dropped. invalidate() is only the
+    fast path for the worker making the change.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self._bots: "OrderedDict[str, tuple[Optional[tuple], HotBot]]" = OrderedDict()
+        # Bots with more than HOT_BOT_MAX_CHUNKS points, which always use Qdrant search
+        self._large: "OrderedDict[str, Optional[tuple]]" = OrderedDict()
+        self._lock = Lock()
+
+    def _drop(self, bot_id: str) -> None:
+        self._large.pop(bot_id, None)
+        old = self._bots.pop(bot_id, None)
+        if old is not None:
+            self.bytes_used -= old[1].nbytes
+
+    def get(self, bot_id: str, stamp: Optional[tuple]) -> Optional[HotBot]:
+        with self._lock:
+            entry = self._bots.get(bot_id)
+            if entry is None:
+                return None
+            if entry[0] != stamp:
+                self._drop(bot_id)
+                return None
+            self._bots.move_to_end(bot_id)
+            return entry[1]
+
+    def put(self, bot_id: str, bot: HotBot, stamp: Optional[tuple]) -> None:
+        if bot.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(bot_id)
+            self._bots[bot_id] = (stamp, bot)
+            self.bytes_used += bot.nbytes
+            # Evict least recently used bots until we are back under the cap
+            while self.bytes_used > self.max_bytes:
+                _, (_, evicted) = self._bots.popitem(last=False)
+                self.bytes_used -= evicted.nbytes
+
+    def is_large(self, bot_id: str, stamp: Optional[tuple]) -> bool:
+        with self._lock:
+            if bot_id not in self._large:
+                return False
+            if self._large[bot_id] != stamp:
+                self._large.pop(bot_id)
+                return False
+            return True
+
+    def mark_large(self, bot_id: str, stamp: Optional[tuple]) -> None:
+        with self._lock:
+            self._large[bot_id] = stamp
+            self._large.move_to_end(bot_id)
+            if len(self._large) > MAX_LARGE_BOTS:
+                self._large.popitem(last=False)
+
+    def invalidate(self, bot_id: str) -> None:
+        """Forget a bot whose points changed"""
+        with self._lock:
+            self._drop(bot_id)
+
+    def bot_ids(self) -> list[str]:
+        """Bot ids from most to least recently used"""
+        with self._lock:
+            return list(reversed(self._bots))
+
+
+hot_bot_cache = HotBotCache(HOT_BOT_CACHE_MAX_MB * 1024 * 1024)
+
+
+def load_hot_bot(
+    client: "QdrantClient", bot_id: str, collection: str = COLLECTION_NAME
+) -> tuple[int, Optional[HotBot]]:
+    """Fetch all points of a bot from Qdrant.
+
+    Returns the number of points of the bot and the HotBot, or None when the
+    bot is missing or too big to cache. Vectors are only downloaded for bots
+    small enough to cache.
+    """
+    with breakers["qdrant"].guard():
+        count = client.count(
+            collection_name=collection, count_filter=bot_filter(bot_id), exact=True
+        ).count
+    if not count or count > HOT_BOT_MAX_CHUNKS:
+        return count, None
+
+    with breakers["qdrant"].guard():
+        points, _ = client.scroll(
+            collection_name=collection,
+            scroll_filter=bot_filter(bot_id),
+            limit=HOT_BOT_MAX_CHUNKS + 1,
+            with_payload=True,
+            with_vectors=True,
+        )
+    if not points or len(points) > HOT_BOT_MAX_CHUNKS:
+        return len(points), None
+
+    vectors = np.array([point.vector for point in points], dtype=np.float32)
+    texts = [encoded_text(point.payload) for point in points]
+    return len(points), HotBot(vectors, texts)
+
+
+def save_hot_bot_ids() -> None:
+    """Remember the currently hot bots so the next process can pre-warm them"""
+    try:
+        with open(HOT_BOTS_FILE, "w") as f:
+            json.dump(hot_bot_cache.bot_ids()[:HOT_BOT_WARM_COUNT], f)
+    except Exception as e:
+        logger.warning(f"Could not save hot bot ids: {str(e)}")
+
+
+def warm_hot_bot_cache(client: "QdrantClient") -> int:
+    """Pre-load the bots that were hot in the previous process"""
+    if not os.path.exists(HOT_BOTS_FILE):
+        return 0
+    try:
+        with open(HOT_BOTS_FILE, "r") as f:
+            bot_ids = json.load(f)[:HOT_BOT_WARM_COUNT]
+    except Exception as e:
+        logger.warning(f"Could not read hot bot ids: {str(e)}")
+        return 0
+
+    warmed = 0
+    # Load least recently used first so LRU order is preserved
+    for bot_id in reversed(bot_ids):
+        try:
+            stamp = record_stamp(bot_id)
+            collection, _, _ = bot_index(get_bot_record(bot_id))
+            _, bot = load_hot_bot(client, bot_id, collection)
+        except Exception as e:
+            logger.warning(f"Could not warm bot_id {bot_id}: {str(e)}")
+            continue
+        if bot is not None:
+            hot_bot_cache.put(bot_id, bot, stamp)
+            warmed += 1
+    logger.info(f"Pre-warmed {warmed} hot bots")
+    return warmed
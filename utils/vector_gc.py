@@ -0,0 +1,247 @@
+# utils/vector_gc.py
+"""Reconcile Qdrant with the tracker and bot records, and delete what no bot owns.
+
+Garbage is:
+  - orphaned bots: points of a bot_id that was never tracked and has no bot
+    record, left by an upload that failed halfway through storing its chunks
+  - abandoned bots: points of a bot that is no longer the latest bot of its
+    email, e.g. when deleting them during a replace failed
+  - stale sources: points whose source_id isn't in the bot's record, left by
+    an append that failed halfway
+  - points without a bot_id, which no bot can search
+
+Each run scrolls the collections once, reading only bot and source ids. A
+candidate is deleted only once it has been garbage for VECTOR_GC_GRACE_MINUTES
+across runs, so uploads still in progress are never touched. Dry runs record
+candidates and report what would be reclaimed without deleting anything.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Optional
+from config import (
+    COLLECTION_NAME,
+    VECTOR_GC_GRACE_MINUTES,
+    VECTOR_GC_POINTS_PER_SECOND,
+    VECTOR_GC_STATE_FILE,
+)
+from utils.bot_records import delete_bot_record, get_bot_record, indexed_bot_ids
+from utils.circuit_breaker import breakers
+from utils.migration import Throttle, active_migration, migration_progress
+from utils.payload import payload_size
+from utils.qdrant import bot_filter, delete_bot_points, get_qdrant_client, source_filter
+from utils.tracker import current_bot_ids, tracked_bot_ids
+from utils.vector_cache import hot_bot_cache
+
+logger = logging.getLogger(__name__)
+
+SCAN_PAGE_SIZE = 1000
+MAX_REPORTED = 100  # Garbage entries and missing bots listed in a report
+
+
+def _load_state() -> dict:
+    if os.path.exists(VECTOR_GC_STATE_FILE):
+        with open(VECTOR_GC_STATE_FILE, "r") as f:
+            return json.load(f)
+    return {"first_seen": {}, "last_report": None}
+
+
+def _save_state(state: dict) -> None:
+    tmp_path = VECTOR_GC_STATE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, VECTOR_GC_STATE_FILE)
+
+
+def scan_collection(collection: str) -> dict[str, dict[Optional[str], int]]:
+    """Point counts per bot_id and source_id, from one paginated scroll"""
+    client = get_qdrant_client()
+    inventory: dict[str, dict[Optional[str], int]] = defaultdict(lambda: defaultdict(int))
+    offset = None
+    while True:
+        with breakers["qdrant_bulk"].guard():
+            points, offset = client.scroll(
+                collection_name=collection,
+                limit=SCAN_PAGE_SIZE,
+                offset=offset,
+                with_payload=["metadata.bot_id", "metadata.source_id"],
+                with_vectors=False,
+            )
+        for point in points:
+            metadata = point.payload.get("metadata", {})
+            inventory[metadata.get("bot_id")][metadata.get("source_id")] += 1
+        if offset is None:
+            return inventory
+
+
+def find_garbage(collection: str, inventory: dict, live: set[str], tracked: set[str]) -> list[dict]:
+    """Garbage in a scanned collection, given the bots in use and every tracked bot"""
+    garbage = []
+
+    def add(bot_id: str, source_id: Optional[str], reason: str, points: int) -> None:
+        garbage.append(
+            {
+                "collection": collection,
+                "bot_id": bot_id,
+                "source_id": source_id,
+                "reason": reason,
+                "points": points,
+            }
+        )
+
+    for bot_id, sources in inventory.items():
+        if not bot_id:
+            add(None, None, "no_bot_id", sum(sources.values()))
+            continue
+        record = get_bot_record(bot_id)
+        if bot_id not in live:
+            reason = "abandoned" if bot_id in tracked or record is not None else "orphaned"
+            add(bot_id, None, reason, sum(sources.values()))
+        elif record is not None and "sources" in record:
+            known = {source["source_id"] for source in record["sources"]}
+            for source_id, points in sources.items():
+                if source_id is not None and source_id not in known:
+                    add(bot_id, source_id, "stale_source", points)
+    return garbage
+
+
+def _key(item: dict) -> str:
+    return f"{item['collection']}|{item['bot_id']}|{item['source_id'] or ''}"
+
+
+def _selector(item: dict):
+    if item["bot_id"] is None:
+        from qdrant_client.http.models import Filter, IsEmptyCondition, PayloadField
+
+        # Matches a missing, null or empty bot_id; a filter on bot_id == None matches nothing
+        return Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="metadata.bot_id"))])
+    if item["source_id"] is not None:
+        return source_filter(item["bot_id"], item["source_id"])
+    return bot_filter(item["bot_id"])
+
+
+def _point_bytes(collection: str) -> int:
+    """Bytes a point's vector takes, full vector plus its int8 copy"""
+    with breakers["qdrant_bulk"].guard():
+        info = get_qdrant_client().get_collection(collection)
+    dim = info.config.params.vectors.size
+    return dim * 4 + (dim if info.config.quantization_config is not None else 0)
+
+
+def _payload_bytes(item: dict) -> int:
+    """Payload bytes of a garbage entry's points"""
+    client = get_qdrant_client()
+    total, offset = 0, None
+    while True:
+        with breakers["qdrant_bulk"].guard():
+            points, offset = client.scroll(
+                collection_name=item["collection"],
+                scroll_filter=_selector(item),
+                limit=SCAN_PAGE_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+        total += sum(payload_size(point.payload) for point in points)
+        if offset is None:
+            return total
+
+
+async def run_gc(dry_run: bool = True) -> dict:
+    """One reconciliation pass; returns its report"""
+    progress = migration_progress()
+    if progress["status"] == "running":
+        # Bots move between collections while it runs
+        return {"skipped": "an embedding migration is running"}
+
+    state = await asyncio.to_thread(_load_state)
+    started_at = time.time()
+    collections = [COLLECTION_NAME]
+    migration = active_migration()
+    if migration:
+        collections.append(migration["target_collection"])
+
+    # Bots in use: the latest tracked bot of each email, or one owning an email in its record
+    live = await asyncio.to_thread(current_bot_ids)
+    live |= await asyncio.to_thread(indexed_bot_ids)
+    tracked = set(await asyncio.to_thread(tracked_bot_ids))
+    garbage, scanned, seen_bots = [], {}, set()
+    for collection in collections:
+        inventory = await asyncio.to_thread(scan_collection, collection)
+        points = sum(sum(sources.values()) for sources in inventory.values())
+        scanned[collection] = {"bots": len(inventory), "points": points}
+        seen_bots.update(inventory)
+        garbage += find_garbage(collection, inventory, live, tracked)
+
+    # Mark: garbage must stay garbage for the grace period before it is swept
+    first_seen = {}
+    for item in garbage:
+        first_seen[_key(item)] = state["first_seen"].get(_key(item), started_at)
+        item["first_seen"] = first_seen[_key(item)]
+        item["due"] = started_at - item["first_seen"] >= VECTOR_GC_GRACE_MINUTES * 60
+
+    # Sweep
+    throttle = Throttle(VECTOR_GC_POINTS_PER_SECOND)
+    point_bytes = {}
+    for collection in collections:
+        point_bytes[collection] = await asyncio.to_thread(_point_bytes, collection)
+    totals = {"points": 0, "bytes": 0}
+    for item in garbage:
+        if not item["due"]:
+            continue
+        item["bytes"] = item["points"] * point_bytes[item["collection"]]
+        item["bytes"] += await asyncio.to_thread(_payload_bytes, item)
+        totals["points"] += item["points"]
+        totals["bytes"] += item["bytes"]
+        if dry_run:
+            continue
+        await throttle.wait(item["points"])
+        if item["bot_id"] is not None and item["source_id"] is None:
+            await asyncio.to_thread(delete_bot_points, item["bot_id"], item["collection"])
+            delete_bot_record(item["bot_id"])
+            hot_bot_cache.invalidate(item["bot_id"])
+        else:
+            with breakers["qdrant_bulk"].guard():
+                await asyncio.to_thread(
+                    get_qdrant_client().delete,
+                    collection_name=item["collection"],
+                    points_selector=_selector(item),
+                )
+        first_seen.pop(_key(item), None)
+        logger.info(
+            f"Deleted {item['points']} {item['reason']} points of bot_id {item['bot_id']} "
+            f"from {item['collection']}"
+        )
+
+    # Drift the other way: bots in use with no vectors at all
+    missing = sorted(bot_id for bot_id in live if bot_id and bot_id not in seen_bots)
+    report = {
+        "dry_run": dry_run,
+        "started_at": started_at,
+        "seconds": round(time.time() - started_at, 2),
+        "scanned": scanned,
+        "garbage_found": len(garbage),
+        "garbage_points": sum(item["points"] for item in garbage),
+        "garbage_due": sum(item["due"] for item in garbage),
+        # For dry runs: what would have been deleted
+        "points_deleted": totals["points"],
+        "bytes_reclaimed": totals["bytes"],
+        "garbage": garbage[:MAX_REPORTED],
+        "live_bots_without_vectors": len(missing),
+        "live_bots_without_vectors_sample": missing[:MAX_REPORTED],
+    }
+    state.update(first_seen=first_seen, last_report=report)
+    await asyncio.to_thread(_save_state, state)
+    logger.info(
+        f"Vector GC ({'dry run' if dry_run else 'applied'}): {len(garbage)} garbage entries, "
+        f"{report['garbage_due']} past the grace period, {totals['points']} points / "
+        f"{totals['bytes'] / 1024 / 1024:.1f} MB {'to reclaim' if dry_run else 'reclaimed'}"
+    )
+    return report
+
+
+def last_gc_report() -> Optional[dict]:
+    return _load_state()["last_report"]
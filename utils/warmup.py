@@ -0,0 +1,39 @@
+# utils/warmup.py
+import importlib
+import logging
+import time
+from utils.context import count_tokens
+from utils.prompt import get_chat_prompt
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily on the request path; loaded at startup in the background so
+# the process answers health checks immediately but the first request doesn't
+# pay for them either
+HEAVY_MODULES = (
+    "langchain_openai",
+    "langchain_core.prompts",
+    "langchain.text_splitter",
+    "qdrant_client",
+    "qdrant_client.http.models",
+    "tiktoken",
+    "pdfplumber",
+    "docx",
+    "bs4",
+    "requests",
+)
+
+
+def preload() -> float:
+    """Import the heavy dependencies and build per-process singletons.
+
+    Returns the seconds taken. Raises if a dependency cannot be loaded.
+    """
+    start = time.perf_counter()
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+    get_chat_prompt()
+    count_tokens("warm up")  # Loads the tokenizer's encoding
+    elapsed = time.perf_counter() - start
+    logger.info(f"Preloaded {len(HEAVY_MODULES)} modules in {elapsed:.2f}s")
+    return elapsed